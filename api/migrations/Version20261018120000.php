@@ -0,0 +1,28 @@
+<?php
+
+declare(strict_types=1);
+
+namespace DoctrineMigrations;
+
+use Doctrine\DBAL\Schema\Schema;
+use Doctrine\Migrations\AbstractMigration;
+
+final class Version20261018120000 extends AbstractMigration
+{
+    public function getDescription(): string
+    {
+        return 'Add named include/exclude detection zones to settings';
+    }
+
+    public function up(Schema $schema): void
+    {
+        $this->addSql('ALTER TABLE settings ADD detection_zones JSON DEFAULT NULL');
+        $this->addSql('UPDATE settings SET detection_zones = \'[]\'');
+        $this->addSql('ALTER TABLE settings MODIFY detection_zones JSON NOT NULL');
+    }
+
+    public function down(Schema $schema): void
+    {
+        $this->addSql('ALTER TABLE settings DROP detection_zones');
+    }
+}
@@ -0,0 +1,26 @@
+<?php
+
+declare(strict_types=1);
+
+namespace DoctrineMigrations;
+
+use Doctrine\DBAL\Schema\Schema;
+use Doctrine\Migrations\AbstractMigration;
+
+final class Version20261018130000 extends AbstractMigration
+{
+    public function getDescription(): string
+    {
+        return 'Store the per-frame motion timeline uploaded with each clip';
+    }
+
+    public function up(Schema $schema): void
+    {
+        $this->addSql('ALTER TABLE motion_detected_file ADD motion_metadata JSON DEFAULT NULL');
+    }
+
+    public function down(Schema $schema): void
+    {
+        $this->addSql('ALTER TABLE motion_detected_file DROP motion_metadata');
+    }
+}
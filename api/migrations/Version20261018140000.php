@@ -0,0 +1,28 @@
+<?php
+
+declare(strict_types=1);
+
+namespace DoctrineMigrations;
+
+use Doctrine\DBAL\Schema\Schema;
+use Doctrine\Migrations\AbstractMigration;
+
+final class Version20261018140000 extends AbstractMigration
+{
+    public function getDescription(): string
+    {
+        return 'Tie the segments of one motion event together';
+    }
+
+    public function up(Schema $schema): void
+    {
+        $this->addSql('ALTER TABLE motion_detected_file ADD event_id VARCHAR(32) DEFAULT NULL, ADD segment_index INT DEFAULT NULL, ADD final_segment TINYINT(1) DEFAULT 1 NOT NULL');
+        $this->addSql('CREATE INDEX IDX_MOTION_DETECTED_FILE_EVENT ON motion_detected_file (event_id, segment_index)');
+    }
+
+    public function down(Schema $schema): void
+    {
+        $this->addSql('DROP INDEX IDX_MOTION_DETECTED_FILE_EVENT ON motion_detected_file');
+        $this->addSql('ALTER TABLE motion_detected_file DROP event_id, DROP segment_index, DROP final_segment');
+    }
+}
@@ -0,0 +1,26 @@
+<?php
+
+declare(strict_types=1);
+
+namespace DoctrineMigrations;
+
+use Doctrine\DBAL\Schema\Schema;
+use Doctrine\Migrations\AbstractMigration;
+
+final class Version20261018150000 extends AbstractMigration
+{
+    public function getDescription(): string
+    {
+        return 'Add the background model the device detects motion with to settings';
+    }
+
+    public function up(Schema $schema): void
+    {
+        $this->addSql('ALTER TABLE settings ADD detection_engine VARCHAR(32) DEFAULT \'frame_diff\' NOT NULL');
+    }
+
+    public function down(Schema $schema): void
+    {
+        $this->addSql('ALTER TABLE settings DROP detection_engine');
+    }
+}
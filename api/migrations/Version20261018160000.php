@@ -0,0 +1,28 @@
+<?php
+
+declare(strict_types=1);
+
+namespace DoctrineMigrations;
+
+use Doctrine\DBAL\Schema\Schema;
+use Doctrine\Migrations\AbstractMigration;
+
+final class Version20261018160000 extends AbstractMigration
+{
+    public function getDescription(): string
+    {
+        return 'Add per-camera setting overrides to settings';
+    }
+
+    public function up(Schema $schema): void
+    {
+        $this->addSql('ALTER TABLE settings ADD cameras JSON DEFAULT NULL');
+        $this->addSql('UPDATE settings SET cameras = \'{}\'');
+        $this->addSql('ALTER TABLE settings MODIFY cameras JSON NOT NULL');
+    }
+
+    public function down(Schema $schema): void
+    {
+        $this->addSql('ALTER TABLE settings DROP cameras');
+    }
+}
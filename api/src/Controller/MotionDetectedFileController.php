@@ -6,6 +6,7 @@ namespace App\Controller;
 
 use App\DTO\MotionDetectedFile\MotionDetectedFileCalendarOutputDTO;
 use App\DTO\MotionDetectedFile\MotionDetectedFileInputDTO;
+use App\DTO\MotionDetectedFile\MotionDetectedFileSegmentOutputDTO;
 use App\Entity\MotionDetectedFile;
 use App\Enum\MotionDetectedFileTypeEnum;
 use App\Repository\MotionDetectedFileRepository;
@@ -121,4 +122,50 @@ class MotionDetectedFileController extends AbstractController
             $this->serializeEntityArrayToDTOs($data, MotionDetectedFileCalendarOutputDTO::class)
         );
     }
+
+    #[OA\Get(
+        summary: 'Get the per-frame motion timeline and heatmap uploaded with a motion detected file',
+        parameters: [
+            new OA\Parameter(name: 'file_name', in: 'path', required: true, schema: new OA\Schema(type: 'string'))
+        ],
+        responses: [
+            new OA\Response(response: 200, description: 'Motion timeline of the file'),
+            new OA\Response(response: 404, description: 'File not found or uploaded without motion metadata')
+        ]
+    )]
+    #[Route('/{file_name}/motion-metadata', name: 'api_motion_detected_file_get_motion_metadata', methods: ['GET'])]
+    public function getMotionMetadataAction(MotionDetectedFileRepository $detected_file_repo, string $file_name): Response
+    {
+        $motion_detected_file = $detected_file_repo->findOneBy(['file_name' => $file_name]);
+        if (!$motion_detected_file || $motion_detected_file->getMotionMetadata() === null)
+        {
+            return $this->json(['error' => 'No motion metadata for this file'], Response::HTTP_NOT_FOUND);
+        }
+
+        return $this->json($motion_detected_file->getMotionMetadata());
+    }
+
+    #[OA\Get(
+        summary: 'Get the processed segments of a motion event in playback order',
+        parameters: [
+            new OA\Parameter(name: 'event_id', in: 'path', required: true, schema: new OA\Schema(type: 'string'))
+        ],
+        responses: [
+            new OA\Response(response: 200, description: 'Segments of the event, complete once the final one is there without gaps'),
+            new OA\Response(response: 404, description: 'No processed segments for this event')
+        ]
+    )]
+    #[Route('/event/{event_id}', name: 'api_motion_detected_file_get_event', requirements: ['event_id' => '[a-f0-9]{32}'], methods: ['GET'])]
+    public function getEventAction(MotionDetectedFileRepository $detected_file_repo, string $event_id): Response
+    {
+        $data = $detected_file_repo->findEventSegments($event_id);
+        if (!$data)
+        {
+            return $this->json(['error' => 'No segments for this event'], Response::HTTP_NOT_FOUND);
+        }
+
+        return $this->json(
+            $this->serializeEntityArrayToDTOs($data, MotionDetectedFileSegmentOutputDTO::class)
+        );
+    }
 }
@@ -27,6 +27,8 @@ class UserController extends AbstractController
 {
     use ValidationTrait;
 
+    private const SETTINGS_MAX_WAIT = 30;
+
     #[OA\Get(
         summary: 'Initialize user settings',
         responses: [
@@ -51,12 +53,17 @@ class UserController extends AbstractController
 
     #[OA\Get(
         summary: 'Get user settings',
+        parameters: [
+            new OA\Parameter(name: 'If-None-Match', in: 'header', schema: new OA\Schema(type: 'string')),
+            new OA\Parameter(name: 'wait', in: 'query', schema: new OA\Schema(type: 'integer', maximum: self::SETTINGS_MAX_WAIT))
+        ],
         responses: [
-            new OA\Response(response: 200, description: 'User settings data')
+            new OA\Response(response: 200, description: 'User settings data'),
+            new OA\Response(response: 304, description: 'Settings still match If-None-Match')
         ]
     )]
     #[Route('/settings', name: 'api_user_settings_get', methods: ['GET'])]
-    public function getUserSettings(SettingsRepository $repository): Response
+    public function getUserSettings(Request $request, SettingsRepository $repository, EntityManagerInterface $entity_manager): Response
     {
         $user = $this->getUser();
         $settings = $repository->findOneBy(['user' => $user]);
@@ -65,7 +72,25 @@ class UserController extends AbstractController
             throw $this->createNotFoundException();
         }
 
-        return $this->json($this->serializeEntityToDTO($settings, SettingsOutputDTO::class));
+        $wait = min(max($request->query->getInt('wait'), 0), self::SETTINGS_MAX_WAIT);
+        $deadline = microtime(true) + $wait;
+        while (true)
+        {
+            // The ETag is a hash of the serialized settings, so any change to them changes it
+            $response = $this->json($this->serializeEntityToDTO($settings, SettingsOutputDTO::class));
+            $response->setEtag(sha1($response->getContent()));
+            if (!in_array($response->getEtag(), $request->getETags(), true) || microtime(true) >= $deadline)
+            {
+                break;
+            }
+
+            // Long-poll: hold the request until the settings change or the wait is over
+            sleep(1);
+            $entity_manager->refresh($settings);
+        }
+
+        $response->isNotModified($request);
+        return $response;
     }
 
     #[OA\Patch(
@@ -4,11 +4,15 @@ declare(strict_types=1);
 
 namespace App\Controller;
 
+use App\DTO\MotionDetectedFile\MotionDetectedFileUploadSessionInputDTO;
 use App\Entity\MotionDetectedFile;
 use App\Message\FileCleanupMessage;
 use App\Message\ProcessFileMessage;
 use App\Service\FileHandler;
+use App\Service\UploadSessionHandler;
+use App\Trait\ValidationTrait;
 use Doctrine\ORM\EntityManagerInterface;
+use Nelmio\ApiDocBundle\Attribute\Model;
 use OpenApi\Attributes as OA;
 use Symfony\Bundle\FrameworkBundle\Controller\AbstractController;
 use Symfony\Component\HttpFoundation\File\File;
@@ -25,6 +29,8 @@ use Symfony\Contracts\HttpClient\HttpClientInterface;
 #[Route('/api/video')]
 class VideoController extends AbstractController
 {
+    use ValidationTrait;
+
     #[OA\Post(
         summary: 'Upload a motion-detected video file.',
         requestBody: new OA\RequestBody(
@@ -35,7 +41,13 @@ class VideoController extends AbstractController
                 schema: new OA\Schema(
                     properties: [
                         new OA\Property(property: 'file', type: 'string', format: 'binary'),
-                        new OA\Property(property: 'roi_triggered', type: 'boolean')
+                        new OA\Property(property: 'roi_triggered', type: 'boolean'),
+                        new OA\Property(property: 'motion_metadata', description: 'JSON motion timeline of the clip', type: 'string'),
+                        new OA\Property(property: 'playable', description: 'The file is H.264 in MP4 and needs no transcoding', type: 'boolean'),
+                        new OA\Property(property: 'flipped_vertical', description: 'The device already flipped the video vertically', type: 'boolean'),
+                        new OA\Property(property: 'event_id', description: 'Event the file is a segment of', type: 'string'),
+                        new OA\Property(property: 'segment_index', description: 'Position of the segment in its event, from 0', type: 'integer'),
+                        new OA\Property(property: 'final_segment', description: 'The last segment of its event', type: 'boolean')
                     ]
                 )
             )
@@ -57,6 +69,12 @@ class VideoController extends AbstractController
         }
 
         $roi_triggered = $request->get('roi_triggered') === 'True';
+        $motion_metadata = json_decode((string)$request->get('motion_metadata', ''), true);
+        $playable = $request->get('playable') === 'True';
+        $flipped_vertical = $request->get('flipped_vertical') === 'True';
+        $event_id = preg_match('/^[a-f0-9]{32}$/', (string)$request->get('event_id', '')) ? $request->get('event_id') : null;
+        $segment_index = $event_id !== null ? (int)$request->get('segment_index', 0) : null;
+        $final_segment = $request->get('final_segment', 'True') === 'True';
 
         /** @var UploadedFile $file */
         $file = $request->files->get('file');
@@ -75,15 +93,171 @@ class VideoController extends AbstractController
             ], Response::HTTP_INTERNAL_SERVER_ERROR);
         }
 
-        $file_size = filesize($file_path);
-        $motion_detected_file = MotionDetectedFile::createFromFile($unique_file_name, $private_recordings_folder, $file_size, $roi_triggered);
+        $this->registerUploadedFile($unique_file_name, $private_recordings_folder, $roi_triggered, $entity_manager, $bus, $max_disk_usage_size_gb, is_array($motion_metadata) ? $motion_metadata : null, $playable, $flipped_vertical, $event_id, $segment_index, $final_segment);
+
+        return $this->json(['message' => 'Motion successfully uploaded'], Response::HTTP_OK);
+    }
+
+    #[OA\Post(
+        summary: 'Start a resumable chunked upload of a motion-detected video file.',
+        requestBody: new OA\RequestBody(content: new Model(type: MotionDetectedFileUploadSessionInputDTO::class)),
+        responses: [
+            new OA\Response(response: 201, description: 'Upload session created', content: new OA\JsonContent(
+                properties: [
+                    new OA\Property(property: 'upload_id', type: 'string'),
+                    new OA\Property(property: 'offset', type: 'integer')
+                ]
+            )),
+            new OA\Response(response: 400, description: 'Validation failed')
+        ]
+    )]
+    #[Route('/upload/session', name: 'api_video_upload_session_create', methods: ['POST'])]
+    public function createUploadSession(Request $request, UploadSessionHandler $upload_session_handler): Response
+    {
+        $input_dto = $this->validateRequest($request, MotionDetectedFileUploadSessionInputDTO::class);
+        if ($input_dto instanceof Response)
+        {
+            return $input_dto;
+        }
+
+        $upload_id = $upload_session_handler->create($input_dto->getFileName(), $input_dto->getFileSize(), $input_dto->isRoiTriggered(), $input_dto->getMotionMetadata(), $input_dto->isPlayable(), $input_dto->isFlippedVertical(), $input_dto->getEventId(), $input_dto->getSegmentIndex(), $input_dto->isFinalSegment());
+
+        return $this->json(['upload_id' => $upload_id, 'offset' => 0], Response::HTTP_CREATED);
+    }
+
+    #[OA\Get(
+        summary: 'Get the number of bytes received for a chunked upload.',
+        parameters: [
+            new OA\Parameter(name: 'upload_id', in: 'path', required: true, schema: new OA\Schema(type: 'string'))
+        ],
+        responses: [
+            new OA\Response(response: 200, description: 'Upload offset', content: new OA\JsonContent(
+                properties: [
+                    new OA\Property(property: 'upload_id', type: 'string'),
+                    new OA\Property(property: 'offset', type: 'integer'),
+                    new OA\Property(property: 'file_size', type: 'integer'),
+                    new OA\Property(property: 'completed', type: 'boolean'),
+                    new OA\Property(property: 'file_id', type: 'integer', nullable: true)
+                ]
+            )),
+            new OA\Response(response: 404, description: 'Upload session not found')
+        ]
+    )]
+    #[Route('/upload/session/{upload_id}', name: 'api_video_upload_session_get', requirements: ['upload_id' => '[a-f0-9]{32}'], methods: ['GET'])]
+    public function getUploadSession(string $upload_id, UploadSessionHandler $upload_session_handler): Response
+    {
+        $session = $upload_session_handler->getSession($upload_id);
+        if (!$session)
+        {
+            return $this->json(['message' => 'Upload session not found'], Response::HTTP_NOT_FOUND);
+        }
+
+        return $this->json([
+            'upload_id' => $upload_id,
+            'offset'    => $session['offset'],
+            'file_size' => $session['file_size'],
+            'completed' => isset($session['file_id']),
+            'file_id'   => $session['file_id'] ?? null,
+        ]);
+    }
+
+    #[OA\Put(
+        summary: 'Append a chunk to a resumable upload, the file is registered once all bytes arrived. Repeating the request after that answers completed again.',
+        parameters: [
+            new OA\Parameter(name: 'upload_id', in: 'path', required: true, schema: new OA\Schema(type: 'string')),
+            new OA\Parameter(name: 'Upload-Offset', in: 'header', required: true, schema: new OA\Schema(type: 'integer'))
+        ],
+        requestBody: new OA\RequestBody(
+            required: true,
+            content: new OA\MediaType(mediaType: 'application/offset+octet-stream', schema: new OA\Schema(type: 'string', format: 'binary'))
+        ),
+        responses: [
+            new OA\Response(response: 200, description: 'Chunk stored', content: new OA\JsonContent(
+                properties: [
+                    new OA\Property(property: 'offset', type: 'integer'),
+                    new OA\Property(property: 'completed', type: 'boolean'),
+                    new OA\Property(property: 'file_id', type: 'integer', nullable: true)
+                ]
+            )),
+            new OA\Response(response: 400, description: 'Upload exceeds the announced file size'),
+            new OA\Response(response: 404, description: 'Upload session not found'),
+            new OA\Response(response: 409, description: 'Offset does not match the bytes received so far'),
+            new OA\Response(response: 500, description: 'File move failed')
+        ]
+    )]
+    #[Route('/upload/session/{upload_id}', name: 'api_video_upload_session_append', requirements: ['upload_id' => '[a-f0-9]{32}'], methods: ['PUT'])]
+    public function appendUploadSession(string $upload_id, Request $request, UploadSessionHandler $upload_session_handler, EntityManagerInterface $entity_manager, MessageBusInterface $bus, string $private_recordings_folder, int $max_disk_usage_size_gb): Response
+    {
+        $session = $upload_session_handler->getSession($upload_id);
+        if (!$session)
+        {
+            return $this->json(['message' => 'Upload session not found'], Response::HTTP_NOT_FOUND);
+        }
+
+        // Once every byte arrived the body is ignored, repeating the last request finishes or reports the upload
+        if ($session['offset'] < $session['file_size'])
+        {
+            $offset = $upload_session_handler->append($upload_id, (int)$request->headers->get('Upload-Offset', '-1'), $request->getContent(true));
+            if ($offset === null)
+            {
+                // Tell the client where to resume from
+                return $this->json([
+                    'message' => 'Offset mismatch',
+                    'offset'  => $upload_session_handler->getSession($upload_id)['offset'],
+                ], Response::HTTP_CONFLICT);
+            }
+
+            if ($offset > $session['file_size'])
+            {
+                $upload_session_handler->remove($upload_id);
+                return $this->json(['message' => 'Upload exceeds the announced file size'], Response::HTTP_BAD_REQUEST);
+            }
+
+            if ($offset < $session['file_size'])
+            {
+                return $this->json(['offset' => $offset, 'completed' => false]);
+            }
+        }
+
+        return $upload_session_handler->synchronized($upload_id, function () use ($upload_id, $upload_session_handler, $entity_manager, $bus, $private_recordings_folder, $max_disk_usage_size_gb)
+        {
+            // Another request may have finished the upload while this one waited for the lock
+            $session = $upload_session_handler->getSession($upload_id);
+            if (!isset($session['stored_file_name']))
+            {
+                $unique_file_name = FileHandler::getUniqueFileName($private_recordings_folder, $session['file_name']);
+                if (!rename($upload_session_handler->getPartPath($upload_id), $private_recordings_folder . DIRECTORY_SEPARATOR . $unique_file_name))
+                {
+                    return $this->json([
+                        'message' => 'File move failed'
+                    ], Response::HTTP_INTERNAL_SERVER_ERROR);
+                }
+                $upload_session_handler->markStored($upload_id, $unique_file_name);
+                $session['stored_file_name'] = $unique_file_name;
+            }
+
+            if (!isset($session['file_id']))
+            {
+                $motion_detected_file = $this->registerUploadedFile($session['stored_file_name'], $private_recordings_folder, $session['roi_triggered'], $entity_manager, $bus, $max_disk_usage_size_gb, $session['motion_metadata'] ?? null, $session['playable'] ?? false, $session['flipped_vertical'] ?? false, $session['event_id'] ?? null, $session['segment_index'] ?? null, $session['final_segment'] ?? true);
+                $upload_session_handler->markCompleted($upload_id, $motion_detected_file->getId());
+                $session['file_id'] = $motion_detected_file->getId();
+            }
+
+            return $this->json(['offset' => $session['file_size'], 'completed' => true, 'file_id' => $session['file_id'], 'message' => 'Motion successfully uploaded']);
+        });
+    }
+
+    private function registerUploadedFile(string $unique_file_name, string $private_recordings_folder, bool $roi_triggered, EntityManagerInterface $entity_manager, MessageBusInterface $bus, int $max_disk_usage_size_gb, ?array $motion_metadata = null, bool $playable = false, bool $flipped_vertical = false, ?string $event_id = null, ?int $segment_index = null, bool $final_segment = true): MotionDetectedFile
+    {
+        $file_size = filesize($private_recordings_folder . DIRECTORY_SEPARATOR . $unique_file_name);
+        $motion_detected_file = MotionDetectedFile::createFromFile($unique_file_name, $private_recordings_folder, $file_size, $roi_triggered, $motion_metadata, $event_id, $segment_index, $final_segment);
         $entity_manager->persist($motion_detected_file);
         $entity_manager->flush();
 
-        $bus->dispatch(new ProcessFileMessage($motion_detected_file->getId()));
+        $bus->dispatch(new ProcessFileMessage($motion_detected_file->getId(), $playable, $flipped_vertical));
         $bus->dispatch(new FileCleanupMessage($max_disk_usage_size_gb, $motion_detected_file->getType()));
 
-        return $this->json(['message' => 'Motion successfully uploaded'], Response::HTTP_OK);
+        return $motion_detected_file;
     }
 
     #[OA\Get(
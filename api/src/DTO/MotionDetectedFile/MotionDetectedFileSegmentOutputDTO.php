@@ -0,0 +1,25 @@
+<?php
+
+namespace App\DTO\MotionDetectedFile;
+
+use App\Enum\MotionDetectedFileTypeEnum;
+
+class MotionDetectedFileSegmentOutputDTO
+{
+    public string $file_name;
+    public ?int $segment_index;
+    public bool $final_segment;
+    public ?int $video_duration;
+    public MotionDetectedFileTypeEnum $type;
+    public \DateTimeImmutable $created_at;
+
+    public function __construct(string $file_name, ?int $segment_index, bool $final_segment, MotionDetectedFileTypeEnum $type, \DateTimeImmutable $created_at, ?int $video_duration = null)
+    {
+        $this->file_name = $file_name;
+        $this->segment_index = $segment_index;
+        $this->final_segment = $final_segment;
+        $this->type = $type;
+        $this->created_at = $created_at;
+        $this->video_duration = $video_duration;
+    }
+}
@@ -0,0 +1,140 @@
+<?php
+
+namespace App\DTO\MotionDetectedFile;
+
+use Symfony\Component\Validator\Constraints as Assert;
+
+class MotionDetectedFileUploadSessionInputDTO
+{
+    #[Assert\NotBlank(message: 'File name cannot be blank')]
+    public string $file_name;
+
+    #[Assert\NotBlank(message: 'File size cannot be blank')]
+    #[Assert\Positive(message: 'File size must be a positive number')]
+    public int $file_size;
+
+    public bool $roi_triggered = false;
+
+    public ?string $timestamp = null;
+
+    public bool $playable = false;
+
+    public bool $flipped_vertical = false;
+
+    #[Assert\Collection(
+        fields: [
+            'samples' => new Assert\Type('array'),
+            'heatmap' => new Assert\Type('array')
+        ],
+        allowExtraFields: true
+    )]
+    public ?array $motion_metadata = null;
+
+    #[Assert\Regex(pattern: '/^[a-f0-9]{32}$/', message: 'Event id must be 32 hexadecimal characters')]
+    public ?string $event_id = null;
+
+    #[Assert\PositiveOrZero(message: 'Segment index must be zero or a positive number')]
+    public ?int $segment_index = null;
+
+    public bool $final_segment = true;
+
+    public function getFileName(): string
+    {
+        return $this->file_name;
+    }
+
+    public function setFileName(string $file_name): void
+    {
+        $this->file_name = $file_name;
+    }
+
+    public function getFileSize(): int
+    {
+        return $this->file_size;
+    }
+
+    public function setFileSize(int $file_size): void
+    {
+        $this->file_size = $file_size;
+    }
+
+    public function isRoiTriggered(): bool
+    {
+        return $this->roi_triggered;
+    }
+
+    public function setRoiTriggered(bool $roi_triggered): void
+    {
+        $this->roi_triggered = $roi_triggered;
+    }
+
+    public function getTimestamp(): ?string
+    {
+        return $this->timestamp;
+    }
+
+    public function setTimestamp(?string $timestamp): void
+    {
+        $this->timestamp = $timestamp;
+    }
+
+    public function isPlayable(): bool
+    {
+        return $this->playable;
+    }
+
+    public function setPlayable(bool $playable): void
+    {
+        $this->playable = $playable;
+    }
+
+    public function isFlippedVertical(): bool
+    {
+        return $this->flipped_vertical;
+    }
+
+    public function setFlippedVertical(bool $flipped_vertical): void
+    {
+        $this->flipped_vertical = $flipped_vertical;
+    }
+
+    public function getMotionMetadata(): ?array
+    {
+        return $this->motion_metadata;
+    }
+
+    public function setMotionMetadata(?array $motion_metadata): void
+    {
+        $this->motion_metadata = $motion_metadata;
+    }
+
+    public function getEventId(): ?string
+    {
+        return $this->event_id;
+    }
+
+    public function setEventId(?string $event_id): void
+    {
+        $this->event_id = $event_id;
+    }
+
+    public function getSegmentIndex(): ?int
+    {
+        return $this->segment_index;
+    }
+
+    public function setSegmentIndex(?int $segment_index): void
+    {
+        $this->segment_index = $segment_index;
+    }
+
+    public function isFinalSegment(): bool
+    {
+        return $this->final_segment;
+    }
+
+    public function setFinalSegment(bool $final_segment): void
+    {
+        $this->final_segment = $final_segment;
+    }
+}
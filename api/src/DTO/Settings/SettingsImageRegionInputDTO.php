@@ -9,6 +9,18 @@ class SettingsImageRegionInputDTO
     #[Assert\NotBlank(message: 'Detection area points cannot be blank')]
     public array $detection_area_points;
 
+    #[Assert\All([
+        new Assert\Collection(
+            fields: [
+                'name'      => [new Assert\NotBlank(), new Assert\Type('string')],
+                'mode'      => new Assert\Optional(new Assert\Choice(['include', 'exclude'])),
+                'threshold' => new Assert\Optional([new Assert\Type('integer'), new Assert\PositiveOrZero()]),
+                'points'    => [new Assert\Type('array'), new Assert\Count(min: 3)],
+            ]
+        )
+    ])]
+    public ?array $detection_zones = null;
+
     public function getDetectionAreaPoints(): array
     {
         return $this->detection_area_points;
@@ -18,4 +30,14 @@ class SettingsImageRegionInputDTO
     {
         $this->detection_area_points = $detection_area_points;
     }
+
+    public function getDetectionZones(): ?array
+    {
+        return $this->detection_zones;
+    }
+
+    public function setDetectionZones(?array $detection_zones): void
+    {
+        $this->detection_zones = $detection_zones;
+    }
 }
@@ -2,6 +2,7 @@
 
 namespace App\DTO\Settings;
 
+use App\Entity\Settings;
 use Symfony\Component\Validator\Constraints as Assert;
 
 class SettingsInputDTO
@@ -21,6 +22,24 @@ class SettingsInputDTO
     #[Assert\NotBlank(message: 'Max disk usage in GB cannot be blank')]
     public int $max_disk_usage_in_gb;
 
+    #[Assert\Choice(choices: Settings::DETECTION_ENGINES, message: 'Unknown detection engine')]
+    public ?string $detection_engine = null;
+
+    #[Assert\All([
+        new Assert\Collection(
+            fields: [
+                'motion_threshold'       => new Assert\Optional([new Assert\Type('integer'), new Assert\PositiveOrZero()]),
+                'roi_motion_threshold'   => new Assert\Optional([new Assert\Type('integer'), new Assert\PositiveOrZero()]),
+                'recording_extension'    => new Assert\Optional([new Assert\Type('integer'), new Assert\PositiveOrZero()]),
+                'max_recording_duration' => new Assert\Optional([new Assert\Type('integer'), new Assert\Positive()]),
+                'detection_engine'       => new Assert\Optional(new Assert\Choice(choices: Settings::DETECTION_ENGINES)),
+                'detection_area_points'  => new Assert\Optional(new Assert\Type('array')),
+                'detection_zones'        => new Assert\Optional(new Assert\Type('array')),
+            ]
+        )
+    ])]
+    public ?array $cameras = null;
+
     public function getMotionThreshold(): int
     {
         return $this->motion_threshold;
@@ -70,4 +89,24 @@ class SettingsInputDTO
     {
         $this->max_disk_usage_in_gb = $max_disk_usage_in_gb;
     }
+
+    public function getDetectionEngine(): ?string
+    {
+        return $this->detection_engine;
+    }
+
+    public function setDetectionEngine(?string $detection_engine): void
+    {
+        $this->detection_engine = $detection_engine;
+    }
+
+    public function getCameras(): ?array
+    {
+        return $this->cameras;
+    }
+
+    public function setCameras(?array $cameras): void
+    {
+        $this->cameras = $cameras;
+    }
 }
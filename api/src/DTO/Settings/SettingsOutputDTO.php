@@ -11,9 +11,12 @@ class SettingsOutputDTO
     public int $max_recording_duration;
     public int $max_disk_usage_in_gb;
     public array $detection_area_points;
+    public array $detection_zones;
+    public string $detection_engine;
+    public array $cameras;
     public ?string $placeholder_image_url;
 
-    public function __construct(int $id, int $motion_threshold, int $roi_motion_threshold, int $recording_extension, int $max_recording_duration, int $max_disk_usage_in_gb, array $detection_area_points, ?string $placeholder_image_url)
+    public function __construct(int $id, int $motion_threshold, int $roi_motion_threshold, int $recording_extension, int $max_recording_duration, int $max_disk_usage_in_gb, array $detection_area_points, ?string $placeholder_image_url, array $detection_zones = [], string $detection_engine = 'frame_diff', array $cameras = [])
     {
         $this->id = $id;
         $this->motion_threshold = $motion_threshold;
@@ -22,6 +25,9 @@ class SettingsOutputDTO
         $this->max_recording_duration = $max_recording_duration;
         $this->max_disk_usage_in_gb = $max_disk_usage_in_gb;
         $this->detection_area_points = $detection_area_points;
+        $this->detection_zones = $detection_zones;
+        $this->detection_engine = $detection_engine;
+        $this->cameras = $cameras;
         $this->placeholder_image_url = $placeholder_image_url;
     }
 }
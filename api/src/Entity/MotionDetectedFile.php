@@ -9,6 +9,7 @@ use Doctrine\ORM\Mapping as ORM;
 use Symfony\Component\Validator\Constraints as Assert;
 
 #[ORM\Entity(repositoryClass: MotionDetectedFileRepository::class)]
+#[ORM\Index(name: 'IDX_MOTION_DETECTED_FILE_EVENT', columns: ['event_id', 'segment_index'])]
 class MotionDetectedFile
 {
     #[ORM\Id]
@@ -45,6 +46,18 @@ class MotionDetectedFile
     #[ORM\Column]
     private bool $processed = false;
 
+    #[ORM\Column(type: 'json', nullable: true)]
+    private ?array $motion_metadata = null;
+
+    #[ORM\Column(length: 32, nullable: true)]
+    private ?string $event_id = null;
+
+    #[ORM\Column(nullable: true)]
+    private ?int $segment_index = null;
+
+    #[ORM\Column(options: ['default' => true])]
+    private bool $final_segment = true;
+
     #[ORM\Column]
     private \DateTimeImmutable $created_at;
 
@@ -72,14 +85,18 @@ class MotionDetectedFile
         );
     }
 
-    public static function createFromFile(string $file_name, string $file_path, int $file_size, bool $roi_triggered): self
+    public static function createFromFile(string $file_name, string $file_path, int $file_size, bool $roi_triggered, ?array $motion_metadata = null, ?string $event_id = null, ?int $segment_index = null, bool $final_segment = true): self
     {
-        return new self(
+        $motion_detected_file = new self(
             $file_name,
             $file_path,
             $file_size,
             $roi_triggered ? MotionDetectedFileTypeEnum::important : MotionDetectedFileTypeEnum::normal
         );
+        $motion_detected_file->setMotionMetadata($motion_metadata);
+        $motion_detected_file->setSegment($event_id, $segment_index, $final_segment);
+
+        return $motion_detected_file;
     }
 
     public function getId(): ?int
@@ -158,6 +175,47 @@ class MotionDetectedFile
         $this->processed = $processed;
     }
 
+    /**
+     * Per-frame motion timeline recorded by the camera, see motion_timeline.py on the device.
+     */
+    public function getMotionMetadata(): ?array
+    {
+        return $this->motion_metadata;
+    }
+
+    public function setMotionMetadata(?array $motion_metadata): void
+    {
+        $this->motion_metadata = $motion_metadata;
+    }
+
+    /**
+     * Event the file is a segment of, null for a clip uploaded in one piece.
+     */
+    public function getEventId(): ?string
+    {
+        return $this->event_id;
+    }
+
+    public function getSegmentIndex(): ?int
+    {
+        return $this->segment_index;
+    }
+
+    /**
+     * The last segment of its event, always true for a clip uploaded in one piece.
+     */
+    public function isFinalSegment(): bool
+    {
+        return $this->final_segment;
+    }
+
+    public function setSegment(?string $event_id, ?int $segment_index, bool $final_segment = true): void
+    {
+        $this->event_id = $event_id;
+        $this->segment_index = $event_id === null ? null : $segment_index;
+        $this->final_segment = $event_id === null || $final_segment;
+    }
+
     public function getCreatedAt(): ?\DateTimeImmutable
     {
         return $this->created_at;
@@ -10,6 +10,9 @@ use Doctrine\ORM\Mapping as ORM;
 #[ORM\Entity(repositoryClass: SettingsRepository::class)]
 class Settings
 {
+    // Background models the device can run, see python/motion_engines.py
+    public const DETECTION_ENGINES = ['frame_diff', 'running_average', 'mog2', 'knn'];
+
     #[ORM\Id]
     #[ORM\GeneratedValue]
     #[ORM\Column]
@@ -37,6 +40,16 @@ class Settings
     #[ORM\Column]
     private array $detection_area_points;
 
+    #[ORM\Column]
+    private array $detection_zones = [];
+
+    #[ORM\Column(length: 32, options: ['default' => 'frame_diff'])]
+    private string $detection_engine = 'frame_diff';
+
+    // Camera id from the device's Config.CAMERAS -> settings that differ from the ones above for that camera
+    #[ORM\Column]
+    private array $cameras = [];
+
     #[ORM\Column(nullable: true)]
     private ?string $placeholder_image_url;
 
@@ -59,12 +72,24 @@ class Settings
         $this->setRecordingExtension($input_dto->getRecordingExtension());
         $this->setMaxRecordingDuration($input_dto->getMaxRecordingDuration());
         $this->setMaxDiskUsageInGb($input_dto->getMaxDiskUsageInGb());
+        if ($input_dto->getDetectionEngine() !== null)
+        {
+            $this->setDetectionEngine($input_dto->getDetectionEngine());
+        }
+        if ($input_dto->getCameras() !== null)
+        {
+            $this->setCameras($input_dto->getCameras());
+        }
         return $this;
     }
 
     public function updateFromImageRegionDTO(SettingsImageRegionInputDTO $input_dto): self
     {
         $this->setDetectionAreaPoints($input_dto->getDetectionAreaPoints());
+        if ($input_dto->getDetectionZones() !== null)
+        {
+            $this->setDetectionZones($input_dto->getDetectionZones());
+        }
         return $this;
     }
 
@@ -143,6 +168,36 @@ class Settings
         $this->detection_area_points = $detection_area_points;
     }
 
+    public function getDetectionZones(): array
+    {
+        return $this->detection_zones;
+    }
+
+    public function setDetectionZones(array $detection_zones): void
+    {
+        $this->detection_zones = $detection_zones;
+    }
+
+    public function getDetectionEngine(): string
+    {
+        return $this->detection_engine;
+    }
+
+    public function setDetectionEngine(string $detection_engine): void
+    {
+        $this->detection_engine = $detection_engine;
+    }
+
+    public function getCameras(): array
+    {
+        return $this->cameras;
+    }
+
+    public function setCameras(array $cameras): void
+    {
+        $this->cameras = $cameras;
+    }
+
     public function getPlaceholderImageUrl(): ?string
     {
         return $this->placeholder_image_url;
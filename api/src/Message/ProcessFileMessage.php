@@ -6,6 +6,8 @@ class ProcessFileMessage
 {
     public function __construct(
         private int $id,
+        private bool $playable = false,
+        private bool $flipped_vertical = false,
     ) {
     }
 
@@ -13,4 +15,20 @@ class ProcessFileMessage
     {
         return $this->id;
     }
+
+    /**
+     * The device uploaded H.264 in MP4, which browsers play without transcoding.
+     */
+    public function isPlayable(): bool
+    {
+        return $this->playable;
+    }
+
+    /**
+     * The device already flipped the clip vertically.
+     */
+    public function isFlippedVertical(): bool
+    {
+        return $this->flipped_vertical;
+    }
 }
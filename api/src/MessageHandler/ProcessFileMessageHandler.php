@@ -43,7 +43,17 @@ class ProcessFileMessageHandler
         $unique_file_name_mp4 = FileHandler::getUniqueFileName($output_folder, $motion_detected_file->getFileNameForMp4());
         $output_file_path = $output_folder . DIRECTORY_SEPARATOR . $unique_file_name_mp4;
 
-        if (!$this->convertH264ToMp4($input_file_path, $output_file_path))
+        // Clips the device muxed and oriented already only have to be moved, everything else is transcoded.
+        // A flip the device applied that the server is not configured for is undone by flipping again.
+        $flip_vertical = $this->flip_vertical !== $message->isFlippedVertical();
+        if ($message->isPlayable() && !$flip_vertical)
+        {
+            if (!$this->publishPlayableFile($input_file_path, $output_file_path))
+            {
+                return false;
+            }
+        }
+        elseif (!$this->convertH264ToMp4($input_file_path, $output_file_path, $flip_vertical))
         {
             return false;
         }
@@ -57,7 +67,27 @@ class ProcessFileMessageHandler
         return true;
     }
 
-    public function convertH264ToMp4(string $input_file_path, string $output_file_path): bool
+    public function publishPlayableFile(string $input_file_path, string $output_file_path): bool
+    {
+        if (!rename($input_file_path, $output_file_path))
+        {
+            $this->conversion_logger->error("Moving playable file failed: $input_file_path", [
+                'input'  => $input_file_path,
+                'output' => $output_file_path,
+            ]);
+
+            return false;
+        }
+
+        $this->conversion_logger->info("Published playable file without conversion: $output_file_path", [
+            'input'  => $input_file_path,
+            'output' => $output_file_path,
+        ]);
+
+        return true;
+    }
+
+    public function convertH264ToMp4(string $input_file_path, string $output_file_path, ?bool $flip_vertical = null): bool
     {
         // Log starting of conversion
         $this->conversion_logger->info("Starting conversion for file: $input_file_path", [
@@ -75,7 +105,7 @@ class ProcessFileMessageHandler
         ];
 
         // Apply vertical flip filter if needed
-        if ($this->flip_vertical)
+        if ($flip_vertical ?? $this->flip_vertical)
         {
             $command[] = '-vf';
             $command[] = 'vflip';
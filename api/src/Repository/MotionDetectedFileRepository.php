@@ -59,6 +59,21 @@ class MotionDetectedFileRepository extends ServiceEntityRepository
             ->getResult();
     }
 
+    /**
+     * Processed segments of an event in playback order.
+     */
+    public function findEventSegments(string $event_id): array
+    {
+        return $this->createQueryBuilder('m')
+            ->where('m.event_id = :event_id')
+            ->andWhere('m.processed = :processed')
+            ->setParameter('event_id', $event_id)
+            ->setParameter('processed', true)
+            ->orderBy('m.segment_index', 'ASC')
+            ->getQuery()
+            ->getResult();
+    }
+
     public function getTotalFileSize(MotionDetectedFileTypeEnum $type): int
     {
         return (int)$this->createQueryBuilder('f')
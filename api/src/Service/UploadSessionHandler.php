@@ -0,0 +1,209 @@
+<?php
+
+namespace App\Service;
+
+class UploadSessionHandler
+{
+    // Completed sessions are kept so a client that lost the final response learns its upload went through
+    private const COMPLETED_RETENTION = 7 * 86400;
+    private const PRUNE_INTERVAL = 3600;
+
+    private string $upload_folder;
+
+    public function __construct(string $private_recordings_folder)
+    {
+        $this->upload_folder = rtrim($private_recordings_folder, DIRECTORY_SEPARATOR) . DIRECTORY_SEPARATOR . '.uploads';
+    }
+
+    public function create(string $file_name, int $file_size, bool $roi_triggered, ?array $motion_metadata = null, bool $playable = false, bool $flipped_vertical = false, ?string $event_id = null, ?int $segment_index = null, bool $final_segment = true): string
+    {
+        if (!is_dir($this->upload_folder))
+        {
+            mkdir($this->upload_folder, 0775, true);
+        }
+        $this->pruneCompleted();
+
+        $upload_id = bin2hex(random_bytes(16));
+        file_put_contents($this->getMetadataPath($upload_id), json_encode([
+            'file_name'        => basename($file_name),
+            'file_size'        => $file_size,
+            'roi_triggered'    => $roi_triggered,
+            'motion_metadata'  => $motion_metadata,
+            'playable'         => $playable,
+            'flipped_vertical' => $flipped_vertical,
+            'event_id'         => $event_id,
+            'segment_index'    => $segment_index,
+            'final_segment'    => $final_segment,
+        ]));
+        touch($this->getPartPath($upload_id));
+
+        return $upload_id;
+    }
+
+    /**
+     * Returns the session metadata with the number of bytes received so far, or null for an unknown session.
+     * Once the file has been moved out of the upload folder the offset stays at the file size, and a completed
+     * session carries the file_id of the registered file.
+     */
+    public function getSession(string $upload_id): ?array
+    {
+        $metadata_path = $this->getMetadataPath($upload_id);
+        if (!file_exists($metadata_path))
+        {
+            return null;
+        }
+
+        $session = json_decode(file_get_contents($metadata_path), true);
+        if (isset($session['stored_file_name']))
+        {
+            $session['offset'] = $session['file_size'];
+            return $session;
+        }
+
+        $part_path = $this->getPartPath($upload_id);
+        if (!file_exists($part_path))
+        {
+            return null;
+        }
+
+        clearstatcache(true, $part_path);
+        $session['offset'] = filesize($part_path);
+        return $session;
+    }
+
+    /**
+     * Runs the callback while holding an exclusive lock on the session, so a file is only registered once.
+     */
+    public function synchronized(string $upload_id, callable $callback): mixed
+    {
+        $handle = fopen($this->getLockPath($upload_id), 'c');
+        flock($handle, LOCK_EX);
+
+        try
+        {
+            return $callback();
+        }
+        finally
+        {
+            flock($handle, LOCK_UN);
+            fclose($handle);
+        }
+    }
+
+    /**
+     * Records that the received bytes were moved to the recordings folder under the given name.
+     */
+    public function markStored(string $upload_id, string $stored_file_name): void
+    {
+        $this->updateMetadata($upload_id, ['stored_file_name' => $stored_file_name]);
+    }
+
+    /**
+     * Records the file the upload was registered as, the session is answered as completed from now on.
+     */
+    public function markCompleted(string $upload_id, int $file_id): void
+    {
+        $this->updateMetadata($upload_id, ['file_id' => $file_id]);
+    }
+
+    /**
+     * Appends a request body stream at the given offset and returns the new offset.
+     * Returns null without writing anything when the offset does not match the bytes received so far,
+     * or when the upload was completed in the meantime.
+     *
+     * @param resource $stream
+     */
+    public function append(string $upload_id, int $offset, $stream): ?int
+    {
+        $part_path = $this->getPartPath($upload_id);
+        if (!file_exists($part_path))
+        {
+            // Already moved by the request that completed the upload
+            return null;
+        }
+
+        $handle = fopen($part_path, 'ab');
+        flock($handle, LOCK_EX);
+
+        try
+        {
+            clearstatcache(true, $part_path);
+            if (filesize($part_path) !== $offset)
+            {
+                return null;
+            }
+
+            stream_copy_to_stream($stream, $handle);
+            fflush($handle);
+
+            clearstatcache(true, $part_path);
+            return filesize($part_path);
+        }
+        finally
+        {
+            flock($handle, LOCK_UN);
+            fclose($handle);
+        }
+    }
+
+    public function getPartPath(string $upload_id): string
+    {
+        return $this->upload_folder . DIRECTORY_SEPARATOR . $upload_id . '.part';
+    }
+
+    public function remove(string $upload_id): void
+    {
+        foreach ([$this->getMetadataPath($upload_id), $this->getPartPath($upload_id), $this->getLockPath($upload_id)] as $path)
+        {
+            if (file_exists($path))
+            {
+                unlink($path);
+            }
+        }
+    }
+
+    private function getMetadataPath(string $upload_id): string
+    {
+        return $this->upload_folder . DIRECTORY_SEPARATOR . $upload_id . '.json';
+    }
+
+    private function getLockPath(string $upload_id): string
+    {
+        return $this->upload_folder . DIRECTORY_SEPARATOR . $upload_id . '.lock';
+    }
+
+    private function updateMetadata(string $upload_id, array $values): void
+    {
+        $metadata_path = $this->getMetadataPath($upload_id);
+        $metadata = json_decode(file_get_contents($metadata_path), true);
+        file_put_contents($metadata_path, json_encode(array_merge($metadata, $values)), LOCK_EX);
+    }
+
+    /**
+     * Removes completed sessions past their retention, at most once per PRUNE_INTERVAL.
+     */
+    private function pruneCompleted(): void
+    {
+        $marker_path = $this->upload_folder . DIRECTORY_SEPARATOR . '.pruned';
+        if (file_exists($marker_path) && filemtime($marker_path) > time() - self::PRUNE_INTERVAL)
+        {
+            return;
+        }
+        touch($marker_path);
+
+        foreach (glob($this->upload_folder . DIRECTORY_SEPARATOR . '*.json') as $metadata_path)
+        {
+            // Metadata is rewritten when the session completes, so its mtime is the completion time
+            if (filemtime($metadata_path) > time() - self::COMPLETED_RETENTION)
+            {
+                continue;
+            }
+
+            $metadata = json_decode(file_get_contents($metadata_path), true);
+            if (isset($metadata['file_id']))
+            {
+                $this->remove(basename($metadata_path, '.json'));
+            }
+        }
+    }
+}
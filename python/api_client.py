@@ -1,19 +1,31 @@
 import requests
+from requests.adapters import HTTPAdapter
 import time
 from datetime import datetime
+import json
 import os
 from config import Config
+import metrics
 
 class APIClient:
+    UPLOAD_STATE_SUFFIX = '.upload'  # Sidecar holding the server upload id of a partially uploaded clip
+
     def __init__(self):
         self.token = None
         self.base_url = Config.BASE_URL
+
+        # Keep-alive connections shared by every request, sized for the upload workers plus settings sync
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=Config.UPLOAD_WORKERS + 2)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
         self._authenticate()
 
     def _authenticate(self):
         """Authenticate and get JWT token"""
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}{Config.LOGIN_ENDPOINT}",
                 json=Config.AUTH_CREDENTIALS
             )
@@ -25,8 +37,11 @@ class APIClient:
             print(f"Authentication failed: {str(e)}")
             return False
 
-    def _make_request(self, method, endpoint, **kwargs):
-        """Make HTTP request with retry logic for unauthorized responses"""
+    def _make_request(self, method, endpoint, allowed_statuses=(), **kwargs):
+        """Make HTTP request with retry logic for unauthorized responses.
+
+        Responses with a status in allowed_statuses are returned to the caller instead of raising.
+        """
         if not self.token:
             if not self._authenticate():
                 raise Exception("Failed to authenticate")
@@ -38,8 +53,11 @@ class APIClient:
 
         for attempt in range(Config.MAX_RETRY_ATTEMPTS):
             try:
-                response = method(f"{self.base_url}{endpoint}", **kwargs)
-                
+                response = self.session.request(method, f"{self.base_url}{endpoint}", **kwargs)
+
+                if response.status_code in allowed_statuses:
+                    return response
+
                 if response.status_code == 401:  # Unauthorized
                     print("Token expired, reauthenticating...")
                     if self._authenticate():
@@ -58,56 +76,156 @@ class APIClient:
 
         raise Exception("Max retry attempts reached")
 
-    def upload_video(self, file_path, roi_triggered=False, timestamp=None):
-        """Upload video file to server"""
+    def upload_video(self, file_path, roi_triggered=False, timestamp=None, metadata_file=None, playable=False,
+                     flipped_vertical=False, segment=None):
+        """Upload video file to server in resumable chunks, continuing where a previous attempt stopped.
+
+        The motion timeline in metadata_file, if any, is sent along when the upload session is opened.
+        playable tells the server the clip can be served without transcoding. segment is
+        {'event_id', 'index', 'final'} for one segment of a longer event, None for a whole clip.
+        """
         try:
             if not os.path.exists(file_path):
                 raise FileNotFoundError(f"Video file not found: {file_path}")
 
-            with open(file_path, 'rb') as file:
-                files = {'file': file}
-                payload = {
-                    'roi_triggered': roi_triggered,
-                    'timestamp': timestamp
-                }
-
-                response = self._make_request(
-                    requests.post,
-                    Config.UPLOAD_ENDPOINT,
-                    files=files,
-                    data=payload,
-                    verify=False
-                )
-
-            if response.status_code == 200:
-                print(f"Successfully uploaded {file_path}")
-                # Remove file after successful upload
+            file_size = os.path.getsize(file_path)
+            if file_size == 0:
+                print(f"Skipping empty video file {file_path}")
                 os.remove(file_path)
+                self._remove_file(metadata_file)
                 return True
-            else:
-                print(f"Failed to upload {file_path}: {response.status_code}")
-                return False
+
+            upload_id, offset, completed = self._open_upload_session(file_path, file_size, roi_triggered, timestamp,
+                                                                     metadata_file, playable, flipped_vertical, segment)
+            if offset and not completed:
+                print(f"Resuming upload of {file_path} at {offset}/{file_size} bytes")
+
+            # Stream from disk one chunk at a time, the server reports its offset after every request. Once all
+            # bytes arrived an empty request at the end asks the server to finish the upload again, the clip is
+            # only done when the server says it registered it.
+            with open(file_path, 'rb') as file:
+                while not completed:
+                    file.seek(offset)
+                    chunk = file.read(Config.UPLOAD_CHUNK_SIZE)
+                    response = self._make_request(
+                        'PUT',
+                        f"{Config.UPLOAD_SESSION_ENDPOINT}/{upload_id}",
+                        allowed_statuses=(409,),  # Offset mismatch, the body tells us where to resume
+                        data=chunk,
+                        headers={
+                            'Upload-Offset': str(offset),
+                            'Content-Type': 'application/offset+octet-stream'
+                        },
+                        verify=False
+                    )
+                    body = response.json()
+                    if response.status_code == 200:
+                        metrics.UPLOAD_BYTES.inc(len(chunk))
+                        completed = body.get('completed') is True
+                    if not completed and not chunk and body['offset'] == offset:
+                        # The finishing request made no progress, keep the clip for the next attempt
+                        raise Exception(f"Server did not complete upload {upload_id} at {offset}/{file_size} bytes")
+                    offset = body['offset']
+
+            print(f"Successfully uploaded {file_path}")
+            # Remove file after the server confirmed it registered the upload
+            os.remove(file_path)
+            self._remove_file(metadata_file)
+            self._remove_upload_state(file_path)
+            return True
 
         except Exception as e:
             print(f"Error uploading {file_path}: {e}")
             return False
 
+    def _open_upload_session(self, file_path, file_size, roi_triggered, timestamp, metadata_file=None, playable=False,
+                             flipped_vertical=False, segment=None):
+        """Return (upload_id, offset, completed), resuming the session recorded next to the file when the server still knows it.
 
+        completed is True when the server already registered the file, e.g. after the final response was lost.
+        """
+        state_path = file_path + self.UPLOAD_STATE_SUFFIX
+        if os.path.exists(state_path):
+            with open(state_path) as state_file:
+                upload_id = state_file.read().strip()
 
-        except Exception as e:
-            print(f"Error uploading video: {str(e)}")
-            return False
+            response = self._make_request(
+                'GET',
+                f"{Config.UPLOAD_SESSION_ENDPOINT}/{upload_id}",
+                allowed_statuses=(404,),
+                verify=False
+            )
+            if response.status_code == 200:
+                session = response.json()
+                return upload_id, session['offset'], session.get('completed') is True
+
+        response = self._make_request(
+            'POST',
+            Config.UPLOAD_SESSION_ENDPOINT,
+            json={
+                'file_name': os.path.basename(file_path),
+                'file_size': file_size,
+                'roi_triggered': roi_triggered,
+                'timestamp': timestamp,
+                'motion_metadata': self._read_metadata(metadata_file),
+                'playable': playable,
+                'flipped_vertical': flipped_vertical,
+                'event_id': segment['event_id'] if segment else None,
+                'segment_index': segment['index'] if segment else None,
+                'final_segment': segment['final'] if segment else True
+            },
+            verify=False
+        )
+        upload_id = response.json()['upload_id']
+        with open(state_path, 'w') as state_file:
+            state_file.write(upload_id)
+        return upload_id, 0, False
+
+    def _read_metadata(self, metadata_file):
+        """Motion timeline of a clip, None when there is none or it cannot be read"""
+        if not metadata_file:
+            return None
+        try:
+            with open(metadata_file) as sidecar:
+                return json.load(sidecar)
+        except (OSError, ValueError) as e:
+            print(f"Uploading without motion metadata, cannot read {metadata_file}: {e}")
+            return None
+
+    def _remove_upload_state(self, file_path):
+        self._remove_file(file_path + self.UPLOAD_STATE_SUFFIX)
+
+    def _remove_file(self, path):
+        if not path:
+            return
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def get_settings(self, etag=None, wait=0):
+        """Fetch settings from the API.
 
-    def get_settings(self):
-        """Fetch settings from the API"""
+        Returns (settings, etag), where settings is None if they still match etag, or
+        None when the request failed. With wait the API holds the request for up to
+        that many seconds until the settings differ from etag.
+        """
         try:
+            headers = {'If-None-Match': etag} if etag else {}
+            params = {'wait': wait} if wait and etag else {}
             response = self._make_request(
-                requests.get,
-                Config.SETTINGS_ENDPOINT
+                'GET',
+                Config.SETTINGS_ENDPOINT,
+                allowed_statuses=(304,),
+                headers=headers,
+                params=params,
+                timeout=(10, wait + 10)
             )
 
+            if response.status_code == 304:
+                return None, etag
             if response.status_code == 200:
-                return response.json()
+                return response.json(), response.headers.get('ETag')
             return None
         except Exception as e:
             print(f"Error fetching settings: {str(e)}")
@@ -0,0 +1,194 @@
+import asyncio
+from quart import Quart, Response, abort, jsonify, render_template, request
+from hypercorn.config import Config as HypercornConfig
+from hypercorn.asyncio import serve
+from config import Config
+from stream_profile import StreamProfile
+import metrics
+
+class AsgiWebServer:
+    """Asyncio variant of WebServer, every MJPEG viewer is a coroutine instead of an OS thread"""
+    def __init__(self, cameras):
+        self.app = Quart(__name__)
+        self.cameras = cameras  # camera id -> CameraManager, in Config.CAMERAS order
+        self.default_camera_id = next(iter(cameras))
+        self._loop = None
+        self._frame_events = {}
+        self.setup_routes()
+
+    def _camera_id(self, camera_id):
+        camera_id = camera_id or self.default_camera_id
+        if camera_id not in self.cameras:
+            abort(404)
+        return camera_id
+
+    def _base_path(self, camera_id):
+        return f"/cameras/{camera_id}" if camera_id else ''
+
+    def setup_routes(self):
+        @self.app.before_serving
+        async def attach_frame_hubs():
+            # Wake the event loop from the capture threads whenever a frame is published
+            self._loop = asyncio.get_running_loop()
+            for camera_id, camera_manager in self.cameras.items():
+                self._frame_events[camera_id] = asyncio.Event()
+                camera_manager.frame_hub.add_listener(
+                    lambda sequence, camera_id=camera_id: self._loop.call_soon_threadsafe(self._on_frame_published, camera_id)
+                )
+
+        @self.app.route('/', defaults={'camera_id': None})
+        @self.app.route('/cameras/<camera_id>/')
+        async def index(camera_id):
+            return await render_template(
+                'index.html',
+                base_path=self._base_path(camera_id),
+                cameras=list(self.cameras),
+                camera_id=self._camera_id(camera_id)
+            )
+
+        @self.app.route('/cameras')
+        async def cameras():
+            return jsonify([
+                {'id': camera_id, 'stream_active': camera_manager.stream_active, 'stream_id': camera_manager.stream_id}
+                for camera_id, camera_manager in self.cameras.items()
+            ])
+
+        @self.app.route('/video_feed', defaults={'camera_id': None})
+        @self.app.route('/cameras/<camera_id>/video_feed')
+        async def video_feed(camera_id):
+            """MJPEG stream, ?width=, ?quality= and ?fps= pick a lighter profile for slow clients"""
+            response = Response(
+                self._generate_frames(self._camera_id(camera_id), StreamProfile.from_args(request.args)),
+                mimetype='multipart/x-mixed-replace; boundary=frame'
+            )
+            response.timeout = None  # Streams stay open for as long as the viewer watches
+            return response
+
+        @self.app.route('/single_frame', defaults={'camera_id': None})
+        @self.app.route('/cameras/<camera_id>/single_frame')
+        async def single_frame(camera_id):
+            camera_manager = self.cameras[self._camera_id(camera_id)]
+            profile = StreamProfile.from_args(request.args)
+            frame_data = await asyncio.to_thread(camera_manager.get_latest_frame, profile.width, profile.quality)
+            if frame_data:
+                return Response(frame_data, mimetype='image/jpeg')
+            return jsonify({'error': 'No frame available'}), 404
+
+        @self.app.route('/configure/<config_name>', defaults={'camera_id': None})
+        @self.app.route('/cameras/<camera_id>/configure/<config_name>')
+        async def configure(config_name, camera_id):
+            camera_manager = self.cameras[self._camera_id(camera_id)]
+            if config_name in Config.CAMERA_CONFIGS:
+                success = await asyncio.to_thread(camera_manager.configure, config_name)
+                return jsonify({
+                    'success': success,
+                    'stream_id': camera_manager.stream_id
+                })
+            return jsonify({'success': False})
+
+        @self.app.route('/debug_frame', defaults={'camera_id': None})
+        @self.app.route('/cameras/<camera_id>/debug_frame')
+        async def debug_frame(camera_id):
+            """Return a single frame with ROI visualization"""
+            camera_manager = self.cameras[self._camera_id(camera_id)]
+            debug_frame = await asyncio.to_thread(camera_manager.get_debug_frame)
+            if debug_frame:
+                return Response(debug_frame, mimetype='image/jpeg')
+            return jsonify({'error': 'No frame available'}), 404
+
+        @self.app.route('/debug_feed', defaults={'camera_id': None})
+        @self.app.route('/cameras/<camera_id>/debug_feed')
+        async def debug_feed(camera_id):
+            """MJPEG stream of debug frames, rendered once per frame for all viewers"""
+            response = Response(
+                self._generate_debug_frames(self._camera_id(camera_id)),
+                mimetype='multipart/x-mixed-replace; boundary=frame'
+            )
+            response.timeout = None
+            return response
+
+        @self.app.route('/detection_stats', defaults={'camera_id': None})
+        @self.app.route('/cameras/<camera_id>/detection_stats')
+        async def detection_stats(camera_id):
+            """Return the per-frame cost of the active detection engine"""
+            return jsonify(self.cameras[self._camera_id(camera_id)].motion_detector.get_stats())
+
+        @self.app.route('/metrics')
+        async def metrics_endpoint():
+            """Prometheus text format, or JSON with ?format=json"""
+            if request.args.get('format') == 'json':
+                return jsonify(metrics.REGISTRY.to_dict())
+            return Response(metrics.REGISTRY.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+        @self.app.route('/debug_view', defaults={'camera_id': None})
+        @self.app.route('/cameras/<camera_id>/debug_view')
+        async def debug_view(camera_id):
+            self._camera_id(camera_id)
+            return await render_template('debug_roi.html', base_path=self._base_path(camera_id))
+
+    def _on_frame_published(self, camera_id):
+        """Runs on the event loop, releases every generator waiting for a frame of this camera"""
+        self._frame_events[camera_id].set()
+        self._frame_events[camera_id] = asyncio.Event()
+
+    async def _generate_frames(self, camera_id, profile):
+        camera_manager = self.cameras[camera_id]
+        sequence = 0
+        camera_manager.add_viewer()
+        try:
+            while camera_manager.stream_active:
+                started = asyncio.get_running_loop().time()
+                latest_sequence, frame = camera_manager.frame_hub.latest()
+                if frame is None or latest_sequence <= sequence:
+                    try:
+                        await asyncio.wait_for(self._frame_events[camera_id].wait(), timeout=1.0)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                # Slow viewers skip straight to the latest frame
+                if sequence:
+                    metrics.STREAM_FRAMES_SKIPPED.inc(latest_sequence - sequence - 1)
+                sequence = latest_sequence
+                if frame.is_encoded_as(profile.width, profile.quality):
+                    frame_data = frame.encode(profile.width, profile.quality)
+                else:
+                    # The first viewer of a frame and profile pays for the encode off the event loop
+                    frame_data = await asyncio.to_thread(frame.encode, profile.width, profile.quality)
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + frame_data + b'\r\n')
+                if profile.interval:
+                    await asyncio.sleep(max(0, profile.interval - (asyncio.get_running_loop().time() - started)))
+        finally:
+            camera_manager.remove_viewer()
+
+    async def _generate_debug_frames(self, camera_id):
+        camera_manager = self.cameras[camera_id]
+        sequence = 0
+        interval = 1 / Config.DEBUG_FEED_FPS
+        camera_manager.add_viewer()
+        try:
+            while camera_manager.stream_active:
+                started = asyncio.get_running_loop().time()
+                latest_sequence, frame = camera_manager.frame_hub.latest()
+                if frame is None or latest_sequence <= sequence:
+                    try:
+                        await asyncio.wait_for(self._frame_events[camera_id].wait(), timeout=1.0)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                sequence = latest_sequence
+                # Rendering happens off the event loop, concurrent viewers wait for the same render
+                frame_data = await asyncio.to_thread(camera_manager.get_debug_frame_for, sequence, frame)
+                if frame_data:
+                    yield (b'--frame\r\n'
+                           b'Content-Type: image/jpeg\r\n\r\n' + frame_data + b'\r\n')
+                await asyncio.sleep(max(0, interval - (asyncio.get_running_loop().time() - started)))
+        finally:
+            camera_manager.remove_viewer()
+
+    def run(self):
+        config = HypercornConfig()
+        config.bind = [f"{Config.SERVER_HOST}:{Config.SERVER_PORT}"]
+        asyncio.run(serve(self.app, config))
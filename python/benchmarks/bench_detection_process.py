@@ -0,0 +1,112 @@
+"""Compare motion detection in the capture thread with detection in a worker process.
+
+Every frame is pushed through the same loop the capture thread runs: an optional
+JPEG encode for viewers followed by handing the frame to the detector. Inline, the
+detector downsamples and runs the engine before the loop can continue; with the
+worker the loop only copies the frame into the shared-memory ring. Frames are
+full-size grayscale as on the decoded-JPEG path (RAW_DETECTION off).
+
+    python benchmarks/bench_detection_process.py
+    python benchmarks/bench_detection_process.py --presets full_res --engine mog2 --no-encode
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+from config import Config
+from detection_process import ProcessMotionDetector
+from motion_detector import MotionDetector
+from motion_engines import ENGINES
+from replay import StaticSettingsManager, StubVideoHandler
+from bench_pipeline import make_frames
+
+def run_loop(detector, frames, encode_frames, duration):
+    """Feed frames for duration seconds, returns (frames fed, seconds)"""
+    fed = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        index = fed % len(frames)
+        if encode_frames:
+            cv2.imencode('.jpg', encode_frames[index])
+        detector.process_gray(frames[index], fed / 30)
+        fed += 1
+    return fed, time.perf_counter() - start
+
+def bench_preset(config_name, engine, encode, duration):
+    size = Config.CAMERA_CONFIGS[config_name]['size']
+    first_bgr, second_bgr = make_frames(size)
+    frames = [cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) for frame in (first_bgr, second_bgr)]
+    encode_frames = [first_bgr, second_bgr] if encode else None
+    result = {}
+
+    video_handler = StubVideoHandler()
+    detector = MotionDetector(video_handler, StaticSettingsManager(detection_engine=engine))
+    fed, seconds = run_loop(detector, frames, encode_frames, duration)
+    result['inline'] = {
+        'loop_fps': round(fed / seconds, 1),
+        'detected_fps': round(fed / seconds, 1),
+        'recording_events': len(video_handler.events)
+    }
+
+    video_handler = StubVideoHandler()
+    detector = ProcessMotionDetector(video_handler, StaticSettingsManager(detection_engine=engine))
+    try:
+        # Let the worker start and import OpenCV before timing
+        detector.process_gray(frames[0], 0.0)
+        while detector._worker_stats is None:
+            time.sleep(0.05)
+            detector.process_gray(frames[1], 0.0)
+
+        before = detector.get_stats()['worker_frames']
+        fed, seconds = run_loop(detector, frames, encode_frames, duration)
+        reported = detector._worker_stats
+        deadline = time.monotonic() + 3
+        while detector._worker_stats is reported and time.monotonic() < deadline:
+            time.sleep(0.05)
+        stats = detector.get_stats()
+        processed = stats['worker_frames'] - before
+    finally:
+        detector.stop()
+
+    result['process'] = {
+        'loop_fps': round(fed / seconds, 1),
+        'detected_fps': round(processed / seconds, 1),
+        'worker_frames_dropped': stats['worker_frames_dropped'],
+        'recording_events': len(video_handler.events)
+    }
+    result['loop_speedup'] = round(result['process']['loop_fps'] / result['inline']['loop_fps'], 2)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--presets', nargs='+', default=['1080p', 'full_res'], choices=list(Config.CAMERA_CONFIGS))
+    parser.add_argument('--engine', choices=sorted(ENGINES), default=Config.DEFAULT_DETECTION_ENGINE)
+    parser.add_argument('--no-encode', action='store_true', help='leave out the JPEG encode viewers cost the capture thread')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per mode and preset')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args()
+
+    results = {'meta': {'cpus': os.cpu_count(), 'engine': args.engine, 'encode': not args.no_encode}, 'results': {}}
+    for config_name in args.presets:
+        # The detector prints status lines, keep them out of the report
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            result = bench_preset(config_name, args.engine, not args.no_encode, args.duration)
+        results['results'][config_name] = result
+
+        print(f"{config_name} {Config.CAMERA_CONFIGS[config_name]['size']}")
+        for mode in ('inline', 'process'):
+            print(f"  {mode:<8} capture loop {result[mode]['loop_fps']:>7.1f} fps, detected {result[mode]['detected_fps']:>7.1f} fps")
+        print(f"  capture loop speedup x{result['loop_speedup']}, worker dropped {result['process']['worker_frames_dropped']} frames")
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Compare the JPEG codec backends on every camera preset.
+
+Each installed backend encodes and decodes the same synthetic frame the way the
+pipeline does: BGR and grey encodes for the stream, a YUV420 encode as picamera2
+would hand it over, and full, grey and scaled grey decodes for detection.
+Backends that are not installed are reported and skipped.
+
+    python benchmarks/bench_jpeg_codec.py --output codecs.json
+    python benchmarks/bench_jpeg_codec.py --presets 1080p --codecs opencv turbojpeg
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+from bench_pipeline import make_frames, time_stage
+from config import Config
+from jpeg_codec import CODECS, create_codec
+
+def bench_codec(codec, config_name, repeat):
+    width, height = Config.CAMERA_CONFIGS[config_name]['size']
+    _, rgb = make_frames((width, height))
+    bgr = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+    gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+    yuv = cv2.cvtColor(bgr, cv2.COLOR_BGR2YUV_I420)
+    jpeg = codec.encode(bgr)
+
+    stages = {
+        'encode_bgr': lambda: codec.encode(bgr),
+        'encode_gray': lambda: codec.encode(gray),
+        'encode_yuv420': lambda: codec.encode_yuv420(yuv, width, height),
+        'decode_bgr': lambda: codec.decode(jpeg),
+        'decode_gray': lambda: codec.decode(jpeg, grayscale=True),
+        'decode_gray_scaled': lambda: codec.decode(jpeg, grayscale=True, min_width=Config.ANALYSIS_WIDTH)
+    }
+    results = {name: time_stage(function, repeat) for name, function in stages.items()}
+    results['jpeg_bytes'] = len(jpeg)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--presets', nargs='+', default=list(Config.CAMERA_CONFIGS), choices=list(Config.CAMERA_CONFIGS))
+    parser.add_argument('--codecs', nargs='+', default=list(CODECS), choices=list(CODECS))
+    parser.add_argument('--repeat', type=int, default=30, help='timed iterations per stage')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args()
+
+    codecs = {}
+    for name in args.codecs:
+        try:
+            codecs[name] = create_codec(name)
+        except (ImportError, OSError, RuntimeError) as e:
+            print(f"Skipping {name}: {str(e)}")
+
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'machine': platform.machine(),
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'quality': Config.JPEG_QUALITY,
+            'repeat': args.repeat
+        },
+        'results': {name: {} for name in codecs}
+    }
+
+    for config_name in args.presets:
+        print(f"{config_name} {Config.CAMERA_CONFIGS[config_name]['size']}")
+        for name, codec in codecs.items():
+            timings = bench_codec(codec, config_name, args.repeat)
+            results['results'][name][config_name] = timings
+            print(f"  {name} ({timings['jpeg_bytes'] // 1024} KiB per frame)")
+            for stage, timing in timings.items():
+                if stage != 'jpeg_bytes':
+                    print(f"    {stage:<20} {timing['median_ms']:>9.3f} ms  (p95 {timing['p95_ms']:.3f} ms)")
+
+        # Speedup of every other backend over OpenCV, the one that is always there
+        if 'opencv' in codecs:
+            baseline = results['results']['opencv'][config_name]
+            for name in codecs:
+                if name == 'opencv':
+                    continue
+                speedups = ', '.join(
+                    f"{stage} x{baseline[stage]['median_ms'] / timing['median_ms']:.2f}"
+                    for stage, timing in results['results'][name][config_name].items()
+                    if stage != 'jpeg_bytes' and timing['median_ms']
+                )
+                print(f"  {name} vs opencv: {speedups}")
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""Time every hot stage of the capture/detection pipeline for each camera preset.
+
+Frames are synthetic, so results are reproducible on any machine. Results are
+written as JSON and can be compared against a saved baseline; the script exits
+with status 1 when a stage got slower than the tolerance allows.
+
+    python benchmarks/bench_pipeline.py --output results.json
+    python benchmarks/bench_pipeline.py --baseline baseline_pi4.json --tolerance 0.15
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+from blob_filter import BlobFilter
+from config import Config
+from detection_zones import ZoneSet, zone_definitions
+from motion_detector import MotionDetector
+from replay import StaticSettingsManager, StubVideoHandler
+
+ROI_POINTS = [{'x': 0.2, 'y': 0.2}, {'x': 0.8, 'y': 0.25}, {'x': 0.7, 'y': 0.9}, {'x': 0.15, 'y': 0.75}]
+
+def make_frames(size, seed=0):
+    """Two consecutive RGB frames of a textured scene with an object that moved between them"""
+    width, height = size
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 255, (height // 16 + 1, width // 16 + 1, 3), dtype=np.uint8)
+    scene = cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+
+    first = scene.copy()
+    second = scene.copy()
+    block = max(width, height) // 10
+    cv2.rectangle(first, (width // 4, height // 3), (width // 4 + block, height // 3 + block), (230, 230, 230), -1)
+    cv2.rectangle(second, (width // 4 + block // 3, height // 3), (width // 4 + block + block // 3, height // 3 + block), (230, 230, 230), -1)
+    return first, second
+
+def time_stage(function, repeat, warmup=3):
+    """Median and 95th percentile of a stage in milliseconds"""
+    for _ in range(warmup):
+        function()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'median_ms': round(statistics.median(samples), 4),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4)
+    }
+
+def bench_preset(config_name, repeat):
+    size = Config.CAMERA_CONFIGS[config_name]['size']
+    first_rgb, second_rgb = make_frames(size)
+    first_bgr = cv2.cvtColor(first_rgb, cv2.COLOR_RGB2BGR)
+    second_bgr = cv2.cvtColor(second_rgb, cv2.COLOR_RGB2BGR)
+    jpeg = cv2.imencode('.jpg', second_bgr)[1].tobytes()
+    jpeg_buffer = np.frombuffer(jpeg, np.uint8)
+    first_gray = cv2.cvtColor(first_bgr, cv2.COLOR_BGR2GRAY)
+    second_gray = cv2.cvtColor(second_bgr, cv2.COLOR_BGR2GRAY)
+    delta = cv2.absdiff(first_gray, second_gray)
+    thresh = cv2.threshold(delta, Config.PIXEL_DIFF_THRESHOLD, 255, cv2.THRESH_BINARY)[1]
+
+    settings_manager = StaticSettingsManager(detection_area_points=ROI_POINTS)
+    detector = MotionDetector(StubVideoHandler(), settings_manager)
+    zones = ZoneSet(zone_definitions(settings_manager), second_gray.shape)
+    detector.process_gray(second_gray)  # Builds the zones at analysis size like the live pipeline
+
+    # The blob filter only ever sees masks at the analysis size
+    analysis_delta = cv2.absdiff(detector.downsample(first_gray), detector.downsample(second_gray))
+    analysis_thresh = cv2.threshold(analysis_delta, Config.PIXEL_DIFF_THRESHOLD, 255, cv2.THRESH_BINARY)[1]
+    blob_filter = BlobFilter()
+
+    stages = {
+        'color_convert': lambda: cv2.cvtColor(second_rgb, cv2.COLOR_RGB2BGR),
+        'jpeg_encode': lambda: cv2.imencode('.jpg', second_bgr),
+        'jpeg_decode_gray': lambda: cv2.imdecode(jpeg_buffer, cv2.IMREAD_GRAYSCALE),
+        'downsample': lambda: detector.downsample(second_gray),
+        'absdiff': lambda: cv2.absdiff(first_gray, second_gray),
+        'threshold': lambda: cv2.threshold(delta, Config.PIXEL_DIFF_THRESHOLD, 255, cv2.THRESH_BINARY),
+        'count_nonzero': lambda: cv2.countNonZero(thresh),
+        'zone_score': lambda: zones.score(zones.exclude(thresh)),
+        'blob_filter': lambda: blob_filter.apply(analysis_thresh),
+        'debug_frame': lambda: detector.get_debug_frame(jpeg),
+        'debug_render': lambda: detector.render_debug_frame(second_bgr)
+    }
+    return {name: time_stage(function, repeat) for name, function in stages.items()}
+
+def compare(results, baseline, tolerance):
+    """Return a list of (preset, stage, baseline ms, current ms, change) for every regression"""
+    regressions = []
+    for config_name, stages in results['results'].items():
+        for stage, timing in stages.items():
+            previous = baseline.get('results', {}).get(config_name, {}).get(stage)
+            if not previous or not previous['median_ms']:
+                continue
+            change = timing['median_ms'] / previous['median_ms'] - 1
+            if change > tolerance:
+                regressions.append((config_name, stage, previous['median_ms'], timing['median_ms'], change))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--presets', nargs='+', default=list(Config.CAMERA_CONFIGS), choices=list(Config.CAMERA_CONFIGS))
+    parser.add_argument('--repeat', type=int, default=30, help='timed iterations per stage')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='allowed slowdown per stage, 0.10 is 10%%')
+    args = parser.parse_args()
+
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'machine': platform.machine(),
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'threads': cv2.getNumThreads(),
+            'repeat': args.repeat
+        },
+        'results': {}
+    }
+
+    # The detector prints status lines, keep them out of the report
+    stdout = sys.stdout
+    for config_name in args.presets:
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            results['results'][config_name] = bench_preset(config_name, args.repeat)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+        print(f"{config_name} {Config.CAMERA_CONFIGS[config_name]['size']}")
+        for stage, timing in results['results'][config_name].items():
+            print(f"  {stage:<18} {timing['median_ms']:>9.3f} ms  (p95 {timing['p95_ms']:.3f} ms)")
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} stage(s) slower than baseline by more than {args.tolerance:.0%}:")
+            for config_name, stage, previous, current, change in regressions:
+                print(f"  {config_name:<8} {stage:<18} {previous:.3f} -> {current:.3f} ms ({change:+.0%})")
+            sys.exit(1)
+        print(f"\nNo stage slower than baseline by more than {args.tolerance:.0%}")
+
+if __name__ == '__main__':
+    main()
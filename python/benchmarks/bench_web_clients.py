@@ -0,0 +1,208 @@
+"""Measure how many concurrent MJPEG viewers the flask and asgi server modes sustain.
+
+The server runs in a child process fed by a synthetic camera, so this works on any
+Linux box. For every client count it reports delivered fps per viewer and the
+server's CPU, RSS and thread count.
+
+    python benchmarks/bench_web_clients.py --modes flask asgi --clients 1 10 50 100
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+from config import Config
+from frame_hub import FrameHub
+import metrics
+
+class SyntheticFrame:
+    """Stand-in for CapturedFrame with the JPEG already encoded"""
+    is_encoded = True
+
+    def __init__(self, jpeg):
+        self.jpeg = jpeg
+
+    def is_encoded_as(self, width=None, quality=None):
+        return True
+
+    def encode(self, width=None, quality=None):
+        return self.jpeg
+
+class SyntheticCameraManager:
+    """Duck-typed CameraManager that publishes pre-encoded noise frames at a fixed rate"""
+    def __init__(self, size, fps):
+        self.stream_active = True
+        self.stream_id = time.time()
+        self.motion_detector = None
+        self.frame_hub = FrameHub()
+
+        width, height = size
+        rng = np.random.default_rng(0)
+        self._frames = []
+        for _ in range(8):
+            image = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+            image = cv2.GaussianBlur(image, (0, 0), 3)  # Compresses like a real scene, not like white noise
+            self._frames.append(SyntheticFrame(cv2.imencode('.jpg', image)[1].tobytes()))
+
+        self._interval = 1 / fps
+        threading.Thread(target=self._publish_loop, daemon=True).start()
+
+    def _publish_loop(self):
+        index = 0
+        while self.stream_active:
+            self.frame_hub.publish(self._frames[index % len(self._frames)])
+            index += 1
+            time.sleep(self._interval)
+
+    def add_viewer(self):
+        metrics.STREAM_VIEWERS.inc()
+
+    def remove_viewer(self):
+        metrics.STREAM_VIEWERS.dec()
+
+    def get_latest_frame(self, width=None, quality=None):
+        _, frame = self.frame_hub.latest()
+        return frame.jpeg if frame else None
+
+    def wait_for_frame(self, after_sequence, timeout=1.0, width=None, quality=None):
+        sequence, frame = self.frame_hub.wait_for_next(after_sequence, timeout)
+        return sequence, frame.jpeg if frame else None
+
+    def configure(self, config_name):
+        return True
+
+def serve(mode, port, size, fps):
+    Config.SERVER_HOST = '127.0.0.1'
+    Config.SERVER_PORT = port
+    camera_manager = SyntheticCameraManager(size, fps)
+    if mode == 'asgi':
+        from asgi_server import AsgiWebServer
+        server = AsgiWebServer({'cam0': camera_manager})
+    else:
+        import logging
+        from web_server import WebServer
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        server = WebServer({'cam0': camera_manager})
+    server.run()
+
+def wait_for_port(port, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+def read_process_stats(pid):
+    """CPU seconds, RSS in MB and thread count of a process from /proc"""
+    with open(f"/proc/{pid}/stat") as stat_file:
+        fields = stat_file.read().rsplit(')', 1)[1].split()
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+    rss_mb, threads = 0.0, 0
+    with open(f"/proc/{pid}/status") as status_file:
+        for line in status_file:
+            if line.startswith('VmRSS:'):
+                rss_mb = int(line.split()[1]) / 1024
+            elif line.startswith('Threads:'):
+                threads = int(line.split()[1])
+    return cpu_seconds, rss_mb, threads
+
+async def read_stream(port, duration):
+    """Hold one /video_feed connection open for duration seconds and count the frames received"""
+    boundary = b'--frame'
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(b'GET /video_feed HTTP/1.1\r\nHost: localhost\r\n\r\n')
+    await writer.drain()
+
+    frames = 0
+    tail = b''
+    deadline = time.monotonic() + duration
+    try:
+        while (remaining := deadline - time.monotonic()) > 0:
+            chunk = await asyncio.wait_for(reader.read(65536), remaining)
+            if not chunk:
+                break
+            frames += (tail + chunk).count(boundary)
+            tail = chunk[-(len(boundary) - 1):]
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        writer.close()
+    return frames
+
+async def run_clients(port, clients, duration, pid):
+    tasks = [asyncio.create_task(read_stream(port, duration)) for _ in range(clients)]
+    # Sample the server while all viewers are connected
+    await asyncio.sleep(min(1.0, duration / 4))
+    cpu_start, _, _ = read_process_stats(pid)
+    sample_start = time.monotonic()
+    await asyncio.sleep(duration / 2)
+    cpu_end, rss_mb, threads = read_process_stats(pid)
+    cpu_percent = 100 * (cpu_end - cpu_start) / (time.monotonic() - sample_start)
+    frames = await asyncio.gather(*tasks, return_exceptions=True)
+    frames = [count if isinstance(count, int) else 0 for count in frames]
+    return frames, cpu_percent, rss_mb, threads
+
+def measure(mode, clients, args, port):
+    server = multiprocessing.Process(target=serve, args=(mode, port, args.size, args.fps), daemon=True)
+    server.start()
+    try:
+        if not wait_for_port(port):
+            raise RuntimeError(f"{mode} server did not start")
+        time.sleep(0.5)
+        frames, cpu_percent, rss_mb, threads = asyncio.run(run_clients(port, clients, args.duration, server.pid))
+    finally:
+        server.terminate()
+        server.join()
+
+    per_client_fps = [count / args.duration for count in frames]
+    return {
+        'mode': mode,
+        'clients': clients,
+        'source_fps': args.fps,
+        'frame_size': list(args.size),
+        'min_client_fps': round(min(per_client_fps), 2),
+        'avg_client_fps': round(sum(per_client_fps) / len(per_client_fps), 2),
+        'server_cpu_percent': round(cpu_percent, 1),
+        'server_rss_mb': round(rss_mb, 1),
+        'server_threads': threads
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', default=['flask', 'asgi'], choices=['flask', 'asgi'])
+    parser.add_argument('--clients', nargs='+', type=int, default=[1, 10, 50, 100])
+    parser.add_argument('--duration', type=float, default=8.0, help='seconds each client stays connected')
+    parser.add_argument('--fps', type=float, default=30.0, help='rate the synthetic camera publishes at')
+    parser.add_argument('--size', nargs=2, type=int, default=[1280, 720], metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--port', type=int, default=18080)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'mode':<6} {'clients':>7} {'min fps':>8} {'avg fps':>8} {'cpu %':>6} {'rss MB':>7} {'threads':>7}")
+    for mode in args.modes:
+        for index, clients in enumerate(args.clients):
+            result = measure(mode, clients, args, args.port + index)
+            results.append(result)
+            print(f"{mode:<6} {clients:>7} {result['min_client_fps']:>8} {result['avg_client_fps']:>8} "
+                  f"{result['server_cpu_percent']:>6} {result['server_rss_mb']:>7} {result['server_threads']:>7}")
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+import time
+import cv2
+import numpy as np
+from config import Config
+
+class BlobFilter:
+    """Cleans a motion mask down to blobs that look like real movers.
+
+    Opening removes single-pixel noise, closing joins the pieces of one object. Blobs
+    smaller than BLOB_MIN_AREA or with an aspect ratio outside BLOB_ASPECT_RANGE are
+    dropped, and a frame with more than BLOB_MAX_COUNT blobs is treated as rain or
+    sensor noise and cleared. When the average cost goes over BLOB_TIME_BUDGET_MS the
+    morphology is skipped until it is back under budget.
+    """
+    def __init__(self):
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (Config.BLOB_MORPH_KERNEL, Config.BLOB_MORPH_KERNEL))
+        self.blobs = []  # (x, y, width, height, area) in analysis pixels of the blobs that survived the last frame
+        self.frames_processed = 0
+        self.frames_rejected = 0  # Frames cleared because they had too many blobs
+        self.blobs_removed = 0
+        self.frames_over_budget = 0
+        self.avg_frame_time = 0.0  # Exponential moving average in seconds
+
+    def apply(self, thresh):
+        """Return the mask with only the surviving blobs, their boxes are left in self.blobs"""
+        start = time.perf_counter()
+        over_budget = self.avg_frame_time * 1000 > Config.BLOB_TIME_BUDGET_MS
+        if over_budget:
+            self.frames_over_budget += 1
+        elif Config.BLOB_MORPH_KERNEL > 1:
+            thresh = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, self.kernel)
+            thresh = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, self.kernel)
+
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(thresh, connectivity=8)
+        # Area threshold follows the frame size like the API thresholds
+        reference_area = Config.THRESHOLD_REFERENCE_SIZE[0] * Config.THRESHOLD_REFERENCE_SIZE[1]
+        min_area = Config.BLOB_MIN_AREA * thresh.shape[0] * thresh.shape[1] / reference_area
+        min_aspect, max_aspect = Config.BLOB_ASPECT_RANGE
+
+        keep = []
+        for label in range(1, count):  # Label 0 is the background
+            x, y, width, height, area = stats[label]
+            if area >= min_area and min_aspect <= width / height <= max_aspect:
+                keep.append(label)
+        self.blobs_removed += count - 1 - len(keep)
+
+        if len(keep) > Config.BLOB_MAX_COUNT:
+            self.frames_rejected += 1
+            self.blobs_removed += len(keep)
+            keep = []
+
+        self.blobs = [tuple(int(value) for value in stats[label]) for label in keep]
+        if len(keep) == count - 1:
+            mask = thresh
+        elif keep:
+            lookup = np.zeros(count, dtype=np.uint8)
+            lookup[keep] = 255
+            mask = lookup[labels]
+        else:
+            mask = np.zeros_like(thresh)
+
+        elapsed = time.perf_counter() - start
+        if self.frames_processed == 0:
+            self.avg_frame_time = elapsed
+        elif over_budget:
+            # Decay while morphology is off so it is tried again after a while
+            self.avg_frame_time *= 0.95
+        else:
+            self.avg_frame_time += (elapsed - self.avg_frame_time) * 0.05
+        self.frames_processed += 1
+        return mask, self.blobs
+
+    def get_stats(self):
+        return {
+            'blob_frames_processed': self.frames_processed,
+            'blob_frames_rejected': self.frames_rejected,
+            'blob_frames_over_budget': self.frames_over_budget,
+            'blobs_removed': self.blobs_removed,
+            'blob_avg_frame_ms': round(self.avg_frame_time * 1000, 3)
+        }
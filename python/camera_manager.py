@@ -1,33 +1,46 @@
-from picamera2 import Picamera2
-from picamera2.encoders import H264Encoder
-from picamera2.outputs import FileOutput
-from queue import Queue
-import cv2
-import numpy as np
 import time
-from datetime import datetime
-import io
 import threading
 from config import Config
+from frame_hub import FrameHub
+from frame_source import PicameraFrameSource
+from jpeg_codec import get_codec
+from frame_scheduler import FrameScheduler
+import metrics
 
 class CameraManager:
-    def __init__(self):
+    def __init__(self, frame_source=None, camera_id=None, detection_pool=None):
+        self.frame_source = frame_source or PicameraFrameSource()
+        self.camera_id = camera_id
+        self.detection_pool = detection_pool  # Shared with the other cameras, None to detect on the capture thread
         self.stream_active = False
         self.motion_detector = None
+        self.video_handler = None
         self.picam2 = None
         self.stream_id = None
-        self.frame_queue = Queue(maxsize=2)  # Buffer for latest frame
+        self.frame_hub = FrameHub()  # Latest frame, shared by every viewer
+        default_config = Config.CAMERA_CONFIGS[Config.DEFAULT_CONFIG]
+        self.scheduler = FrameScheduler(default_config['idle_fps'], default_config['active_fps'])
         self.motion_detection_thread = None
         self.should_run = False
+        self.capture_fps = 0.0
+        self.viewers = 0
+        self._viewers_lock = threading.Lock()
+        self._debug_sequence = None
+        self._debug_jpeg = None
+        self._debug_lock = threading.Lock()
 
     def initialize(self):
         try:
-            from picamera2 import Picamera2
-            self.picam2 = Picamera2()
+            if not self.frame_source.open():
+                return False
+            # Only the camera source has a picamera2 instance for the video handler to record from
+            self.picam2 = getattr(self.frame_source, 'picam2', None)
             self.stream_active = True
             self.should_run = True
             # Start the continuous capture thread
-            self.motion_detection_thread = threading.Thread(target=self._continuous_capture, daemon=True)
+            self.motion_detection_thread = threading.Thread(
+                target=self._continuous_capture, daemon=True, name=f"capture-{self.camera_id or 'default'}"
+            )
             self.motion_detection_thread.start()
             return True
         except Exception as e:
@@ -37,74 +50,147 @@ class CameraManager:
     def set_motion_detector(self, detector):
         self.motion_detector = detector
 
+    def set_video_handler(self, video_handler):
+        self.video_handler = video_handler
+
     def _continuous_capture(self):
         """Continuously capture frames and process them for motion detection"""
+        fps_window_start = time.time()
+        fps_window_frames = 0
         while self.should_run:
             try:
-                frame_data = self.capture_frame()
-                if frame_data:
-                    # Update the frame queue with the latest frame
-                    if self.frame_queue.full():
-                        self.frame_queue.get()  # Remove old frame
-                    self.frame_queue.put(frame_data)
+                # Wait for the next absolute deadline, late frames skip slots instead of drifting
+                self.scheduler.wait()
+
+                with metrics.CAPTURE_SECONDS.time():
+                    frame = self.capture_frame()
+                if frame is None and not self.frame_source.live:
+                    # A source closed by stop_stream() returns None as well, that is not the end of the recording
+                    if self.should_run:
+                        print("Frame source exhausted, stopping capture")
+                    self.stream_active = False
+                    self.frame_hub.close()
+                    break
+                if frame:
+                    metrics.CAPTURE_FRAMES.inc()
+                    fps_window_frames += 1
+                    now = time.time()
+                    if now - fps_window_start >= 1:
+                        self.capture_fps = fps_window_frames / (now - fps_window_start)
+                        fps_window_start = now
+                        fps_window_frames = 0
+
+                    # Hand the latest frame to every viewer
+                    self.frame_hub.publish(frame)
 
                     # Process frame for motion detection
                     if self.motion_detector:
-                        self.motion_detector.process_frame(frame_data)
+                        if self.detection_pool:
+                            self.detection_pool.submit(self, frame)
+                        else:
+                            self.detect(frame)
 
-                time.sleep(1/30)  # Limit to ~30 FPS
+                self.scheduler.set_active(self._needs_full_rate())
             except Exception as e:
+                metrics.CAPTURE_ERRORS.inc()
                 print(f"Error in continuous capture: {str(e)}")
                 time.sleep(1)  # Wait before retrying
 
+    def detect(self, frame):
+        """Run motion detection on a captured frame"""
+        with metrics.DETECTION_SECONDS.time():
+            if frame.gray is not None:
+                self.motion_detector.process_gray(frame.gray, frame.timestamp)
+            else:
+                self.motion_detector.process_frame(frame.jpeg, frame.timestamp)
+
+    def _needs_full_rate(self):
+        """Boost to active_fps while motion or a recording is in progress, or someone is watching"""
+        if self.motion_detector and self.motion_detector.is_active:
+            return True
+        return Config.BOOST_WHILE_STREAMING and self.viewers > 0
+
     def capture_frame(self):
-        """Capture a single frame from the camera"""
+        """Capture a single frame from the frame source"""
         try:
             if not self.stream_active:
                 return None
-
-            # Capture frame from picamera2
-            frame = self.picam2.capture_array()
-            # Convert to BGR format for OpenCV processing
-            frame_bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-            # Encode as JPEG
-            _, buffer = cv2.imencode('.jpg', frame_bgr)
-            return buffer.tobytes()
+            return self.frame_source.read()
         except Exception as e:
             print(f"Error capturing frame: {str(e)}")
             return None
 
     def configure(self, config_name):
         try:
-            # Apply camera configuration
-            self.picam2.configure(config_name)
-            self.picam2.start()
+            camera_config = Config.CAMERA_CONFIGS[config_name]
+            self.frame_source.configure(config_name)
+            self.scheduler.configure(camera_config['idle_fps'], camera_config['active_fps'])
             self.stream_id = time.time()
+
+            # Stopping the camera also stopped the pre-roll encoder
+            if self.video_handler:
+                self.video_handler.start_buffering(camera_config['fps'])
             return True
         except Exception as e:
             print(f"Error configuring camera: {str(e)}")
             return False
 
-    def get_latest_frame(self):
-        """Get the most recent frame for the web feed"""
-        try:
-            return self.frame_queue.get_nowait()
-        except:
-            return None
+    def add_viewer(self):
+        with self._viewers_lock:
+            self.viewers += 1
+        metrics.STREAM_VIEWERS.inc()
 
-    def get_latest_frame_without_removing(self):
-        """Get the most recent frame for the web feed without removing it."""
-        try:
-            return self.frame_queue.queue[-1]  # Peek at the last frame without removing
-        except IndexError:
-            return None  # Queue is empty
+    def remove_viewer(self):
+        with self._viewers_lock:
+            self.viewers -= 1
+        metrics.STREAM_VIEWERS.dec()
+
+    def get_latest_frame(self, width=None, quality=None):
+        """Get the most recent frame as JPEG for the web feed, optionally scaled down or re-compressed"""
+        _, frame = self.frame_hub.latest()
+        return frame.encode(width, quality) if frame else None
+
+    def wait_for_frame(self, after_sequence, timeout=1.0, width=None, quality=None):
+        """Wait for a frame newer than after_sequence, returns (sequence, jpeg bytes or None)"""
+        sequence, frame = self.frame_hub.wait_for_next(after_sequence, timeout)
+        if frame and after_sequence:
+            metrics.STREAM_FRAMES_SKIPPED.inc(sequence - after_sequence - 1)
+        return sequence, frame.encode(width, quality) if frame else None
+
+    def get_debug_frame(self):
+        """Latest frame with the detection zones drawn on as JPEG"""
+        sequence, frame = self.frame_hub.latest()
+        return self.get_debug_frame_for(sequence, frame)
+
+    def wait_for_debug_frame(self, after_sequence, timeout=1.0):
+        """Like wait_for_frame, but returns the debug frame"""
+        sequence, frame = self.frame_hub.wait_for_next(after_sequence, timeout)
+        return sequence, self.get_debug_frame_for(sequence, frame)
+
+    def get_debug_frame_for(self, sequence, frame):
+        """Render a frame once, every viewer asking for the same sequence gets the same JPEG"""
+        if frame is None or not self.motion_detector:
+            return None
+        with self._debug_lock:
+            if sequence != self._debug_sequence:
+                image = frame.image
+                if image is None:
+                    image = get_codec().decode(frame.jpeg)
+                try:
+                    debug_frame = self.motion_detector.render_debug_frame(image)
+                except Exception as e:
+                    print(f"Error creating debug frame: {str(e)}")
+                    debug_frame = None
+                # Without zones there is nothing to draw, the stream JPEG is served as it is
+                self._debug_jpeg = frame.jpeg if debug_frame is None else get_codec().encode(debug_frame)
+                self._debug_sequence = sequence
+            return self._debug_jpeg
 
     def stop_stream(self):
         """Clean shutdown of camera and threads"""
         self.should_run = False
         self.stream_active = False
+        self.frame_hub.close()
         if self.motion_detection_thread:
             self.motion_detection_thread.join(timeout=1.0)
-        if self.picam2:
-            self.picam2.stop()
-            self.picam2.close()
\ No newline at end of file
+        self.frame_source.close()
\ No newline at end of file
@@ -2,6 +2,7 @@ class Config:
     BASE_URL = "https://api.edwintenbrinke.nl"
     LOGIN_ENDPOINT = "/api/login"
     UPLOAD_ENDPOINT = "/api/video/upload"
+    UPLOAD_SESSION_ENDPOINT = "/api/video/upload/session"
     SETTINGS_ENDPOINT = "/api/user/settings"
     AUTH_CREDENTIALS = {
         "username": "admin",
@@ -10,17 +11,80 @@ class Config:
     MAX_RETRY_ATTEMPTS = 3
     RETRY_DELAY = 1  # seconds
     SETTINGS_UPDATE_INTERVAL = 60  # seconds
+    SETTINGS_LONG_POLL = 0  # seconds (up to 30) the API may hold a settings request until something changes, 0 to poll
+    SETTINGS_LONG_POLL_MIN_INTERVAL = 1  # seconds between long-poll requests at least, so an API that does not hold them is not flooded
+    SETTINGS_CACHE_FILE = 'settings_cache.json'  # Last settings from the API, used until it answers after a boot
+    UPLOAD_SPOOL_DIR = 'recordings'  # Clips wait here, with a journal entry, until they are uploaded
+    UPLOAD_WORKERS = 2  # Concurrent uploads, bounded no matter how many clips are queued
+    UPLOAD_CHUNK_SIZE = 1024 * 1024  # bytes per resumable upload request, also the most read into memory at once
+    UPLOAD_BACKOFF_BASE = 5  # seconds, doubled after every failed attempt
+    UPLOAD_BACKOFF_MAX = 600  # seconds
+    PRE_ROLL_SECONDS = 3  # Seconds of encoded video kept in memory and prepended to each clip, 0 to disable
+    PRE_ROLL_FPS = 5  # Frame rate of the JPEG pre-roll of cameras without a hardware encoder, the clip repeats frames in between
+    MUX_MP4 = True  # Wrap H.264 clips in MP4 on the device so the server can serve them without transcoding
+    FFMPEG_PATH = 'ffmpeg'  # Used for muxing only, clips are uploaded as raw H.264 when it is missing
+    RECORDING_CONFIRM_FRAMES = 2  # Frames above motion_threshold needed to start a clip, 1 starts on the first one
+    RECORDING_CONFIRM_WINDOW = 3  # Out of this many consecutive frames
+    RECORDING_OFF_RATIO = 0.5  # Motion continues while the smoothed score stays above this share of motion_threshold
+    RECORDING_SCORE_ALPHA = 0.3  # Weight of the newest frame in the smoothed score
+    RECORDING_MIN_SECONDS = 3  # Shortest clip, shorter events are recorded for this long anyway
+    RECORDING_MERGE_GAP = 0  # Seconds a finished clip stays open so a new event continues it, 0 stops right away as before
+    SEGMENT_SECONDS = 5  # Clips are cut into segments of about this length that upload while the event goes on, 0 for one file per event
+    MOTION_METADATA = True  # Upload a per-frame motion timeline with every clip
+    MOTION_HEATMAP_GRID = (16, 9)  # Columns and rows of the per-clip motion heatmap
 
 
     # Camera Configuration
+    # fps is the sensor rate, idle_fps/active_fps are the detection rates on quiet scenes and during motion
     CAMERA_CONFIGS = {
-        'full_res': {'size': (4608, 2592), 'fps': 15},
-        '1080p': {'size': (1920, 1080), 'fps': 50},
-        '720p': {'size': (1280, 720), 'fps': 100},
-        '480p': {'size': (854, 480), 'fps': 120}
+        'full_res': {'size': (4608, 2592), 'fps': 15, 'idle_fps': 2, 'active_fps': 15},
+        '1080p': {'size': (1920, 1080), 'fps': 50, 'idle_fps': 5, 'active_fps': 30},
+        '720p': {'size': (1280, 720), 'fps': 100, 'idle_fps': 5, 'active_fps': 30},
+        '480p': {'size': (854, 480), 'fps': 120, 'idle_fps': 5, 'active_fps': 30}
     }
     DEFAULT_CONFIG = '1080p'
 
+    # Cameras managed by this process, each with its own capture thread, detector, ROI and recording.
+    # source is 'picamera' (index picks the sensor) or 'v4l2' (device is a /dev/video path or index).
+    # config optionally picks a CAMERA_CONFIGS preset, the first camera is the one served on the plain routes.
+    CAMERAS = [
+        {'id': 'cam0', 'source': 'picamera', 'index': 0},
+        # {'id': 'cam1', 'source': 'picamera', 'index': 1},
+        # {'id': 'usb0', 'source': 'v4l2', 'device': '/dev/video0', 'config': '720p'},
+    ]
+    DETECTION_WORKERS = None  # Threads shared by all cameras for motion detection, None for one per CPU core
+
+    # Detection Pipeline Configuration
+    RAW_DETECTION = True  # Detect on the raw lores Y plane instead of a decoded JPEG
+    CAMERA_VFLIP = False  # Flip picamera sensors upside down, lets the server skip its vflip transcode but also flips detection, redraw zones after enabling
+    CAMERA_VFLIP = True  # Flip picamera sensors upside down like the server's flip_vertical, so it can skip transcoding
+    LORES_SIZE = (640, 360)  # YUV420 stream used for detection when RAW_DETECTION is on
+    ANALYSIS_WIDTH = 320  # Frames are downsampled to this width before detection, None for full size
+    THRESHOLD_REFERENCE_SIZE = (1920, 1080)  # Frame size the pixel thresholds from the API are tuned for
+    DEFAULT_DETECTION_ENGINE = 'frame_diff'  # frame_diff, running_average, mog2 or knn
+    BOOST_WHILE_STREAMING = True  # Run at active_fps while anyone watches /video_feed
+    PIXEL_DIFF_THRESHOLD = 25  # Per-pixel intensity change that counts as motion
+    RUNNING_AVERAGE_ALPHA = 0.05  # Background learning rate for the running_average engine
+    ILLUMINATION_REJECTION = True  # Rebaseline instead of recording when lighting or exposure changes frame-wide
+    ILLUMINATION_GRID = (4, 4)  # Cells whose mean brightness is compared between frames
+    ILLUMINATION_SHIFT = 15  # Mean change in grey levels that counts a cell as shifted
+    ILLUMINATION_CELL_FRACTION = 0.75  # Share of cells shifting the same way that makes a global change
+    ILLUMINATION_MAX_COVERAGE = 0.8  # Share of the frame in motion that is treated as a global change too
+    BLOB_FILTER = False  # Only count motion in blobs that pass the filters below, cuts rain and noise triggers
+    BLOB_MORPH_KERNEL = 3  # Size of the open/close kernel in analysis pixels, 1 to skip morphology
+    BLOB_MIN_AREA = 400  # Smallest blob in pixels at THRESHOLD_REFERENCE_SIZE
+    BLOB_MAX_COUNT = 25  # More blobs than this in one frame is noise, the frame counts as still
+    BLOB_ASPECT_RANGE = (0.1, 10)  # Allowed width/height of a blob, drops thin streaks such as rain or wires
+    BLOB_TIME_BUDGET_MS = 2.0  # Average filter cost above which morphology is skipped
+    JPEG_CODEC = 'auto'  # 'turbojpeg' for libjpeg-turbo through PyTurboJPEG, 'opencv', or 'auto' to use TurboJPEG when installed
+    JPEG_QUALITY = 95  # Quality of every JPEG the device encodes, 95 is what cv2.imencode uses by default
+    DETECTION_PROCESS = False  # Run detection in a worker process fed through shared memory, frees the capture thread
+    DETECTION_RING_SLOTS = 4  # Frames the shared-memory ring holds before the oldest is overwritten
+
     # Server Configuration
     SERVER_HOST = '0.0.0.0'
-    SERVER_PORT = 8080
\ No newline at end of file
+    SERVER_PORT = 8080
+    SERVER_MODE = 'flask'  # 'flask' for one thread per viewer, 'asgi' for the asyncio server
+    STREAM_MIN_WIDTH = 160  # Smallest ?width= a viewer can ask the stream to be scaled to
+    STREAM_ENCODINGS_PER_FRAME = 4  # Width/quality combinations cached per frame, further ones are encoded per viewer
+    DEBUG_FEED_FPS = 5  # Rate of /debug_feed, every frame is rendered once no matter how many viewers watch
\ No newline at end of file
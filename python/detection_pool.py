@@ -0,0 +1,69 @@
+import os
+import threading
+from collections import OrderedDict
+import metrics
+
+class DetectionPool:
+    """Runs motion detection for every camera on a fixed set of threads.
+
+    Each camera has at most one pending frame: a newer frame replaces it but keeps its
+    place in line, so a camera capturing at 30 fps cannot crowd out one at 5 fps.
+    Cameras are served in the order their frames arrived and never on two threads at
+    once, which keeps every detector single-threaded.
+    """
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.frames_dropped = 0
+        self._pending = OrderedDict()  # camera -> newest frame waiting for detection
+        self._busy = set()
+        self._condition = threading.Condition()
+        self._should_run = True
+        self._threads = [
+            threading.Thread(target=self._worker, daemon=True, name=f"detection-{index}")
+            for index in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, camera, frame):
+        """Queue a frame for camera.detect, replacing one that has not been picked up yet"""
+        with self._condition:
+            if camera in self._pending:
+                self.frames_dropped += 1
+                metrics.DETECTION_FRAMES_DROPPED.inc()
+            self._pending[camera] = frame
+            self._condition.notify()
+
+    def _next(self):
+        """Oldest pending camera that is not being processed already, or None"""
+        for camera in self._pending:
+            if camera not in self._busy:
+                return camera
+        return None
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: not self._should_run or self._next() is not None)
+                if not self._should_run:
+                    return
+                camera = self._next()
+                frame = self._pending.pop(camera)
+                self._busy.add(camera)
+
+            try:
+                camera.detect(frame)
+            except Exception as e:
+                print(f"Error in detection worker: {str(e)}")
+            finally:
+                with self._condition:
+                    self._busy.discard(camera)
+                    # The camera may have a newer frame that was waiting for this one
+                    self._condition.notify()
+
+    def stop(self):
+        with self._condition:
+            self._should_run = False
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
@@ -0,0 +1,323 @@
+import multiprocessing
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+import numpy as np
+from config import Config
+from motion_detector import MotionDetector
+import metrics
+
+# Settings the worker needs, mirrored from the SettingsManager in the main process
+SETTINGS_FIELDS = (
+    'motion_threshold', 'roi_motion_threshold', 'motion_threshold_fraction', 'roi_motion_threshold_fraction',
+    'recording_extension', 'max_recording_duration', 'detection_area_points', 'detection_zones', 'detection_engine'
+)
+SETTINGS_PUSH_INTERVAL = 1.0  # seconds between checks for changed settings
+STATS_INTERVAL = 1.0  # seconds between stats reports from the worker
+
+class SharedFrameRing:
+    """Fixed-size ring of grayscale frames in shared memory.
+
+    Each slot has a header with its sequence number and timestamp. The writer sets
+    the sequence to -1 while it copies a frame in, so a reader can tell a frame that
+    was overwritten under it from a complete one without any locking.
+    """
+    def __init__(self, shape, slots, name=None):
+        self.shape = tuple(shape)
+        self.slots = slots
+        self._owner = name is None
+        frame_bytes = int(np.prod(self.shape))
+        if self._owner:
+            self._frames_memory = shared_memory.SharedMemory(create=True, size=frame_bytes * slots)
+            self._header_memory = shared_memory.SharedMemory(create=True, size=slots * 2 * 8)
+        else:
+            frames_name, header_name = name
+            self._frames_memory = shared_memory.SharedMemory(name=frames_name)
+            self._header_memory = shared_memory.SharedMemory(name=header_name)
+
+        self._frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self._frames_memory.buf)
+        self._header = np.ndarray((slots, 2), dtype=np.float64, buffer=self._header_memory.buf)
+        if self._owner:
+            self._header[:, 0] = -1
+
+    @property
+    def name(self):
+        """Pass this to SharedFrameRing in another process to attach to the same ring"""
+        return self._frames_memory.name, self._header_memory.name
+
+    def write(self, frame, sequence, timestamp):
+        """Copy a frame into the slot for this sequence number, returns the slot"""
+        slot = sequence % self.slots
+        self._header[slot, 0] = -1
+        np.copyto(self._frames[slot], frame)
+        self._header[slot, 1] = timestamp
+        self._header[slot, 0] = sequence
+        return slot
+
+    def read(self, slot, transform):
+        """Apply transform to the frame in a slot in place, returns (frame, timestamp) or (None, None) if it was overwritten"""
+        sequence = self._header[slot, 0]
+        if sequence < 0:
+            return None, None
+        timestamp = self._header[slot, 1]
+
+        view = self._frames[slot]
+        frame = transform(view)
+        if frame is view:
+            # The detector keeps reference frames, they must not point into the ring
+            frame = view.copy()
+
+        if self._header[slot, 0] != sequence:
+            return None, None
+        return frame, timestamp
+
+    def close(self):
+        # Views have to go before the memory can be closed
+        del self._frames, self._header
+        self._frames_memory.close()
+        self._header_memory.close()
+        if self._owner:
+            self._frames_memory.unlink()
+            self._header_memory.unlink()
+
+class SettingsSnapshot:
+    """SettingsManager stand-in for the worker, updated with values sent from the main process"""
+    def __init__(self, values):
+        self._observers = []
+        self.detection_area_points = []
+        self.detection_zones = []
+        self.update(values)
+
+    def add_observer(self, callback):
+        self._observers.append(callback)
+
+    def update(self, values):
+        zones_changed = (values.get('detection_area_points') != self.detection_area_points
+                         or values.get('detection_zones') != self.detection_zones)
+        for field, value in values.items():
+            setattr(self, field, value)
+        if zones_changed:
+            for callback in self._observers:
+                callback()
+
+class _VideoHandlerProxy:
+    """Forwards the detector's recording calls to the main process, where the camera is"""
+    def __init__(self, event_queue):
+        self._event_queue = event_queue
+        self._roi_triggered = False
+
+    @property
+    def roi_triggered(self):
+        return self._roi_triggered
+
+    @roi_triggered.setter
+    def roi_triggered(self, value):
+        self._roi_triggered = value
+        self._event_queue.put(('roi_triggered', value))
+
+    def start_recording(self, roi_triggered=False):
+        self._roi_triggered = roi_triggered
+        self._event_queue.put(('start', roi_triggered))
+        return True
+
+    def stop_recording(self):
+        self._roi_triggered = False
+        self._event_queue.put(('stop', None))
+
+    def record_motion(self, timestamp, motion, roi, bbox, cells):
+        self._event_queue.put(('motion', (timestamp, motion, roi, bbox, cells)))
+
+def _worker_main(ring_name, shape, slots, settings, frame_queue, control_queue, event_queue):
+    """Detection loop of the worker process"""
+    ring = SharedFrameRing(shape, slots, name=ring_name)
+    settings_snapshot = SettingsSnapshot(settings)
+    detector = MotionDetector(_VideoHandlerProxy(event_queue), settings_snapshot)
+    last_state = dict(detector.state)
+    frames = dropped = torn = 0
+    next_stats = time.monotonic() + STATS_INTERVAL
+
+    try:
+        while True:
+            slot = frame_queue.get()
+            # Only the newest frame matters, skip the ones that queued up while detecting
+            while slot is not None:
+                try:
+                    newer = frame_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if newer is not None:
+                    dropped += 1
+                slot = newer
+            if slot is None:
+                break
+
+            while True:
+                try:
+                    settings_snapshot.update(control_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            frame, timestamp = ring.read(slot, detector.downsample)
+            if frame is None:
+                torn += 1
+                continue
+
+            detector.process_gray(frame, timestamp)
+            frames += 1
+
+            if detector.state != last_state:
+                last_state = dict(detector.state)
+                event_queue.put(('state', last_state))
+
+            if time.monotonic() >= next_stats:
+                next_stats = time.monotonic() + STATS_INTERVAL
+                stats = detector.get_stats()
+                stats.update({'worker_frames': frames, 'worker_frames_dropped': dropped, 'worker_frames_torn': torn})
+                event_queue.put(('stats', stats))
+    finally:
+        ring.close()
+
+class ProcessMotionDetector(MotionDetector):
+    """MotionDetector that runs the background model and trigger logic in a worker process.
+
+    The capture thread only copies each frame into a shared-memory ring, the worker
+    reads it from there in place. Recording triggers come back over a queue and are
+    applied to the video handler in this process, where the camera is.
+    """
+    def __init__(self, video_handler, settings_manager, slots=Config.DETECTION_RING_SLOTS):
+        super().__init__(video_handler, settings_manager)
+        self.slots = slots
+        self._context = multiprocessing.get_context('spawn')
+        self._ring = None
+        self._process = None
+        self._frame_queue = None
+        self._control_queue = None
+        self._event_queue = None
+        self._sequence = 0
+        self._worker_stats = None
+        self._reported_dropped = 0
+        self._reported_illumination = 0
+        self._reported_false_starts = 0
+        self._reported_merged_events = 0
+        self._last_settings = None
+        self._next_settings_push = 0
+        self._lock = threading.Lock()
+        self._should_run = True
+        self._event_thread = threading.Thread(target=self._event_loop, daemon=True)
+        self._event_thread.start()
+
+    def _settings_values(self):
+        return {field: getattr(self.settings_manager, field) for field in SETTINGS_FIELDS}
+
+    def _start_worker(self, shape):
+        """(Re)start the worker with a ring sized for frames of this shape"""
+        self._stop_worker()
+        self._ring = SharedFrameRing(shape, self.slots)
+        self._frame_queue = self._context.Queue()
+        self._control_queue = self._context.Queue()
+        self._event_queue = self._context.Queue()
+        self._last_settings = self._settings_values()
+        self._worker_stats = None
+        self._reported_dropped = 0
+        self._reported_illumination = 0
+        self._reported_false_starts = 0
+        self._reported_merged_events = 0
+        self._process = self._context.Process(
+            target=_worker_main,
+            args=(self._ring.name, self._ring.shape, self.slots, self._last_settings,
+                  self._frame_queue, self._control_queue, self._event_queue),
+            daemon=True
+        )
+        self._process.start()
+        print(f"Started detection worker (pid {self._process.pid}) for {shape[1]}x{shape[0]} frames")
+
+    def _stop_worker(self):
+        if self._process is None:
+            return
+        self._frame_queue.put(None)
+        self._process.join(timeout=2.0)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+        self._ring.close()
+        self._process = None
+        self._ring = None
+        # The old worker's recording state no longer applies
+        if self.state['recording']:
+            self.video_handler.stop_recording()
+        self.state.update({'detected': False, 'recording': False, 'roi_triggered': False})
+
+    def process_gray(self, current_frame, timestamp=None):
+        """Hand a grayscale frame to the worker, returns as soon as it is in the ring"""
+        try:
+            with self._lock:
+                if self._ring is None or self._ring.shape != current_frame.shape or not self._process.is_alive():
+                    self._start_worker(current_frame.shape)
+
+                self._sequence += 1
+                slot = self._ring.write(current_frame, self._sequence, timestamp if timestamp is not None else time.time())
+                self._frame_queue.put(slot)
+
+        except Exception as e:
+            print(f"Error handing frame to detection worker: {str(e)}")
+
+    def _event_loop(self):
+        """Apply recording triggers from the worker and keep its settings up to date"""
+        while self._should_run:
+            event_queue = self._event_queue
+            if event_queue is None:
+                time.sleep(0.1)
+                continue
+
+            try:
+                event, value = event_queue.get(timeout=SETTINGS_PUSH_INTERVAL)
+                self._handle_event(event, value)
+            except queue.Empty:
+                pass
+            except Exception as e:
+                print(f"Error handling detection event: {str(e)}")
+
+            if time.monotonic() >= self._next_settings_push:
+                self._next_settings_push = time.monotonic() + SETTINGS_PUSH_INTERVAL
+                self._push_settings()
+
+    def _handle_event(self, event, value):
+        if event == 'start':
+            self.video_handler.start_recording(roi_triggered=value)
+        elif event == 'stop':
+            self.video_handler.stop_recording()
+        elif event == 'roi_triggered':
+            self.video_handler.roi_triggered = value
+        elif event == 'motion':
+            self.video_handler.record_motion(*value)
+        elif event == 'state':
+            self.state.update(value)
+        elif event == 'stats':
+            metrics.DETECTION_FRAMES_DROPPED.inc(value['worker_frames_dropped'] - self._reported_dropped)
+            self._reported_dropped = value['worker_frames_dropped']
+            metrics.ILLUMINATION_CHANGES.inc(value['illumination_changes'] - self._reported_illumination)
+            self._reported_illumination = value['illumination_changes']
+            metrics.RECORDING_FALSE_STARTS.inc(value['recording_false_starts'] - self._reported_false_starts)
+            self._reported_false_starts = value['recording_false_starts']
+            metrics.RECORDING_MERGED_EVENTS.inc(value['recording_merged_events'] - self._reported_merged_events)
+            self._reported_merged_events = value['recording_merged_events']
+            self._worker_stats = value
+
+    def _push_settings(self):
+        values = self._settings_values()
+        with self._lock:
+            if self._control_queue is not None and values != self._last_settings:
+                self._control_queue.put(values)
+                self._last_settings = values
+
+    def get_stats(self):
+        """Engine stats as last reported by the worker, plus how many frames it processed and skipped"""
+        if self._worker_stats is None:
+            return super().get_stats()
+        return self._worker_stats
+
+    def stop(self):
+        self._should_run = False
+        with self._lock:
+            self._stop_worker()
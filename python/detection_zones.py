@@ -0,0 +1,146 @@
+import json
+import cv2
+import numpy as np
+from config import Config
+
+INCLUDE = 'include'
+EXCLUDE = 'exclude'
+
+def zone_definitions(settings_manager):
+    """Zones from the settings, the single detection area counts as one include zone.
+
+    Each zone is {'name', 'points', 'mode', 'threshold'}, where points are normalized
+    like detection_area_points and threshold is a pixel count at
+    THRESHOLD_REFERENCE_SIZE. Zones without a threshold follow roi_motion_threshold,
+    their threshold_fraction is None.
+    """
+    zones = settings_manager.detection_zones
+    if not zones and settings_manager.detection_area_points:
+        zones = [{'name': 'roi', 'points': settings_manager.detection_area_points}]
+
+    reference_area = Config.THRESHOLD_REFERENCE_SIZE[0] * Config.THRESHOLD_REFERENCE_SIZE[1]
+    definitions = []
+    for index, zone in enumerate(zones or []):
+        if len(zone.get('points') or []) < 3:
+            continue
+        threshold = zone.get('threshold')
+        definitions.append({
+            'name': zone.get('name') or f"zone_{index + 1}",
+            'points': [(point['x'], point['y']) for point in zone['points']],
+            'mode': EXCLUDE if zone.get('mode') == EXCLUDE else INCLUDE,
+            'threshold_fraction': threshold / reference_area if threshold is not None else None
+        })
+    return definitions
+
+def definitions_key(definitions):
+    """Hashable identity of a zone list, for caching rasterised masks"""
+    return hash(json.dumps(definitions, sort_keys=True))
+
+def polygon(points, width, height):
+    """Normalized points as an int32 pixel polygon for a frame of this size"""
+    return np.array([[int(x * width), int(y * height)] for x, y in points], dtype=np.int32)
+
+class Zone:
+    """An include zone rasterised at one resolution, cropped to its bounding box"""
+    def __init__(self, name, threshold_fraction, bounds, mask):
+        self.name = name
+        self.threshold_fraction = threshold_fraction  # None to follow roi_motion_threshold
+        self.bounds = bounds  # (top, bottom, left, right) in pixels
+        self.mask = mask  # 255 inside the polygon, same size as the bounding box
+
+class ZoneSet:
+    """Every zone rasterised at one analysis resolution.
+
+    Exclude zones are merged into a single mask that removes their pixels from all
+    scores. Include zones are scored inside their bounding box only, so the per-frame
+    cost grows with the zone area instead of with the number of zones.
+    """
+    def __init__(self, definitions, shape):
+        height, width = shape[:2]
+        self.shape = (height, width)
+        self.zones = []
+        self.allowed = None  # 0 on excluded pixels, None when there are no exclude zones
+
+        for definition in definitions:
+            points = polygon(definition['points'], width, height)
+            if definition['mode'] == EXCLUDE:
+                if self.allowed is None:
+                    self.allowed = np.full((height, width), 255, dtype=np.uint8)
+                cv2.fillPoly(self.allowed, [points], 0)
+                continue
+
+            left, top, box_width, box_height = cv2.boundingRect(points)
+            right, bottom = min(left + box_width, width), min(top + box_height, height)
+            left, top = max(left, 0), max(top, 0)
+            if right <= left or bottom <= top:
+                continue
+            mask = np.zeros((bottom - top, right - left), dtype=np.uint8)
+            cv2.fillPoly(mask, [points - (left, top)], 255)
+            self.zones.append(Zone(definition['name'], definition['threshold_fraction'], (top, bottom, left, right), mask))
+
+        # Excluded pixels never count, not even inside an include zone
+        if self.allowed is not None:
+            for zone in self.zones:
+                top, bottom, left, right = zone.bounds
+                cv2.bitwise_and(zone.mask, self.allowed[top:bottom, left:right], dst=zone.mask)
+
+    def exclude(self, thresh):
+        """Motion mask with the pixels of the exclude zones cleared"""
+        if self.allowed is None:
+            return thresh
+        return cv2.bitwise_and(thresh, self.allowed)
+
+    def score(self, thresh):
+        """Return (pixels in motion, {zone name: pixels in motion}) for a mask passed through exclude()"""
+        motion_score = cv2.countNonZero(thresh)
+        if not motion_score:
+            return 0, {zone.name: 0 for zone in self.zones}
+
+        zone_scores = {}
+        for zone in self.zones:
+            top, bottom, left, right = zone.bounds
+            zone_scores[zone.name] = cv2.countNonZero(cv2.bitwise_and(thresh[top:bottom, left:right], zone.mask))
+        return motion_score, zone_scores
+
+class ZoneOverlay:
+    """The debug drawing of every zone at one frame size.
+
+    Polygons and the tint are computed once, per frame the tint is only blended in
+    inside its bounding box and the outlines and names are drawn on top.
+    """
+    ALPHA = 0.3  # Opacity of the zone tint
+
+    def __init__(self, definitions, shape):
+        height, width = shape[:2]
+        self.shape = (height, width)
+        self.polygons = [polygon(definition['points'], width, height) for definition in definitions]
+        self.labels = [
+            (definition['name'], tuple(int(value) for value in points.min(axis=0) + (5, 25)))
+            for definition, points in zip(definitions, self.polygons)
+        ]
+
+        # Green for include zones and red for exclude zones
+        tint = np.zeros((height, width, 3), dtype=np.uint8)
+        mask = np.zeros((height, width), dtype=np.uint8)
+        for definition, points in zip(definitions, self.polygons):
+            cv2.fillPoly(tint, [points], (0, 0, 255) if definition['mode'] == EXCLUDE else (0, 255, 0))
+            cv2.fillPoly(mask, [points], 255)
+
+        left, top, box_width, box_height = cv2.boundingRect(mask)
+        self.region = (slice(top, top + box_height), slice(left, left + box_width)) if box_width and box_height else None
+        if self.region:
+            self.tint = tint[self.region].copy()
+            self.mask = mask[self.region].copy()
+
+    def draw(self, frame):
+        """Return a copy of a BGR frame of this size with the zones drawn on"""
+        debug_frame = frame.copy()
+        if self.region:
+            blended = cv2.addWeighted(self.tint, self.ALPHA, frame[self.region], 1 - self.ALPHA, 0)
+            cv2.copyTo(blended, self.mask, debug_frame[self.region])  # Writes through the view into debug_frame
+
+        # Red outlines with the zone names
+        for points, (name, origin) in zip(self.polygons, self.labels):
+            cv2.polylines(debug_frame, [points], True, (0, 0, 255), 2)
+            cv2.putText(debug_frame, name, origin, cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+        return debug_frame
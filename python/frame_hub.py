@@ -0,0 +1,56 @@
+import threading
+
+class FrameHub:
+    """Publish/subscribe point for captured frames, readers never consume frames from each other"""
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._frame = None
+        self._sequence = 0
+        self._closed = False
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """Call callback(sequence) from the publishing thread after every new frame"""
+        self._listeners.append(callback)
+
+    def publish(self, frame):
+        """Make a frame the latest one and wake every waiting reader"""
+        with self._condition:
+            self._frame = frame
+            self._sequence += 1
+            sequence = self._sequence
+            self._condition.notify_all()
+
+        for callback in self._listeners:
+            callback(sequence)
+        return sequence
+
+    def latest(self):
+        """Return (sequence, frame) for the most recent frame without waiting"""
+        with self._condition:
+            return self._sequence, self._frame
+
+    def wait_for_next(self, after_sequence, timeout=None):
+        """Block until a frame newer than after_sequence exists and return (sequence, frame).
+
+        Readers that fall behind skip straight to the latest frame. On timeout or close
+        (after_sequence, None) is returned.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._sequence > after_sequence or self._closed,
+                timeout
+            )
+            if self._sequence > after_sequence:
+                return self._sequence, self._frame
+            return after_sequence, None
+
+    def close(self):
+        """Release all waiting readers, used on shutdown"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
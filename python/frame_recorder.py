@@ -0,0 +1,183 @@
+import os
+import threading
+import uuid
+from collections import deque
+from datetime import datetime
+import cv2
+from config import Config
+from jpeg_codec import get_codec
+from motion_timeline import MotionTimeline
+
+class FrameRecorder:
+    """VideoHandler for cameras without a picamera2 encoder, such as USB webcams.
+
+    Clips are written from the captured frames with OpenCV. The capture rate changes
+    with the frame scheduler, so frames are repeated as needed to keep the clip in
+    real time at a fixed output rate. The pre-roll is kept as JPEG at PRE_ROLL_FPS to
+    bound memory and the encodes on the capture thread.
+    Clips are H.264 when the OpenCV build has an encoder for it, which browsers play
+    as they are, and MPEG-4 Part 2 otherwise, which the server transcodes. Every file
+    is a complete video, so segments are cut on the first frame after SEGMENT_SECONDS.
+    """
+    def __init__(self, frame_hub, upload_queue, camera_id=None):
+        self.frame_hub = frame_hub
+        self.upload_queue = upload_queue
+        self.camera_id = camera_id
+        self.current_recording = None
+        self.recording_timestamp = None
+        self.roi_triggered = False
+        self.timeline = None
+        self.fps = 30
+        self._writer = None
+        self._playable = False
+        self._clip_start = None
+        self._frames_written = 0
+        self.event_id = None  # Ties the segments of one event together, None when clips are not segmented
+        self.segment_index = 0
+        self._segment_start = None  # Timestamp the current segment is measured from, the trigger for the first one
+        self._pre_roll = deque()
+        self._lock = threading.Lock()
+        frame_hub.add_listener(self._on_frame)
+
+    def start_buffering(self, fps):
+        with self._lock:
+            self.fps = fps
+            self._pre_roll.clear()
+        return Config.PRE_ROLL_SECONDS > 0
+
+    def _on_frame(self, sequence):
+        """Runs on the capture thread after every published frame"""
+        _, frame = self.frame_hub.latest()
+        if frame is None or frame.image is None:
+            return
+
+        with self._lock:
+            if self._writer:
+                if self.event_id and frame.timestamp - self._segment_start >= Config.SEGMENT_SECONDS:
+                    self._cut_segment(frame.image.shape)
+                    self._segment_start = frame.timestamp
+                self._write(frame.image, frame.timestamp)
+            elif Config.PRE_ROLL_SECONDS > 0:
+                # The encode runs on the capture thread, so only PRE_ROLL_FPS frames a second pay for it
+                if not self._pre_roll or frame.timestamp - self._pre_roll[-1][0] >= 1 / Config.PRE_ROLL_FPS - 0.001:
+                    self._pre_roll.append((frame.timestamp, frame.jpeg))
+                while self._pre_roll and self._pre_roll[0][0] < frame.timestamp - Config.PRE_ROLL_SECONDS:
+                    self._pre_roll.popleft()
+
+    def _write(self, image, timestamp):
+        """Write a frame as often as needed to fill the time since the previous one"""
+        if self._clip_start is None:
+            self._clip_start = timestamp
+        due = int((timestamp - self._clip_start) * self.fps) + 1
+        for _ in range(due - self._frames_written):
+            self._writer.write(image)
+            self._frames_written += 1
+
+    def _open_writer(self, output_file, width, height):
+        """Return (writer, playable), preferring H.264 over the always available mp4v"""
+        writer = cv2.VideoWriter(output_file, cv2.VideoWriter_fourcc(*'avc1'), self.fps, (width, height))
+        if writer.isOpened():
+            return writer, True
+        return cv2.VideoWriter(output_file, cv2.VideoWriter_fourcc(*'mp4v'), self.fps, (width, height)), False
+
+    def _output_file(self, started_at):
+        prefix = f"motion_{self.camera_id}_" if self.camera_id else "motion_"
+        timestamp = started_at.strftime('%Y_%m_%dT%H_%M_%S')
+        suffix = f"_{self.segment_index:03d}" if self.event_id else ''
+        return os.path.join(Config.UPLOAD_SPOOL_DIR, f"{prefix}{timestamp}{suffix}.mp4")
+
+    def _cut_segment(self, shape):
+        """Close the current segment, queue it and continue in the next one, called with the lock held"""
+        self._writer.release()
+        self._enqueue(self.current_recording, self.recording_timestamp, self.timeline, self.segment_index, final=False)
+
+        started_at = datetime.utcnow()
+        self.segment_index += 1
+        self.current_recording = self._output_file(started_at)
+        self.recording_timestamp = started_at.isoformat()
+        self.timeline = MotionTimeline(self.recording_timestamp) if Config.MOTION_METADATA else None
+        height, width = shape[:2]
+        self._writer, self._playable = self._open_writer(self.current_recording, width, height)
+        self._clip_start = None
+        self._frames_written = 0
+
+    def _enqueue(self, output_file, timestamp, timeline, index, final):
+        """Journal a finished clip or segment so it survives restarts, the worker pool uploads it"""
+        metadata_file = self._save_timeline(output_file, timeline)
+        segment = {'event_id': self.event_id, 'index': index, 'final': final} if self.event_id else None
+        self.upload_queue.enqueue(output_file, roi_triggered=self.roi_triggered, timestamp=timestamp, metadata_file=metadata_file,
+                                  playable=self._playable, segment=segment)
+
+    def start_recording(self, roi_triggered=False):
+        """Start recording video with ROI status"""
+        try:
+            if self.current_recording:
+                self.stop_recording()
+
+            _, frame = self.frame_hub.latest()
+            if frame is None or frame.image is None:
+                print("Cannot start recording without a frame")
+                return False
+
+            self.roi_triggered = roi_triggered
+            started_at = datetime.utcnow()
+            self.event_id = uuid.uuid4().hex if Config.SEGMENT_SECONDS > 0 else None
+            self.segment_index = 0
+            output_file = self._output_file(started_at)
+            height, width = frame.image.shape[:2]
+
+            with self._lock:
+                self._writer, self._playable = self._open_writer(output_file, width, height)
+                self._clip_start = None
+                self._frames_written = 0
+                self._segment_start = frame.timestamp
+                pre_roll = frame.timestamp - self._pre_roll[0][0] if self._pre_roll else 0
+                # Flush the buffered pre-roll into the file first
+                for pre_roll_timestamp, jpeg in self._pre_roll:
+                    image = get_codec().decode(jpeg)
+                    if image.shape[:2] == (height, width):
+                        self._write(image, pre_roll_timestamp)
+                self._pre_roll.clear()
+
+                self.current_recording = output_file
+                self.recording_timestamp = started_at.isoformat()
+                self.timeline = MotionTimeline(self.recording_timestamp, pre_roll) if Config.MOTION_METADATA else None
+            print(f"Started recording: {output_file} (ROI triggered: {roi_triggered})")
+            return True
+        except Exception as e:
+            print(f"Error starting recording: {str(e)}")
+            return False
+
+    def stop_recording(self):
+        """Stop recording and upload video"""
+        if self.current_recording:
+            try:
+                with self._lock:
+                    self._writer.release()
+                    self._writer = None
+                    output_file = self.current_recording
+                    timestamp = self.recording_timestamp
+                    timeline, self.timeline = self.timeline, None
+                    self.current_recording = None
+                    self.recording_timestamp = None
+                self._enqueue(output_file, timestamp, timeline, self.segment_index, final=True)
+                self.roi_triggered = False
+            except Exception as e:
+                print(f"Error stopping recording: {str(e)}")
+
+    def record_motion(self, timestamp, motion, roi, bbox, cells):
+        """Add a detection result to the timeline of the clip being recorded"""
+        timeline = self.timeline
+        if timeline:
+            timeline.add(timestamp, motion, roi, bbox, cells)
+
+    def _save_timeline(self, output_file, timeline):
+        """Write the motion sidecar of a finished clip, a failure only costs the metadata"""
+        if not timeline or not timeline.samples:
+            return None
+        try:
+            return timeline.save(output_file)
+        except Exception as e:
+            print(f"Error saving motion timeline: {str(e)}")
+            return None
+
@@ -0,0 +1,76 @@
+import threading
+import time
+import metrics
+
+class FrameScheduler:
+    """Paces the capture loop against absolute frame deadlines.
+
+    Slow frames do not push every later frame back: once a deadline is missed by a
+    whole interval the missed slots are skipped. The rate drops to idle_fps on quiet
+    scenes and is boosted to active_fps as soon as something is happening.
+    """
+    def __init__(self, idle_fps, active_fps):
+        self.idle_fps = idle_fps
+        self.active_fps = active_fps
+        self.active = False
+        self.frames_skipped = 0
+        self._next_deadline = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        metrics.CAPTURE_TARGET_FPS.set(idle_fps)
+
+    def configure(self, idle_fps, active_fps):
+        with self._lock:
+            self.idle_fps = idle_fps
+            self.active_fps = active_fps
+            self._next_deadline = None
+            # A wait at the old idle interval would otherwise run to its end before the new rate applies
+            self._wake.set()
+        metrics.CAPTURE_TARGET_FPS.set(self.fps)
+
+    @property
+    def fps(self):
+        return self.active_fps if self.active else self.idle_fps
+
+    @property
+    def interval(self):
+        return 1 / self.fps
+
+    def set_active(self, active):
+        """Switch between idle and active rate, boosting takes effect immediately"""
+        if active == self.active:
+            return
+        with self._lock:
+            self.active = active
+            if active:
+                # Do not sit out the rest of a long idle interval
+                self._next_deadline = time.monotonic()
+                self._wake.set()
+        metrics.CAPTURE_TARGET_FPS.set(self.fps)
+
+    def wait(self):
+        """Block until the next frame is due"""
+        with self._lock:
+            now = time.monotonic()
+            if self._next_deadline is None:
+                self._next_deadline = now
+            delay = self._next_deadline - now
+            self._wake.clear()
+
+        if delay > 0:
+            self._wake.wait(delay)
+
+        with self._lock:
+            now = time.monotonic()
+            if self._next_deadline is None:
+                # configure() restarted the schedule while we were waiting
+                self._next_deadline = now
+            lag = now - self._next_deadline
+            interval = self.interval
+            if lag >= interval:
+                # Skip the slots we already missed instead of trying to catch up on them
+                missed = int(lag / interval)
+                self.frames_skipped += missed
+                metrics.SCHEDULER_FRAMES_SKIPPED.inc(missed)
+                self._next_deadline += missed * interval
+            self._next_deadline += interval
@@ -0,0 +1,315 @@
+import glob
+import os
+import threading
+import time
+import cv2
+import numpy as np
+from config import Config
+from jpeg_codec import get_codec
+import metrics
+
+class CapturedFrame:
+    """A captured frame whose JPEG encoding is only produced when a consumer asks for it.
+
+    Scaled or re-compressed variants for stream profiles are cached on the frame too,
+    so they are dropped together with it once a newer frame has replaced it.
+    """
+    def __init__(self, image=None, gray=None, jpeg=None, timestamp=None):
+        self.image = image  # BGR array from the main stream, None when only a grayscale image exists
+        self.gray = gray  # Y plane from the lores stream, None in JPEG mode
+        self.timestamp = timestamp if timestamp is not None else time.time()
+        self._jpeg = jpeg
+        self._encodings = {}  # (width, quality) -> JPEG bytes
+        self._lock = threading.Lock()
+
+    @property
+    def is_encoded(self):
+        return self._jpeg is not None
+
+    @property
+    def width(self):
+        """Width in pixels, None for a frame that only exists as JPEG"""
+        image = self.image if self.image is not None else self.gray
+        return image.shape[1] if image is not None else None
+
+    def _profile_key(self, width, quality):
+        """(width, quality) with a width that would not scale anything normalised to None"""
+        if width is not None and self.width is not None and width >= self.width:
+            width = None
+        return width, quality
+
+    def is_encoded_as(self, width=None, quality=None):
+        key = self._profile_key(width, quality)
+        if key == (None, None):
+            return self.is_encoded
+        return key in self._encodings
+
+    def encode(self, width=None, quality=None):
+        """JPEG scaled down to width at quality, encoded once per frame for every viewer asking the same"""
+        key = self._profile_key(width, quality)
+        if key == (None, None):
+            return self.jpeg
+
+        with self._lock:
+            data = self._encodings.get(key)
+            if data is None:
+                image = self.image if self.image is not None else self.gray
+                if image is None:
+                    image = get_codec().decode(self._jpeg)
+                width, quality = key
+                with metrics.ENCODE_SECONDS.time():
+                    if width is not None and width < image.shape[1]:
+                        height = round(image.shape[0] * width / image.shape[1])
+                        image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+                    data = get_codec().encode(image, quality)
+                if len(self._encodings) < Config.STREAM_ENCODINGS_PER_FRAME:
+                    self._encodings[key] = data
+            return data
+
+    @property
+    def jpeg(self):
+        with self._lock:
+            if self._jpeg is None:
+                image = self.image if self.image is not None else self.gray
+                with metrics.ENCODE_SECONDS.time():
+                    self._jpeg = get_codec().encode(image)
+            return self._jpeg
+
+class FrameSource:
+    """Something CameraManager can pull frames from: the camera, a recording or generated test frames"""
+    live = False  # Live sources are paced by the hardware, offline sources can run as fast as the consumer
+
+    def open(self):
+        return True
+
+    def configure(self, config_name):
+        return True
+
+    def read(self):
+        """Return the next CapturedFrame, or None once an offline source is exhausted"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class PicameraFrameSource(FrameSource):
+    """Frames from picamera2, optionally with the lores Y plane for raw detection"""
+    live = True
+
+    def __init__(self, camera_num=0):
+        self.camera_num = camera_num
+        self.picam2 = None
+
+    def open(self):
+        from picamera2 import Picamera2
+        self.picam2 = Picamera2(self.camera_num)
+        return True
+
+    def configure(self, config_name):
+        from libcamera import Transform
+        camera_config = Config.CAMERA_CONFIGS[config_name]
+        streams = {'main': {'size': camera_config['size'], 'format': 'RGB888'}}
+        if Config.RAW_DETECTION:
+            streams['lores'] = {'size': Config.LORES_SIZE, 'format': 'YUV420'}
+
+        # Apply camera configuration
+        if self.picam2.started:
+            self.picam2.stop()
+        self.picam2.configure(self.picam2.create_video_configuration(
+            **streams,
+            transform=Transform(hflip=Config.CAMERA_HFLIP, vflip=Config.CAMERA_VFLIP),
+            controls={'FrameRate': camera_config['fps']}
+        ))
+        self.picam2.start()
+        return True
+
+    def read(self):
+        if Config.RAW_DETECTION:
+            # Grab both streams from the same request so they show the same moment
+            request = self.picam2.capture_request()
+            try:
+                frame_bgr = request.make_array('main')  # RGB888 is already BGR ordered
+                lores = request.make_array('lores')
+            finally:
+                request.release()
+
+            # The Y plane of YUV420 is the grayscale image, no codec step needed
+            width, height = Config.LORES_SIZE
+            return CapturedFrame(image=frame_bgr, gray=lores[:height, :width])
+
+        # Capture frame from picamera2, RGB888 is already BGR ordered for OpenCV
+        frame_bgr = self.picam2.capture_array('main')
+        # Encode as JPEG
+        with metrics.ENCODE_SECONDS.time():
+            jpeg = get_codec().encode(frame_bgr)
+        return CapturedFrame(image=frame_bgr, jpeg=jpeg)
+
+    def close(self):
+        if self.picam2:
+            self.picam2.stop()
+            self.picam2.close()
+
+class V4L2FrameSource(FrameSource):
+    """Frames from a USB or other V4L2 webcam through OpenCV"""
+    live = True
+
+    def __init__(self, device=0):
+        self.device = device
+        self.capture = None
+
+    def open(self):
+        self.capture = cv2.VideoCapture(self.device, cv2.CAP_V4L2)
+        if not self.capture.isOpened():
+            print(f"Could not open V4L2 device {self.device}")
+            return False
+        return True
+
+    def configure(self, config_name):
+        camera_config = Config.CAMERA_CONFIGS[config_name]
+        width, height = camera_config['size']
+        # Webcams pick the nearest mode they support, MJPG is needed for high resolutions over USB
+        self.capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+        self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        self.capture.set(cv2.CAP_PROP_FPS, camera_config['fps'])
+        # Keep a single buffered frame so reads return the newest image, not a stale one
+        self.capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return True
+
+    def read(self):
+        ok, frame_bgr = self.capture.read()
+        if not ok:
+            raise RuntimeError(f"V4L2 device {self.device} returned no frame")
+        return CapturedFrame(image=frame_bgr, gray=cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY))
+
+    def close(self):
+        if self.capture:
+            self.capture.release()
+
+def create_frame_source(camera):
+    """Build the frame source for an entry of Config.CAMERAS"""
+    if camera['source'] == 'picamera':
+        return PicameraFrameSource(camera.get('index', 0))
+    if camera['source'] == 'v4l2':
+        return V4L2FrameSource(camera.get('device', 0))
+    raise ValueError(f"Unknown camera source {camera['source']!r} for camera {camera['id']}")
+
+class VideoFileFrameSource(FrameSource):
+    """Frames decoded from a recorded clip, timestamped by their position in the file"""
+    def __init__(self, path, loop=False):
+        self.path = path
+        self.loop = loop
+        self.capture = None
+        self.fps = 30.0
+        self._index = 0
+        self._time_offset = 0.0
+
+    def open(self):
+        self.capture = cv2.VideoCapture(self.path)
+        if not self.capture.isOpened():
+            print(f"Could not open video file {self.path}")
+            return False
+        # Raw .h264 streams carry no frame rate, fall back to 30 fps
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 30.0
+        return True
+
+    def read(self):
+        ok, frame_bgr = self.capture.read()
+        if not ok and self.loop and self._index:
+            self._time_offset += self._index / self.fps
+            self._index = 0
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame_bgr = self.capture.read()
+        if not ok:
+            return None
+
+        timestamp = self._time_offset + self._index / self.fps
+        self._index += 1
+        return CapturedFrame(
+            image=frame_bgr,
+            gray=cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY),
+            timestamp=timestamp
+        )
+
+    def close(self):
+        if self.capture:
+            self.capture.release()
+
+class ImageDirectoryFrameSource(FrameSource):
+    """Frames read from the images in a directory in name order, spaced as if captured at fps"""
+    EXTENSIONS = ('*.jpg', '*.jpeg', '*.png', '*.bmp')
+
+    def __init__(self, path, fps=30.0):
+        self.path = path
+        self.fps = fps
+        self.files = []
+        self._index = 0
+
+    def open(self):
+        self.files = sorted(
+            file for pattern in self.EXTENSIONS
+            for file in glob.glob(os.path.join(self.path, pattern))
+        )
+        if not self.files:
+            print(f"No images found in {self.path}")
+            return False
+        return True
+
+    def read(self):
+        while self._index < len(self.files):
+            frame_bgr = cv2.imread(self.files[self._index])
+            timestamp = self._index / self.fps
+            self._index += 1
+            if frame_bgr is not None:
+                return CapturedFrame(
+                    image=frame_bgr,
+                    gray=cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY),
+                    timestamp=timestamp
+                )
+        return None
+
+class SyntheticFrameSource(FrameSource):
+    """Deterministic noisy scene with a bright block moving through it during the given frame ranges"""
+    def __init__(self, size=None, fps=30.0, frame_count=300, motion_ranges=((90, 150),), noise=4, seed=0):
+        self.size = size or Config.CAMERA_CONFIGS[Config.DEFAULT_CONFIG]['size']
+        self.fps = fps
+        self.frame_count = frame_count  # None for an endless stream
+        self.motion_ranges = motion_ranges
+        self.noise = noise
+        self._rng = np.random.default_rng(seed)
+        self._index = 0
+        self._background = None
+
+    def configure(self, config_name):
+        self.size = Config.CAMERA_CONFIGS[config_name]['size']
+        self._background = None
+        return True
+
+    def _in_motion(self):
+        return any(start <= self._index < end for start, end in self.motion_ranges)
+
+    def read(self):
+        if self.frame_count is not None and self._index >= self.frame_count:
+            return None
+
+        width, height = self.size
+        if self._background is None:
+            gradient = np.linspace(40, 160, width, dtype=np.float32)
+            self._background = np.tile(gradient, (height, 1)).astype(np.uint8)
+
+        gray = self._background.copy()
+        if self.noise:
+            # Sensor noise on a sparse pixel grid keeps generation cheap at full resolution
+            sparse = gray[::4, ::4]
+            jitter = self._rng.integers(-self.noise, self.noise + 1, sparse.shape, dtype=np.int16)
+            gray[::4, ::4] = np.clip(sparse + jitter, 0, 255).astype(np.uint8)
+
+        if self._in_motion():
+            block = max(width, height) // 10
+            x = (self._index * width // 60) % max(1, width - block)
+            y = height // 2 - block // 2
+            gray[y:y + block, x:x + block] = 250
+
+        timestamp = self._index / self.fps
+        self._index += 1
+        return CapturedFrame(gray=gray, timestamp=timestamp)
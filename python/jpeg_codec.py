@@ -0,0 +1,167 @@
+import threading
+import cv2
+import numpy as np
+from config import Config
+
+SCALE_DENOMINATORS = (8, 4, 2)  # DCT scaling every backend can decode at, largest reduction first
+
+def jpeg_size(data):
+    """(width, height) from the frame header of a JPEG without decoding it, None when there is none"""
+    index = 2  # Skip the SOI marker
+    while index + 9 <= len(data):
+        if data[index] != 0xFF:
+            return None
+        marker = data[index + 1]
+        if marker == 0xFF:  # Fill byte
+            index += 1
+            continue
+        # SOF0..SOF15 carry the size, C4, C8 and CC are other segments in the same range
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height = int.from_bytes(data[index + 5:index + 7], 'big')
+            width = int.from_bytes(data[index + 7:index + 9], 'big')
+            return width, height
+        index += 2 + int.from_bytes(data[index + 2:index + 4], 'big')
+    return None
+
+def scale_denominator(width, min_width):
+    """Largest reduction that still decodes a frame at least min_width wide, 1 for a full decode"""
+    if not min_width or not width:
+        return 1
+    for denominator in SCALE_DENOMINATORS:
+        if -(-width // denominator) >= min_width:
+            return denominator
+    return 1
+
+class JpegCodec:
+    """Base class for the JPEG encoders/decoders the pipeline can run on"""
+    name = None
+
+    def encode(self, image, quality=None):
+        """JPEG bytes of a BGR or single channel image"""
+        raise NotImplementedError
+
+    def encode_yuv420(self, yuv, width, height, quality=None):
+        """JPEG bytes of a planar YUV420 (I420) buffer of height * 3 / 2 rows, as picamera2 returns it"""
+        raise NotImplementedError
+
+    def decode(self, data, grayscale=False, min_width=None):
+        """Decode to BGR or grayscale, with min_width at the smallest DCT scale that is at least that wide"""
+        raise NotImplementedError
+
+class OpenCVCodec(JpegCodec):
+    """cv2.imencode/imdecode, always available"""
+    name = 'opencv'
+
+    REDUCED_FLAGS = {
+        (False, 1): cv2.IMREAD_COLOR,
+        (False, 2): cv2.IMREAD_REDUCED_COLOR_2,
+        (False, 4): cv2.IMREAD_REDUCED_COLOR_4,
+        (False, 8): cv2.IMREAD_REDUCED_COLOR_8,
+        (True, 1): cv2.IMREAD_GRAYSCALE,
+        (True, 2): cv2.IMREAD_REDUCED_GRAYSCALE_2,
+        (True, 4): cv2.IMREAD_REDUCED_GRAYSCALE_4,
+        (True, 8): cv2.IMREAD_REDUCED_GRAYSCALE_8
+    }
+
+    def encode(self, image, quality=None):
+        _, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality or Config.JPEG_QUALITY])
+        return buffer.tobytes()
+
+    def encode_yuv420(self, yuv, width, height, quality=None):
+        # OpenCV can only encode BGR or grey, the conversion is the cost TurboJPEG avoids
+        return self.encode(cv2.cvtColor(yuv[:height * 3 // 2, :width], cv2.COLOR_YUV2BGR_I420), quality)
+
+    def decode(self, data, grayscale=False, min_width=None):
+        size = jpeg_size(data) if min_width else None
+        denominator = scale_denominator(size[0], min_width) if size else 1
+        return cv2.imdecode(np.frombuffer(data, np.uint8), self.REDUCED_FLAGS[(grayscale, denominator)])
+
+class TurboJpegCodec(JpegCodec):
+    """libjpeg-turbo through PyTurboJPEG, raises ImportError or OSError when it is not installed.
+
+    Grayscale and YUV images are compressed as they are instead of being converted to
+    BGR first, and every thread compresses into one output buffer that only grows.
+    """
+    name = 'turbojpeg'
+
+    def __init__(self):
+        import turbojpeg
+        self._turbojpeg = turbojpeg
+        self._turbo = turbojpeg.TurboJPEG()
+        self._buffers = threading.local()
+        self._reuse_buffers = True
+
+    def _output_buffer(self, width, height, grayscale):
+        """Thread-local buffer large enough for any JPEG of this size, following tjBufSize()"""
+        mcu = 8 if grayscale else 16
+        padded = -(-width // mcu) * mcu * (-(-height // mcu) * mcu)
+        size = padded * (2 if grayscale else 3) + 2048
+        buffer = getattr(self._buffers, 'buffer', None)
+        if buffer is None or len(buffer) < size:
+            buffer = bytearray(size)
+            self._buffers.buffer = buffer
+        return buffer
+
+    def encode(self, image, quality=None):
+        grayscale = image.ndim == 2
+        options = {
+            'quality': quality or Config.JPEG_QUALITY,
+            'pixel_format': self._turbojpeg.TJPF_GRAY if grayscale else self._turbojpeg.TJPF_BGR,
+            'jpeg_subsample': self._turbojpeg.TJSAMP_GRAY if grayscale else self._turbojpeg.TJSAMP_420
+        }
+        if self._reuse_buffers:
+            buffer = self._output_buffer(image.shape[1], image.shape[0], grayscale)
+            try:
+                _, size = self._turbo.encode(image, dst=buffer, **options)
+                return bytes(memoryview(buffer)[:size])
+            except TypeError:
+                # PyTurboJPEG before 1.7 has no dst argument
+                self._reuse_buffers = False
+        return self._turbo.encode(image, **options)
+
+    def encode_yuv420(self, yuv, width, height, quality=None):
+        return self._turbo.encode_from_yuv(
+            yuv[:height * 3 // 2, :width], height, width,
+            quality=quality or Config.JPEG_QUALITY,
+            jpeg_subsample=self._turbojpeg.TJSAMP_420
+        )
+
+    def decode(self, data, grayscale=False, min_width=None):
+        denominator = 1
+        if min_width:
+            width, _, _, _ = self._turbo.decode_header(data)
+            denominator = scale_denominator(width, min_width)
+        return self._turbo.decode(
+            data,
+            pixel_format=self._turbojpeg.TJPF_GRAY if grayscale else self._turbojpeg.TJPF_BGR,
+            scaling_factor=(1, denominator) if denominator > 1 else None
+        )
+
+CODECS = {
+    codec.name: codec
+    for codec in (TurboJpegCodec, OpenCVCodec)
+}
+
+def create_codec(name):
+    """Instantiate a codec by name, 'auto' picks TurboJPEG when it is installed and OpenCV otherwise"""
+    if name == 'auto':
+        try:
+            return TurboJpegCodec()
+        except (ImportError, OSError, RuntimeError):
+            return OpenCVCodec()
+    if name not in CODECS:
+        raise ValueError(f"Unknown JPEG codec: {name}")
+    return CODECS[name]()
+
+_codec = None
+_codec_lock = threading.Lock()
+
+def get_codec():
+    """The codec picked by Config.JPEG_CODEC, created on first use"""
+    global _codec
+    if _codec is None:
+        with _codec_lock:
+            if _codec is None:
+                _codec = create_codec(Config.JPEG_CODEC)
+                print(f"Using the {_codec.name} JPEG codec")
+    return _codec
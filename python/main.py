@@ -1,11 +1,16 @@
 import sys
 from camera_manager import CameraManager
+from frame_source import create_frame_source
+from detection_pool import DetectionPool
+from frame_recorder import FrameRecorder
 from motion_detector import MotionDetector
 from video_handler import VideoHandler
 from web_server import WebServer
 from settings_manager import SettingsManager
 from api_client import APIClient
+from upload_queue import UploadQueue
 from config import Config
+import metrics
 
 import builtins
 import datetime
@@ -18,37 +23,82 @@ def new_print(*args, **kwargs):
 builtins.print = new_print
 
 #pip install flask picamera2 opencv-python requests numpy
+#pip install quart hypercorn  # only needed for SERVER_MODE = 'asgi'
+#pip install PyTurboJPEG  # optional, faster JPEG encode/decode, needs libturbojpeg
+
+def create_camera(camera, detection_pool, upload_queue, settings_manager):
+    """Build the capture, detection and recording chain for one entry of Config.CAMERAS"""
+    camera_manager = CameraManager(create_frame_source(camera), camera['id'], detection_pool)
+    if not camera_manager.initialize():
+        return None
+
+    # Initialize video handler, cameras without picamera2 record through OpenCV
+    if camera_manager.picam2:
+        video_handler = VideoHandler(camera_manager.picam2, upload_queue, camera['id'])
+    else:
+        video_handler = FrameRecorder(camera_manager.frame_hub, upload_queue, camera['id'])
+
+    # Initialize motion detector with video handler and this camera's view of the settings
+    camera_settings = settings_manager.for_camera(camera['id'])
+    if Config.DETECTION_PROCESS:
+        from detection_process import ProcessMotionDetector
+        motion_detector = ProcessMotionDetector(video_handler, camera_settings)
+    else:
+        motion_detector = MotionDetector(video_handler, camera_settings)
+
+    # Connect motion detector and video handler to camera manager
+    camera_manager.set_motion_detector(motion_detector)
+    camera_manager.set_video_handler(video_handler)
+
+    # Configure camera with its preset
+    if not camera_manager.configure(camera.get('config', Config.DEFAULT_CONFIG)):
+        camera_manager.stop_stream()
+        return None
+    return camera_manager
 
 def main():
+    cameras = {}
+    detection_pool = None
     try:
-        # Initialize components
-        camera_manager = CameraManager()
-        if not camera_manager.initialize():
-            print("Failed to initialize camera. Exiting.")
-            sys.exit(1)
-
         # Initialize API client
         api_client = APIClient()
 
-        # Initialize settings manager
+        # Initialize settings manager, shared by every camera
         settings_manager = SettingsManager(api_client)
 
-        # Initialize video handler
-        video_handler = VideoHandler(camera_manager.picam2)
+        # Initialize upload queue, this also picks up clips left over from a previous run
+        upload_queue = UploadQueue(api_client)
 
-        # Initialize motion detector with video handler and settings manager
-        motion_detector = MotionDetector(video_handler, settings_manager)
+        # With several cameras detection runs on a shared pool that takes the cameras in turn
+        if len(Config.CAMERAS) > 1:
+            detection_pool = DetectionPool(Config.DETECTION_WORKERS)
 
-        # Connect motion detector to camera manager
-        camera_manager.set_motion_detector(motion_detector)
-
-        # Configure camera with default settings
-        if not camera_manager.configure(Config.DEFAULT_CONFIG):
-            print("Failed to configure camera. Exiting.")
+        # Initialize components
+        for camera in Config.CAMERAS:
+            camera_manager = create_camera(camera, detection_pool, upload_queue, settings_manager)
+            if camera_manager:
+                cameras[camera['id']] = camera_manager
+            else:
+                print(f"Failed to initialize camera {camera['id']}")
+        if not cameras:
+            print("Failed to initialize camera. Exiting.")
             sys.exit(1)
 
+        # Expose component state on /metrics
+        metrics.CAPTURE_FPS.set_function(lambda: sum(camera.capture_fps for camera in cameras.values()))
+        metrics.CAPTURE_TARGET_FPS.set_function(lambda: sum(camera.scheduler.fps for camera in cameras.values()))
+        metrics.RECORDING_ACTIVE.set_function(
+            lambda: sum(camera.motion_detector.state['recording'] for camera in cameras.values())
+        )
+        metrics.UPLOAD_QUEUE_DEPTH.set_function(lambda: upload_queue.pending_count)
+        metrics.SETTINGS_SYNC_AGE.set_function(lambda: settings_manager.sync_age)
+
         # Initialize web server
-        web_server = WebServer(camera_manager)
+        if Config.SERVER_MODE == 'asgi':
+            from asgi_server import AsgiWebServer
+            web_server = AsgiWebServer(cameras)
+        else:
+            web_server = WebServer(cameras)
 
         # Start web server
         print(f"Starting server on port {Config.SERVER_PORT}")
@@ -57,8 +107,13 @@ def main():
     except Exception as e:
         print(f"An error occurred: {str(e)}")
     finally:
-        if camera_manager.stream_active:
-            camera_manager.stop_stream()
+        for camera_manager in cameras.values():
+            if camera_manager.stream_active:
+                camera_manager.stop_stream()
+            if hasattr(camera_manager.motion_detector, 'stop'):
+                camera_manager.motion_detector.stop()
+        if detection_pool:
+            detection_pool.stop()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,172 @@
+import bisect
+import threading
+import time
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+UPLOAD_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+class Counter:
+    type_name = 'counter'
+
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def samples(self):
+        return [(self.name, '', self._value)]
+
+    def to_dict(self):
+        return self._value
+
+class Gauge(Counter):
+    """A value that goes up and down, optionally read from a callback at scrape time"""
+    type_name = 'gauge'
+
+    def __init__(self, name, description):
+        super().__init__(name, description)
+        self._function = None
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        self._function = function
+
+    def samples(self):
+        return [(self.name, '', self.to_dict())]
+
+    def to_dict(self):
+        if self._function:
+            try:
+                return float(self._function())
+            except Exception:
+                return float('nan')
+        return self._value
+
+class Histogram:
+    type_name = 'histogram'
+
+    def __init__(self, name, description, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._sum += value
+
+    def time(self):
+        """Context manager that observes the duration of its block in seconds"""
+        return _Timer(self)
+
+    def samples(self):
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            label = '+Inf' if bound == float('inf') else repr(bound)
+            samples.append((f"{self.name}_bucket", f'{{le="{label}"}}', cumulative))
+        samples.append((f"{self.name}_sum", '', total))
+        samples.append((f"{self.name}_count", '', cumulative))
+        return samples
+
+    def to_dict(self):
+        with self._lock:
+            count = sum(self._counts)
+            return {
+                'count': count,
+                'sum': self._sum,
+                'avg': self._sum / count if count else 0.0
+            }
+
+class _Timer:
+    def __init__(self, histogram):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._histogram.observe(time.perf_counter() - self._start)
+        return False
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, description):
+        return self.register(Counter(name, description))
+
+    def gauge(self, name, description):
+        return self.register(Gauge(name, description))
+
+    def histogram(self, name, description, buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, description, buckets))
+
+    def render_prometheus(self):
+        """Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def to_dict(self):
+        return {metric.name: metric.to_dict() for metric in self._metrics}
+
+REGISTRY = MetricsRegistry()
+
+# Capture pipeline
+CAPTURE_FRAMES = REGISTRY.counter('camera_capture_frames_total', 'Frames captured from the frame source')
+CAPTURE_FPS = REGISTRY.gauge('camera_capture_fps', 'Frames captured per second over the last second, summed over cameras')
+CAPTURE_SECONDS = REGISTRY.histogram('camera_capture_seconds', 'Time spent waiting for and reading a frame')
+ENCODE_SECONDS = REGISTRY.histogram('camera_jpeg_encode_seconds', 'Time spent JPEG encoding a frame for viewers')
+DETECTION_SECONDS = REGISTRY.histogram('motion_detection_seconds', 'Time spent running motion detection on a frame')
+DETECTION_FRAMES_DROPPED = REGISTRY.counter('motion_detection_frames_dropped_total', 'Frames detection skipped because it fell behind the camera')
+ILLUMINATION_CHANGES = REGISTRY.counter('motion_illumination_changes_total', 'Frames ignored as a frame-wide lighting or exposure change')
+CAPTURE_TARGET_FPS = REGISTRY.gauge('camera_capture_target_fps', 'Rate the frame schedulers are currently aiming for, summed over cameras')
+SCHEDULER_FRAMES_SKIPPED = REGISTRY.counter('camera_scheduler_frames_skipped_total', 'Frame slots skipped because processing fell behind')
+CAPTURE_ERRORS = REGISTRY.counter('camera_capture_errors_total', 'Exceptions raised in the capture loop')
+
+# Streaming
+STREAM_VIEWERS = REGISTRY.gauge('stream_viewers', 'Connected MJPEG viewers')
+STREAM_FRAMES_SKIPPED = REGISTRY.counter('stream_frames_skipped_total', 'Frames viewers skipped because they fell behind')
+
+# Recording and uploads
+RECORDING_ACTIVE = REGISTRY.gauge('recording_active', 'Cameras currently recording a clip')
+RECORDING_FALSE_STARTS = REGISTRY.counter('recording_false_starts_total', 'Motion that was never confirmed, each one a clip start and upload avoided')
+RECORDING_MERGED_EVENTS = REGISTRY.counter('recording_merged_events_total', 'Events that continued the previous clip instead of starting and uploading another')
+UPLOAD_QUEUE_DEPTH = REGISTRY.gauge('upload_queue_depth', 'Clips waiting for or being uploaded')
+UPLOAD_BYTES = REGISTRY.counter('upload_bytes_total', 'Bytes of video sent to the backend')
+UPLOAD_SECONDS = REGISTRY.histogram('upload_seconds', 'Time to upload one clip', UPLOAD_BUCKETS)
+UPLOAD_FAILURES = REGISTRY.counter('upload_failures_total', 'Clip uploads that failed and were rescheduled')
+MUX_SECONDS = REGISTRY.histogram('mux_seconds', 'Time to wrap one H.264 clip in MP4', UPLOAD_BUCKETS)
+MUX_FAILURES = REGISTRY.counter('mux_failures_total', 'Clips uploaded as raw H.264 because muxing failed')
+
+# Settings
+SETTINGS_SYNC_AGE = REGISTRY.gauge('settings_sync_age_seconds', 'Seconds since settings were last fetched successfully')
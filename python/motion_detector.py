@@ -1,222 +1,314 @@
 import cv2
 import numpy as np
 import time
+from collections import OrderedDict
 from datetime import datetime
+from blob_filter import BlobFilter
 from config import Config
+from detection_zones import ZoneOverlay, ZoneSet, definitions_key, zone_definitions
+from jpeg_codec import get_codec
+from motion_engines import create_engine
+from motion_timeline import motion_sample
+from recording_state import START, STOP, RecordingStateMachine
+import metrics
 import threading
 
+ZONE_CACHE_SIZE = 4  # Rasterised zone sets and overlays kept, one per (resolution, zones) combination
+
 class MotionDetector:
     def __init__(self, video_handler, settings_manager):
         self.video_handler = video_handler
         self.settings_manager = settings_manager
-        self.settings_manager.add_observer(self.reset_roi_mask)
+        self.settings_manager.add_observer(self.reset_zones)
+        self.recording_state = RecordingStateMachine(settings_manager)
+        # Snapshot of recording_state for the web views, metrics and the detection process
         self.state = {
             'detected': False,
             'recording': False,
-            'recording_start_time': 0,
-            'scheduled_stop_time': 0,
-            'last_motion_time': 0,
             'roi_triggered': False
         }
-        self.prev_frame = None
+        self.engine = create_engine(Config.DEFAULT_DETECTION_ENGINE)
         self.frame_dimensions = None
-        self.roi_mask = None
-        self._roi_lock = threading.Lock()
-
-    def reset_roi_mask(self):
-        """Reset the ROI mask to force recreation on next frame"""
+        self.zones = None  # ZoneSet at the analysis resolution
+        self.zone_scores = {}  # Pixels in motion per include zone on the last frame
+        self.blob_filter = BlobFilter() if Config.BLOB_FILTER else None
+        self.blobs = []  # (x, y, width, height, area) at the analysis size of the blobs on the last frame
+        self.illumination_changes = 0  # Frames ignored as a global lighting change
+        self._illumination_cells = None
+        self._zone_definitions = None
+        self._zone_cache = OrderedDict()
+        self._overlay_cache = OrderedDict()  # Debug overlays, one per (frame size, zones) combination
+        self._roi_lock = threading.RLock()
+
+    def reset_zones(self):
+        """Re-read the zones from the settings on the next frame"""
         with self._roi_lock:
-            self.roi_mask = None
-            print("ROI mask reset - will be recreated on next frame")
+            self._zone_definitions = None
+            self.zones = None
+            print("Detection zones changed - will be rebuilt on next frame")
 
-    def _create_roi_mask(self, frame_shape):
-        """Create a binary mask for the region of interest"""
+    def _get_zone_definitions(self):
         with self._roi_lock:
-            if not self.settings_manager.detection_area_points:
-                return None
-
-            height, width = frame_shape[:2]
-            points = []
+            if self._zone_definitions is None:
+                self._zone_definitions = zone_definitions(self.settings_manager)
+            return self._zone_definitions
 
-            # Convert normalized coordinates to pixel coordinates
-            for point in self.settings_manager.detection_area_points:
-                x = int(point['x'] * width)
-                y = int(point['y'] * height)
-                points.append([x, y])
-
-            # Create binary mask
-            mask = np.zeros((height, width), dtype=np.uint8)
-            points_array = np.array(points, dtype=np.int32)
-            cv2.fillPoly(mask, [points_array], 255)
+    def _zones_for(self, frame_shape):
+        """ZoneSet for a resolution, rasterised once per (resolution, zones) and then reused"""
+        with self._roi_lock:
+            definitions = self._get_zone_definitions()
+            key = (tuple(frame_shape[:2]), definitions_key(definitions))
+            zones = self._zone_cache.get(key)
+            if zones is None:
+                zones = ZoneSet(definitions, frame_shape)
+                self._zone_cache[key] = zones
+                if len(self._zone_cache) > ZONE_CACHE_SIZE:
+                    self._zone_cache.popitem(last=False)
+            else:
+                self._zone_cache.move_to_end(key)
+            return zones
+
+    def process_frame(self, frame_data, timestamp=None):
+        """Process a JPEG encoded frame for motion detection"""
+        try:
+            # Decode straight to grey at the smallest DCT scale that still covers the analysis width
+            current_frame = get_codec().decode(frame_data, grayscale=True, min_width=Config.ANALYSIS_WIDTH)
+            self.process_gray(current_frame, timestamp)
 
-            return mask
+        except Exception as e:
+            print(f"Error processing frame: {str(e)}")
 
-    def process_frame(self, frame_data):
-            """Process a frame for motion detection"""
+    def _sync_engine(self):
+        """Swap the background model when the settings ask for a different one"""
+        engine_name = self.settings_manager.detection_engine
+        if engine_name != self.engine.name:
             try:
-                current_frame = cv2.imdecode(
-                    np.frombuffer(frame_data, np.uint8),
-                    cv2.IMREAD_GRAYSCALE
-                )
-
-                # Initialize or update ROI mask if needed
-                with self._roi_lock:
-                    if self.roi_mask is None and self.settings_manager.detection_area_points:
-                        self.roi_mask = self._create_roi_mask(current_frame.shape)
+                self.engine = create_engine(engine_name)
+                print(f"Switched detection engine to {engine_name}")
+            except ValueError as e:
+                print(f"Keeping detection engine {self.engine.name}: {str(e)}")
+
+    @property
+    def is_active(self):
+        """True while motion is being tracked or a clip is recording"""
+        return self.state['detected'] or self.state['recording']
+
+    def get_stats(self):
+        """Per-frame cost of the active engine, used to pick the cheapest engine per camera"""
+        stats = self.engine.get_stats()
+        stats['illumination_changes'] = self.illumination_changes
+        stats.update(self.recording_state.get_stats())
+        if self.blob_filter:
+            stats.update(self.blob_filter.get_stats())
+        return stats
+
+    def downsample(self, frame):
+        """Shrink a frame to the analysis width so detection cost does not depend on the preset"""
+        height, width = frame.shape[:2]
+        if not Config.ANALYSIS_WIDTH or width <= Config.ANALYSIS_WIDTH:
+            return frame
+
+        analysis_height = round(height * Config.ANALYSIS_WIDTH / width)
+        return cv2.resize(frame, (Config.ANALYSIS_WIDTH, analysis_height), interpolation=cv2.INTER_AREA)
+
+    def _illumination_changed(self, frame):
+        """True when the brightness of most of the frame jumped the same way since the previous frame.
+
+        Lights, clouds and IR cut switches move every region together, while even a large
+        object leaves part of the frame alone or makes some regions brighter and others darker.
+        """
+        cells = cv2.resize(frame, Config.ILLUMINATION_GRID, interpolation=cv2.INTER_AREA).astype(np.int16)
+        previous, self._illumination_cells = self._illumination_cells, cells
+        if previous is None or previous.shape != cells.shape:
+            return False
+
+        shift = cells - previous
+        shifted = np.abs(shift) > Config.ILLUMINATION_SHIFT
+        if shifted.mean() < Config.ILLUMINATION_CELL_FRACTION:
+            return False
+        direction = np.sign(np.median(shift))
+        return (np.sign(shift) == direction)[shifted].sum() >= Config.ILLUMINATION_CELL_FRACTION * shift.size
+
+    def _rebaseline(self, current_frame):
+        """Count a global lighting change and restart the background model from this frame"""
+        self.illumination_changes += 1
+        metrics.ILLUMINATION_CHANGES.inc()
+        self.engine.reset()
+        self.engine.apply(current_frame)
+
+    def process_gray(self, current_frame, timestamp=None):
+        """Process a grayscale frame for motion detection, timestamp defaults to now"""
+        try:
+            current_frame = self.downsample(current_frame)
 
-                if self.prev_frame is not None:
-                    self.detect_motion(current_frame)
+            # Initialize or update the zones if needed
+            with self._roi_lock:
+                if self.zones is None or self.zones.shape != current_frame.shape[:2]:
+                    self.zones = self._zones_for(current_frame.shape)
 
-                self.prev_frame = current_frame
+            self._sync_engine()
+            self.detect_motion(current_frame, timestamp)
 
-            except Exception as e:
-                print(f"Error processing frame: {str(e)}")
+        except Exception as e:
+            print(f"Error processing frame: {str(e)}")
 
-    def detect_motion(self, current_frame):
+    def detect_motion(self, current_frame, timestamp=None):
         """Detect motion between frames with ROI support"""
         try:
-            current_time = time.time()
+            # Offline sources replay faster than real time, so timing follows the frame timestamps
+            current_time = timestamp if timestamp is not None else time.time()
 
-            # Compare frames
-            if current_frame.shape != self.prev_frame.shape:
-                print("Frame shape mismatch")
+            # A frame-wide brightness jump is a lighting change, not motion
+            if Config.ILLUMINATION_REJECTION and self._illumination_changed(current_frame):
+                self._rebaseline(current_frame)
                 return False
 
-            delta_frame = cv2.absdiff(self.prev_frame, current_frame)
-            thresh = cv2.threshold(delta_frame, 25, 255, cv2.THRESH_BINARY)[1]
+            # Let the background model produce the binary motion mask
+            thresh = self.engine.apply(current_frame)
+            if thresh is None:
+                return False
 
-            # Calculate motion score for entire frame
-            motion_score = cv2.countNonZero(thresh)
+            # Thresholds are fractions of the analysis area so every preset is equally sensitive
+            frame_area = current_frame.shape[0] * current_frame.shape[1]
 
-            # Calculate motion score for ROI if mask exists
+            # Slow changes such as passing clouds build up in the background models until nearly everything differs
+            if Config.ILLUMINATION_REJECTION and cv2.countNonZero(thresh) > Config.ILLUMINATION_MAX_COVERAGE * frame_area:
+                self._rebaseline(current_frame)
+                return False
+
+            # Score the whole frame and every include zone, exclude zones count nowhere
+            zones = self.zones or self._zones_for(current_frame.shape)
+            thresh = zones.exclude(thresh)
+            if self.blob_filter:
+                # Only blobs that look like real movers count towards any score
+                thresh, self.blobs = self.blob_filter.apply(thresh)
+            motion_score, self.zone_scores = zones.score(thresh)
+
+            # Each include zone triggers on its own threshold, by default roi_motion_threshold
             roi_triggered = False
-            if self.roi_mask is not None:
-                roi_thresh = cv2.bitwise_and(thresh, thresh, mask=self.roi_mask)
-                roi_motion_score = cv2.countNonZero(roi_thresh)
-                roi_triggered = roi_motion_score > (self.settings_manager.motion_threshold * 0.5)  # Use lower threshold for ROI
-
-                if roi_triggered:
-                    print(f"ROI motion detected! Score: {roi_motion_score}")
-
-            # Motion detected in full frame
-            if motion_score > self.settings_manager.motion_threshold:
-                # print(f"Motion detected! Score: {motion_score}")
-                self.state['detected'] = True
-                self.state['last_motion_time'] = current_time
-
-                if not self.state['recording']:
-                    # Start new recording
-                    print("Starting new recording")
-                    self.video_handler.start_recording(roi_triggered=roi_triggered)
-                    self.state['recording'] = True
-                    self.state['recording_start_time'] = current_time
-                    self.state['scheduled_stop_time'] = current_time + self.settings_manager.recording_extension
-                else:
-                    # Update ROI triggered state if it occurs during recording
-                    if roi_triggered and not self.state['roi_triggered']:
-                        self.state['roi_triggered'] = True
-                        self.video_handler.roi_triggered = True
-
-                    # Already recording, extend the stop time
-                    new_stop_time = current_time + self.settings_manager.recording_extension
-                    max_stop_time = self.state['recording_start_time'] + self.settings_manager.max_recording_duration
-
-                    # Don't extend beyond max duration
-                    self.state['scheduled_stop_time'] = min(new_stop_time, max_stop_time)
-
-            # Check if we should stop recording
-            if self.state['recording']:
-                # Stop if we've reached max duration
-                if current_time - self.state['recording_start_time'] >= self.settings_manager.max_recording_duration:
+            for zone in zones.zones:
+                threshold_fraction = zone.threshold_fraction
+                if threshold_fraction is None:
+                    threshold_fraction = self.settings_manager.roi_motion_threshold_fraction
+                if self.zone_scores[zone.name] > threshold_fraction * frame_area:
+                    roi_triggered = True
+                    print(f"ROI motion detected in {zone.name}! Score: {self.zone_scores[zone.name] / frame_area:.4f}")
+
+            # The state machine debounces the start and decides when the clip ends
+            recording = self.recording_state
+            was_roi_triggered = recording.roi_triggered
+            action = recording.update(current_time, motion_score / frame_area, roi_triggered)
+
+            if action == START:
+                print("Starting new recording")
+                self.video_handler.start_recording(roi_triggered=recording.roi_triggered)
+            elif recording.recording and recording.roi_triggered and not was_roi_triggered:
+                # ROI motion later in the clip still marks it as ROI triggered
+                self.video_handler.roi_triggered = True
+
+            # Every frame of a clip goes into its motion timeline, including the last one
+            if (recording.recording or action == STOP) and Config.MOTION_METADATA:
+                bbox, cells = motion_sample(thresh)
+                roi_score = max(self.zone_scores.values(), default=0)
+                self.video_handler.record_motion(current_time, motion_score / frame_area, roi_score / frame_area, bbox, cells)
+
+            if action == STOP:
+                if recording.stop_reason == 'max_duration':
                     print(f"Stopping recording - reached max duration of {self.settings_manager.max_recording_duration}s")
-                    self.video_handler.stop_recording()
-                    self.state['recording'] = False
-                    self.state['detected'] = False
-                    self.state['roi_triggered'] = False
-                # Stop if no motion for RECORDING_EXTENSION seconds
-                elif current_time >= self.state['scheduled_stop_time']:
-                    print(f"Stopping recording - no motion for {self.settings_manager.recording_extension}s")
-                    self.video_handler.stop_recording()
-                    self.state['recording'] = False
-                    self.state['detected'] = False
-                    self.state['roi_triggered'] = False
+                else:
+                    print(f"Stopping recording - no motion for {self.settings_manager.recording_extension + Config.RECORDING_MERGE_GAP}s")
+                self.video_handler.stop_recording()
+
+            self.state.update({
+                'detected': recording.detected,
+                'recording': recording.recording,
+                'roi_triggered': recording.roi_triggered
+            })
 
         except Exception as e:
             print(f"Error in detect_motion: {str(e)}")
 
+    def _overlay_for(self, frame_shape):
+        """ZoneOverlay for a frame size, drawn once per (size, zones) and then reused"""
+        with self._roi_lock:
+            definitions = self._get_zone_definitions()
+            key = (tuple(frame_shape[:2]), definitions_key(definitions))
+            overlay = self._overlay_cache.get(key)
+            if overlay is None:
+                overlay = ZoneOverlay(definitions, frame_shape)
+                self._overlay_cache[key] = overlay
+                if len(self._overlay_cache) > ZONE_CACHE_SIZE:
+                    self._overlay_cache.popitem(last=False)
+            else:
+                self._overlay_cache.move_to_end(key)
+            return overlay
+
+    def render_debug_frame(self, frame):
+        """Return a BGR frame with the detection zones and status drawn on, or None if there are no zones"""
+        if not self._get_zone_definitions():
+            return None
+
+        # Detection runs at the analysis size, the overlay is drawn at the frame size
+        height, width = frame.shape[:2]
+        debug_frame = self._overlay_for(frame.shape).draw(frame)
+
+        # Blobs that survived the blob filter, found at the analysis size
+        zones = self.zones
+        if self.blobs and zones:
+            scale_x, scale_y = width / zones.shape[1], height / zones.shape[0]
+            for x, y, blob_width, blob_height, _ in self.blobs:
+                top_left = (int(x * scale_x), int(y * scale_y))
+                bottom_right = (int((x + blob_width) * scale_x), int((y + blob_height) * scale_y))
+                cv2.rectangle(debug_frame, top_left, bottom_right, (255, 255, 0), 2)
+
+        # Add debug text
+        if self.state['detected']:
+            status = "Motion Detected"
+            color = (0, 255, 0)
+        else:
+            status = "No Motion"
+            color = (0, 0, 255)
+
+        cv2.putText(
+            debug_frame,
+            f"Status: {status}",
+            (10, 30),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            1,
+            color,
+            2
+        )
+
+        if self.state['roi_triggered']:
+            roi_status = "ROI Triggered"
+            roi_color = (0, 255, 0)
+        else:
+            roi_status = "ROI Not Triggered"
+            roi_color = (0, 0, 255)
+
+        cv2.putText(
+            debug_frame,
+            f"ROI: {roi_status}",
+            (10, 70),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            1,
+            roi_color,
+            2
+        )
+        return debug_frame
+
     def get_debug_frame(self, frame_data):
-        """Create a debug frame with the ROI mask overlay"""
+        """Create a debug frame with the detection zones overlaid from a JPEG frame"""
         try:
             # Decode the JPEG frame
-            frame = cv2.imdecode(
-                np.frombuffer(frame_data, np.uint8),
-                cv2.IMREAD_COLOR
-            )
-
-            if self.roi_mask is None and self.settings_manager.detection_area_points:
-                self.roi_mask = self._create_roi_mask(frame.shape)
-
-            if self.roi_mask is not None:
-                # Create a colored overlay
-                overlay = frame.copy()
-                overlay[self.roi_mask > 0] = [0, 255, 0]  # Green tint for ROI
-
-                # Blend the overlay with the original frame
-                alpha = 0.3  # Transparency factor
-                debug_frame = cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0)
-
-                # Draw the polygon outline
-                height, width = frame.shape[:2]
-                points = []
-                for point in self.settings_manager.detection_area_points:
-                    x = int(point['x'] * width)
-                    y = int(point['y'] * height)
-                    points.append([x, y])
-
-                points_array = np.array(points, dtype=np.int32)
-                cv2.polylines(debug_frame, [points_array], True, (0, 0, 255), 2)  # Red outline
-
-                # Add debug text
-                if self.state['detected']:
-                    status = "Motion Detected"
-                    color = (0, 255, 0)
-                else:
-                    status = "No Motion"
-                    color = (0, 0, 255)
-
-                cv2.putText(
-                    debug_frame,
-                    f"Status: {status}",
-                    (10, 30),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    1,
-                    color,
-                    2
-                )
-
-                if self.state['roi_triggered']:
-                    roi_status = "ROI Triggered"
-                    roi_color = (0, 255, 0)
-                else:
-                    roi_status = "ROI Not Triggered"
-                    roi_color = (0, 0, 255)
-
-                cv2.putText(
-                    debug_frame,
-                    f"ROI: {roi_status}",
-                    (10, 70),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    1,
-                    roi_color,
-                    2
-                )
-
-                # Encode the debug frame as JPEG
-                _, buffer = cv2.imencode('.jpg', debug_frame)
-                return buffer.tobytes()
+            frame = get_codec().decode(frame_data)
+            debug_frame = self.render_debug_frame(frame)
+            if debug_frame is None:
+                return frame_data  # Return original frame if there are no zones
 
-            return frame_data  # Return original frame if no ROI mask
+            # Encode the debug frame as JPEG
+            return get_codec().encode(debug_frame)
 
         except Exception as e:
             print(f"Error creating debug frame: {str(e)}")
-            return frame_data
\ No newline at end of file
+            return frame_data
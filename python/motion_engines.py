@@ -0,0 +1,125 @@
+import cv2
+import time
+from config import Config
+
+class MotionEngine:
+    """Base class for background models that turn a grayscale frame into a binary motion mask"""
+    name = None
+
+    def __init__(self):
+        self.frame_shape = None
+        self.frames_processed = 0
+        self.avg_frame_time = 0.0  # Exponential moving average in seconds
+
+    def apply(self, frame):
+        """Feed a frame to the model, returns the motion mask or None while the model warms up"""
+        start = time.perf_counter()
+
+        # A new resolution invalidates whatever the model has learned
+        if frame.shape != self.frame_shape:
+            self.reset()
+            self.frame_shape = frame.shape
+
+        mask = self._apply(frame)
+
+        elapsed = time.perf_counter() - start
+        if self.frames_processed == 0:
+            self.avg_frame_time = elapsed
+        else:
+            self.avg_frame_time += (elapsed - self.avg_frame_time) * 0.05
+        self.frames_processed += 1
+        return mask
+
+    def _apply(self, frame):
+        raise NotImplementedError
+
+    def reset(self):
+        """Forget the background so the next frame starts a fresh model"""
+        pass
+
+    def get_stats(self):
+        return {
+            'engine': self.name,
+            'frames_processed': self.frames_processed,
+            'avg_frame_ms': round(self.avg_frame_time * 1000, 3)
+        }
+
+class FrameDiffEngine(MotionEngine):
+    """Difference against the previous frame, cheapest but blind to slow movers"""
+    name = 'frame_diff'
+
+    def __init__(self):
+        super().__init__()
+        self.prev_frame = None
+
+    def _apply(self, frame):
+        prev_frame = self.prev_frame
+        self.prev_frame = frame
+        if prev_frame is None:
+            return None
+
+        delta_frame = cv2.absdiff(prev_frame, frame)
+        return cv2.threshold(delta_frame, Config.PIXEL_DIFF_THRESHOLD, 255, cv2.THRESH_BINARY)[1]
+
+    def reset(self):
+        self.prev_frame = None
+
+class RunningAverageEngine(MotionEngine):
+    """Difference against an exponentially weighted background, catches slow movers and ignores single frame noise"""
+    name = 'running_average'
+
+    def __init__(self):
+        super().__init__()
+        self.background = None
+
+    def _apply(self, frame):
+        if self.background is None:
+            self.background = frame.astype('float32')
+            return None
+
+        delta_frame = cv2.absdiff(frame, cv2.convertScaleAbs(self.background))
+        cv2.accumulateWeighted(frame, self.background, Config.RUNNING_AVERAGE_ALPHA)
+        return cv2.threshold(delta_frame, Config.PIXEL_DIFF_THRESHOLD, 255, cv2.THRESH_BINARY)[1]
+
+    def reset(self):
+        self.background = None
+
+class MOG2Engine(MotionEngine):
+    """Per-pixel Gaussian mixture model, most robust and most expensive"""
+    name = 'mog2'
+
+    def __init__(self):
+        super().__init__()
+        self.subtractor = None
+
+    def _create_subtractor(self):
+        return cv2.createBackgroundSubtractorMOG2(detectShadows=False)
+
+    def _apply(self, frame):
+        if self.subtractor is None:
+            # The first frame only seeds the model, everything in it would count as foreground
+            self.subtractor = self._create_subtractor()
+            self.subtractor.apply(frame)
+            return None
+        return self.subtractor.apply(frame)
+
+    def reset(self):
+        self.subtractor = None
+
+class KNNEngine(MOG2Engine):
+    """K-nearest neighbours background model"""
+    name = 'knn'
+
+    def _create_subtractor(self):
+        return cv2.createBackgroundSubtractorKNN(detectShadows=False)
+
+ENGINES = {
+    engine.name: engine
+    for engine in (FrameDiffEngine, RunningAverageEngine, MOG2Engine, KNNEngine)
+}
+
+def create_engine(name):
+    """Instantiate a motion engine by its settings name"""
+    if name not in ENGINES:
+        raise ValueError(f"Unknown detection engine: {name}")
+    return ENGINES[name]()
@@ -0,0 +1,74 @@
+import json
+import os
+import cv2
+import numpy as np
+from config import Config
+
+SUFFIX = '.motion.json'  # Sidecar file name is the clip name plus this suffix
+
+def motion_sample(thresh, grid=Config.MOTION_HEATMAP_GRID):
+    """Return (bounding box of the moving pixels, motion per grid cell) for a binary motion mask.
+
+    The box is (x, y, width, height) normalized to the frame, None when nothing moved.
+    The cells are the fraction of pixels in motion, shaped (rows, columns).
+    """
+    height, width = thresh.shape[:2]
+    x, y, box_width, box_height = cv2.boundingRect(thresh)
+    bbox = (x / width, y / height, box_width / width, box_height / height) if box_width and box_height else None
+    cells = cv2.resize(np.float32(thresh), grid, interpolation=cv2.INTER_AREA) / 255
+    return bbox, cells
+
+class MotionTimeline:
+    """Per-frame motion of one clip, uploaded as a JSON sidecar so the server can index it.
+
+    Every sample is [seconds since the trigger, motion fraction, ROI fraction, x, y,
+    width, height], the box fields are left out on frames without motion. The clip
+    starts pre_roll seconds before the trigger. The heatmap is the average motion per
+    grid cell over the clip, row by row.
+    """
+    FIELDS = ['t', 'motion', 'roi', 'x', 'y', 'w', 'h']
+
+    def __init__(self, started_at, pre_roll=0):
+        self.started_at = started_at  # ISO time of the trigger
+        self.pre_roll = pre_roll
+        self.samples = []
+        self._start = None
+        self._heat = None
+
+    def add(self, timestamp, motion, roi, bbox, cells):
+        if self._start is None:
+            self._start = timestamp
+        sample = [round(timestamp - self._start, 3), round(motion, 5), round(roi, 5)]
+        if bbox:
+            sample.extend(round(value, 4) for value in bbox)
+        self.samples.append(sample)
+
+        if self._heat is None or self._heat.shape != cells.shape:
+            self._heat = np.zeros(cells.shape, dtype=np.float64)
+        self._heat += cells
+
+    def to_dict(self):
+        rows, columns = self._heat.shape if self._heat is not None else (0, 0)
+        heat = self._heat / len(self.samples) if self.samples else np.zeros((rows, columns))
+        return {
+            'version': 1,
+            'started_at': self.started_at,
+            'pre_roll': self.pre_roll,
+            'fields': self.FIELDS,
+            'samples': self.samples,
+            'peak_motion': max((sample[1] for sample in self.samples), default=0),
+            'heatmap': {
+                'columns': columns,
+                'rows': rows,
+                'cells': [round(float(value), 4) for value in heat.ravel()]
+            }
+        }
+
+    def save(self, clip_path):
+        """Atomically write the sidecar next to the clip and return its path"""
+        path = clip_path + SUFFIX
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as sidecar:
+            json.dump(self.to_dict(), sidecar, separators=(',', ':'))
+        os.replace(temp_path, path)
+        return path
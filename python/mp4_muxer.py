@@ -0,0 +1,36 @@
+import os
+import subprocess
+from config import Config
+
+MUX_TIMEOUT = 120  # seconds, remuxing copies the stream so even long clips take a moment
+
+def mux_h264(input_path, fps):
+    """Wrap a raw H.264 clip in an MP4 without re-encoding, return the MP4 path or None on failure.
+
+    Raw H.264 carries no timestamps, so they are generated from the encoder frame rate.
+    The index is moved to the front of the file so browsers start playing straight away.
+    """
+    output_path = os.path.splitext(input_path)[0] + '.mp4'
+    temp_path = output_path + '.tmp'
+    command = [
+        Config.FFMPEG_PATH, '-loglevel', 'error', '-y',
+        '-framerate', str(fps), '-i', input_path,
+        '-c:v', 'copy',
+        '-movflags', '+faststart',
+        '-f', 'mp4', temp_path
+    ]
+
+    try:
+        subprocess.run(command, check=True, capture_output=True, timeout=MUX_TIMEOUT)
+        os.replace(temp_path, output_path)
+        return output_path
+    except subprocess.CalledProcessError as e:
+        print(f"Error muxing {input_path}: {e.stderr.decode(errors='replace').strip()}")
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"Error muxing {input_path}: {str(e)}")
+
+    try:
+        os.remove(temp_path)
+    except FileNotFoundError:
+        pass
+    return None
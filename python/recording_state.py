@@ -0,0 +1,149 @@
+import math
+from collections import deque
+from config import Config
+import metrics
+
+IDLE = 'idle'
+RECORDING = 'recording'
+HOLDING = 'holding'  # Motion ended, the clip stays open RECORDING_MERGE_GAP seconds in case it resumes
+
+START = 'start'
+STOP = 'stop'
+
+class RecordingStateMachine:
+    """Decides when a clip starts and stops from the motion score of every frame.
+
+    A clip starts once RECORDING_CONFIRM_FRAMES of the last RECORDING_CONFIRM_WINDOW
+    frames scored above motion_threshold, so a single noisy frame never reaches the
+    encoder. While recording, motion goes on as long as an EMA of the score stays above
+    RECORDING_OFF_RATIO of that threshold. recording_extension seconds after the last
+    motion the clip is held open for RECORDING_MERGE_GAP more seconds, and an event
+    confirmed in that time continues the clip instead of starting a new one. Clips last
+    at least RECORDING_MIN_SECONDS and at most max_recording_duration.
+
+    Nothing here touches the encoder, update() only says what to do, so a sequence of
+    synthetic scores is enough to exercise it.
+    """
+    def __init__(self, settings_manager):
+        self.settings_manager = settings_manager
+        self.confirm_frames = Config.RECORDING_CONFIRM_FRAMES
+        self._window = deque(maxlen=max(Config.RECORDING_CONFIRM_WINDOW, Config.RECORDING_CONFIRM_FRAMES))
+        self.phase = IDLE
+        self.score = None  # EMA of the motion score, a fraction of the frame
+        self.roi_triggered = False
+        self.started_at = 0
+        self.last_motion_time = 0
+        self.hold_until = 0
+        self.stop_reason = None  # 'max_duration' or 'quiet' after a STOP
+        self.false_starts = 0  # Motion that never got confirmed, each one a clip the old trigger would have recorded
+        self.merged_events = 0  # Events that continued the previous clip instead of starting another
+        self.uploads_avoided = 0  # Files the old single frame trigger would have uploaded on top, see _count_avoided()
+        self._candidate = False  # Unconfirmed motion is in the window
+
+    @property
+    def recording(self):
+        return self.phase != IDLE
+
+    @property
+    def detected(self):
+        """True while recording or while motion is waiting to be confirmed"""
+        return self.recording or self._candidate
+
+    @property
+    def starts_avoided(self):
+        return self.false_starts + self.merged_events
+
+    def update(self, timestamp, score, roi_triggered=False):
+        """Feed the motion score of one frame, returns START, STOP or None"""
+        on_threshold = self.settings_manager.motion_threshold_fraction
+        hit = score > on_threshold
+        self._window.append((hit, roi_triggered and hit))
+        self.score = score if self.score is None else self.score + (score - self.score) * Config.RECORDING_SCORE_ALPHA
+
+        hits = sum(frame_hit for frame_hit, _ in self._window)
+        confirmed = hit and hits >= self.confirm_frames
+        if hit and self.phase != RECORDING:
+            self._candidate = True
+        elif not hits and self._candidate:
+            # The motion left the window without ever being confirmed
+            self._candidate = False
+            self.false_starts += 1
+            metrics.RECORDING_FALSE_STARTS.inc()
+            self._count_avoided(merged=False)
+
+        if self.phase == IDLE:
+            if confirmed:
+                return self._start(timestamp)
+            return None
+
+        if timestamp - self.started_at >= self.settings_manager.max_recording_duration:
+            return self._stop('max_duration')
+
+        if self.phase == HOLDING:
+            if confirmed:
+                self.merged_events += 1
+                metrics.RECORDING_MERGED_EVENTS.inc()
+                self._count_avoided(merged=True)
+                self._resume(timestamp)
+            elif timestamp >= self.hold_until:
+                return self._stop('quiet')
+            return None
+
+        if hit or self.score > on_threshold * Config.RECORDING_OFF_RATIO:
+            self.last_motion_time = timestamp
+            if roi_triggered and hit:
+                self.roi_triggered = True
+
+        quiet_until = max(
+            self.last_motion_time + self.settings_manager.recording_extension,
+            self.started_at + Config.RECORDING_MIN_SECONDS
+        )
+        if timestamp >= quiet_until:
+            if Config.RECORDING_MERGE_GAP <= 0:
+                return self._stop('quiet')
+            self.phase = HOLDING
+            self.hold_until = timestamp + Config.RECORDING_MERGE_GAP
+        return None
+
+    def _count_avoided(self, merged):
+        """Add the uploads a false start or a merged event saved.
+
+        Unsegmented, both save exactly one clip. Segmented, a false start saves the
+        segments of the clip the old trigger would have recorded: the pre-roll and
+        recording_extension seconds. A merged event saves no predictable number of
+        segments, because the footage of the hold is uploaded in segments as well, so it
+        is not counted.
+        """
+        if Config.SEGMENT_SECONDS <= 0:
+            self.uploads_avoided += 1
+        elif not merged:
+            seconds = Config.PRE_ROLL_SECONDS + self.settings_manager.recording_extension
+            self.uploads_avoided += max(1, math.ceil(seconds / Config.SEGMENT_SECONDS))
+
+    def _start(self, timestamp):
+        self.phase = RECORDING
+        self.started_at = timestamp
+        self.roi_triggered = any(roi for _, roi in self._window)
+        self._resume(timestamp)
+        return START
+
+    def _resume(self, timestamp):
+        self.phase = RECORDING
+        self.last_motion_time = timestamp
+        self._candidate = False
+        if any(roi for _, roi in self._window):
+            self.roi_triggered = True
+
+    def _stop(self, reason):
+        self.phase = IDLE
+        self.stop_reason = reason
+        self.roi_triggered = False
+        return STOP
+
+    def get_stats(self):
+        return {
+            'recording_false_starts': self.false_starts,
+            'recording_merged_events': self.merged_events,
+            'recording_starts_avoided': self.starts_avoided,
+            'recording_uploads_avoided': self.uploads_avoided
+        }
@@ -0,0 +1,148 @@
+"""Run MotionDetector over recorded or generated frames as fast as possible.
+
+No camera, backend or uploads are needed: the video handler and settings are stubs,
+so this runs on any Linux box. Reports throughput and the recording timeline.
+
+    python replay.py --video motion_2025_01_01T12_00_00.h264
+    python replay.py --images frames/ --fps 10 --engine mog2
+    python replay.py --synthetic --size 4608 2592 --frames 600 --json
+"""
+import argparse
+import contextlib
+import json
+import sys
+import time
+from config import Config
+from frame_source import VideoFileFrameSource, ImageDirectoryFrameSource, SyntheticFrameSource
+from motion_detector import MotionDetector
+from motion_engines import ENGINES
+
+class StaticSettingsManager:
+    """SettingsManager stand-in with fixed values and no API polling"""
+    def __init__(self, motion_threshold=1000, roi_motion_threshold=500, recording_extension=5,
+                 max_recording_duration=60, detection_area_points=None, detection_zones=None,
+                 detection_engine=Config.DEFAULT_DETECTION_ENGINE):
+        self.motion_threshold = motion_threshold
+        self.roi_motion_threshold = roi_motion_threshold
+        self.recording_extension = recording_extension
+        self.max_recording_duration = max_recording_duration
+        self.detection_area_points = detection_area_points or []
+        self.detection_zones = detection_zones or []
+        self.detection_engine = detection_engine
+
+        reference_area = Config.THRESHOLD_REFERENCE_SIZE[0] * Config.THRESHOLD_REFERENCE_SIZE[1]
+        self.motion_threshold_fraction = motion_threshold / reference_area
+        self.roi_motion_threshold_fraction = roi_motion_threshold / reference_area
+
+    def add_observer(self, callback):
+        pass
+
+class StubVideoHandler:
+    """VideoHandler stand-in that records when clips would start and stop instead of encoding and uploading"""
+    def __init__(self):
+        self.events = []
+        self.roi_triggered = False
+        self.current_time = 0.0  # Timestamp of the frame being processed, set by the replay loop
+
+    def start_recording(self, roi_triggered=False):
+        self.roi_triggered = roi_triggered
+        self.events.append({'event': 'start', 'time': round(self.current_time, 3), 'roi_triggered': roi_triggered})
+        return True
+
+    def stop_recording(self):
+        self.events.append({'event': 'stop', 'time': round(self.current_time, 3), 'roi_triggered': self.roi_triggered})
+        self.roi_triggered = False
+
+    def record_motion(self, timestamp, motion, roi, bbox, cells):
+        pass
+
+def build_source(args):
+    if args.video:
+        return VideoFileFrameSource(args.video)
+    if args.images:
+        return ImageDirectoryFrameSource(args.images, fps=args.fps)
+    return SyntheticFrameSource(size=tuple(args.size) if args.size else None, fps=args.fps, frame_count=args.frames or 300)
+
+def replay(source, detector, video_handler, max_frames=None):
+    """Push every frame of the source through the detector, returns (frames, seconds spent)"""
+    frames = 0
+    elapsed = 0.0
+    last_timestamp = 0.0
+    while max_frames is None or frames < max_frames:
+        frame = source.read()
+        if frame is None:
+            break
+
+        video_handler.current_time = last_timestamp = frame.timestamp
+        start = time.perf_counter()
+        detector.process_gray(frame.gray, frame.timestamp)
+        elapsed += time.perf_counter() - start
+        frames += 1
+
+    # Close a clip that is still open when the input runs out
+    if detector.state['recording']:
+        video_handler.current_time = last_timestamp
+        video_handler.stop_recording()
+    return frames, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source_group = parser.add_mutually_exclusive_group()
+    source_group.add_argument('--video', help='recorded clip to replay')
+    source_group.add_argument('--images', help='directory of frames to replay in name order')
+    source_group.add_argument('--synthetic', action='store_true', help='generated scene with a moving block (default)')
+    parser.add_argument('--size', nargs=2, type=int, metavar=('WIDTH', 'HEIGHT'), help='synthetic frame size')
+    parser.add_argument('--frames', type=int, help='synthetic frame count (default 300), or a cap for other sources')
+    parser.add_argument('--fps', type=float, default=30.0, help='capture rate assumed for images and synthetic frames')
+    parser.add_argument('--engine', choices=sorted(ENGINES), default=Config.DEFAULT_DETECTION_ENGINE)
+    parser.add_argument('--motion-threshold', type=int, default=1000)
+    parser.add_argument('--recording-extension', type=float, default=5)
+    parser.add_argument('--max-recording-duration', type=float, default=60)
+    parser.add_argument('--roi', help='detection area as JSON, e.g. [{"x": 0.1, "y": 0.1}, ...]')
+    parser.add_argument('--zones', help='detection zones as JSON, e.g. [{"name": "door", "mode": "include", "threshold": 300, "points": [...]}]')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    source = build_source(args)
+    if not source.open():
+        sys.exit(1)
+
+    settings_manager = StaticSettingsManager(
+        motion_threshold=args.motion_threshold,
+        recording_extension=args.recording_extension,
+        max_recording_duration=args.max_recording_duration,
+        detection_area_points=json.loads(args.roi) if args.roi else None,
+        detection_zones=json.loads(args.zones) if args.zones else None,
+        detection_engine=args.engine
+    )
+    video_handler = StubVideoHandler()
+    detector = MotionDetector(video_handler, settings_manager)
+
+    # Keep stdout machine-readable, the detector reports what it does with print
+    with contextlib.redirect_stdout(sys.stderr if args.json else sys.stdout):
+        wall_start = time.perf_counter()
+        frames, detect_seconds = replay(source, detector, video_handler, args.frames)
+        wall_seconds = time.perf_counter() - wall_start
+    source.close()
+
+    report = {
+        'frames': frames,
+        'detect_fps': round(frames / detect_seconds, 1) if detect_seconds else None,
+        'overall_fps': round(frames / wall_seconds, 1) if wall_seconds else None,
+        'engine': detector.get_stats(),
+        'timeline': video_handler.events
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"Frames: {report['frames']}")
+    print(f"Detection: {report['detect_fps']} fps, including decode: {report['overall_fps']} fps")
+    print(f"Engine: {report['engine']['engine']} ({report['engine']['avg_frame_ms']} ms/frame)")
+    print("Timeline:")
+    for event in report['timeline']:
+        print(f"  {event['time']:>9.3f}s  {event['event']:<5}  roi_triggered={event['roi_triggered']}")
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,8 @@
+import json
+import os
 import threading
 import time
+from datetime import datetime
 from typing import List, Dict
 from config import Config
 
@@ -8,6 +11,8 @@ class SettingsManager:
         self._api_client = api_client
         self._lock = threading.Lock()
         self._observers = []  # List to hold observer callbacks
+        self._started_at = time.time()
+        self._last_sync_time = None
 
         # Default values
         self._motion_threshold = 1000
@@ -15,7 +20,13 @@ class SettingsManager:
         self._recording_extension = 5
         self._max_recording_duration = 60
         self._detection_area_points = []
-        self._last_points_hash = self._hash_points(self._detection_area_points)
+        self._detection_zones = []
+        self._detection_engine = Config.DEFAULT_DETECTION_ENGINE
+        self._camera_settings = {}  # camera id -> settings that differ from the shared ones
+        self._last_points_hash = (self._hash_points(self._detection_area_points), self._hash_zones(self._detection_zones), ())
+        self._reference_area = Config.THRESHOLD_REFERENCE_SIZE[0] * Config.THRESHOLD_REFERENCE_SIZE[1]
+        self._etag = None  # Version of the settings we have, sent as If-None-Match
+        self._load_cache()
 
         # Start update thread
         self._update_thread = threading.Thread(
@@ -31,6 +42,12 @@ class SettingsManager:
         # Convert points to tuples and create a hash
         return hash(tuple(tuple(sorted(point.items())) for point in sorted(points, key=lambda x: (x['x'], x['y']))))
 
+    def _hash_zones(self, zones: List[Dict]) -> str:
+        """Create a hash of detection zones, including their modes and thresholds"""
+        if not zones:
+            return ""
+        return json.dumps(zones, sort_keys=True)
+
     def add_observer(self, callback):
         """Add an observer to be notified of ROI changes"""
         self._observers.append(callback)
@@ -41,34 +58,110 @@ class SettingsManager:
             callback()
 
     def _update_loop(self):
-        """Background thread to update settings periodically"""
+        """Background thread to update settings periodically, or continuously with long-polling"""
         while True:
-            self.update_settings()
-            time.sleep(Config.SETTINGS_UPDATE_INTERVAL)
+            started = time.monotonic()
+            etag = self._etag
+            synced = self.update_settings()
+            elapsed = time.monotonic() - started
+            # The API is only asked to hold the request when there is an etag to compare with, so without one this polls.
+            # An unchanged answer well before the wait ran out means the API or a proxy ignored wait, polling again at
+            # once would multiply the load of regular polling, so that falls back to the regular interval as well
+            held = etag is None or self._etag != etag or elapsed >= Config.SETTINGS_LONG_POLL / 2
+            if synced and Config.SETTINGS_LONG_POLL and self._etag and held:
+                time.sleep(max(0, Config.SETTINGS_LONG_POLL_MIN_INTERVAL - elapsed))
+            else:
+                time.sleep(Config.SETTINGS_UPDATE_INTERVAL)
 
     def update_settings(self):
-        """Fetch and update settings from API"""
+        """Fetch and update settings from API, returns True when the API answered"""
         try:
-            response = self._api_client.get_settings()
+            result = self._api_client.get_settings(etag=self._etag, wait=Config.SETTINGS_LONG_POLL)
+            if result is None:
+                return False
 
-            if response:
-                with self._lock:
-                    self._motion_threshold = response.get('motion_threshold', self._motion_threshold)
-                    self._roi_motion_threshold = response.get('roi_motion_threshold', self._roi_motion_threshold)
-                    self._recording_extension = response.get('recording_extension', self._recording_extension)
-                    self._max_recording_duration = response.get('max_recording_duration', self._max_recording_duration)
+            response, etag = result
+            with self._lock:
+                self._last_sync_time = time.time()
+                self._etag = etag
+            if response is None:
+                return True  # Not modified since the version we have
 
-                    new_points = response.get('detection_area_points', self._detection_area_points)
-                    new_points_hash = self._hash_points(new_points)
-
-                    if new_points_hash != self._last_points_hash:
-                        self._detection_area_points = new_points
-                        self._last_points_hash = new_points_hash
-                        self._notify_roi_change()
-                        print("Detection area points changed, updating ROI mask")
+            self._apply_settings(response)
+            self._save_cache(response, etag)
+            return True
 
         except Exception as e:
             print(f"Error updating settings: {str(e)}")
+            return False
+
+    def _apply_settings(self, response):
+        with self._lock:
+            self._motion_threshold = response.get('motion_threshold', self._motion_threshold)
+            self._roi_motion_threshold = response.get('roi_motion_threshold', self._roi_motion_threshold)
+            self._recording_extension = response.get('recording_extension', self._recording_extension)
+            self._max_recording_duration = response.get('max_recording_duration', self._max_recording_duration)
+            self._detection_engine = response.get('detection_engine', self._detection_engine)
+            camera_settings = response.get('cameras') or {}
+            if not isinstance(camera_settings, dict):
+                camera_settings = {}  # PHP serializes an empty map as a list
+
+            new_points = response.get('detection_area_points', self._detection_area_points)
+            new_zones = response.get('detection_zones', self._detection_zones) or []
+            new_points_hash = (self._hash_points(new_points), self._hash_zones(new_zones), tuple(
+                (camera_id, self._hash_points(values.get('detection_area_points', [])), self._hash_zones(values.get('detection_zones', [])))
+                for camera_id, values in sorted(camera_settings.items())
+            ))
+            self._camera_settings = camera_settings
+
+            if new_points_hash != self._last_points_hash:
+                self._detection_area_points = new_points
+                self._detection_zones = new_zones
+                self._last_points_hash = new_points_hash
+                self._notify_roi_change()
+                print("Detection area points changed, updating ROI mask")
+
+    def _load_cache(self):
+        """Start from the last settings the API sent, so a boot without network keeps the right ROI"""
+        try:
+            with open(Config.SETTINGS_CACHE_FILE) as cache_file:
+                cache = json.load(cache_file)
+            self._apply_settings(cache['settings'])
+            self._etag = cache.get('etag')
+            print(f"Loaded cached settings from {cache.get('saved_at')}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Ignoring unreadable settings cache: {str(e)}")
+
+    def _save_cache(self, response, etag):
+        """Write the settings atomically, a crash mid-write keeps the previous cache"""
+        try:
+            temp_path = Config.SETTINGS_CACHE_FILE + '.tmp'
+            with open(temp_path, 'w') as cache_file:
+                json.dump({'etag': etag, 'saved_at': datetime.now().isoformat(), 'settings': response}, cache_file)
+            os.replace(temp_path, Config.SETTINGS_CACHE_FILE)
+        except OSError as e:
+            print(f"Could not write settings cache: {str(e)}")
+
+    def for_camera(self, camera_id) -> 'CameraSettings':
+        """Settings as seen by one camera, see CameraSettings"""
+        return CameraSettings(self, camera_id)
+
+    def get(self, name: str, camera_id=None):
+        """Value of a setting for a camera, falling back to the shared value"""
+        with self._lock:
+            camera_settings = self._camera_settings.get(camera_id) or {}
+            if name in camera_settings:
+                return camera_settings[name]
+            value = getattr(self, f"_{name}")
+            return value.copy() if isinstance(value, list) else value
+
+    @property
+    def sync_age(self) -> float:
+        """Seconds since settings were last fetched, or since startup if they never were"""
+        with self._lock:
+            return time.time() - (self._last_sync_time or self._started_at)
 
     @property
     def motion_threshold(self) -> int:
@@ -80,6 +173,17 @@ class SettingsManager:
         with self._lock:
             return self._roi_motion_threshold
 
+    @property
+    def motion_threshold_fraction(self) -> float:
+        """Motion threshold as a fraction of the frame area, independent of resolution"""
+        with self._lock:
+            return self._motion_threshold / self._reference_area
+
+    @property
+    def roi_motion_threshold_fraction(self) -> float:
+        with self._lock:
+            return self._roi_motion_threshold / self._reference_area
+
     @property
     def recording_extension(self) -> int:
         with self._lock:
@@ -90,7 +194,74 @@ class SettingsManager:
         with self._lock:
             return self._max_recording_duration
 
+    @property
+    def detection_engine(self) -> str:
+        with self._lock:
+            return self._detection_engine
+
     @property
     def detection_area_points(self) -> List[Dict[str, float]]:
         with self._lock:
             return self._detection_area_points.copy()  # Return a copy to prevent external modification
+
+    @property
+    def detection_zones(self) -> List[Dict]:
+        """Named include/exclude zones with optional per-zone thresholds, see detection_zones.py"""
+        with self._lock:
+            return self._detection_zones.copy()
+
+class CameraSettings:
+    """One camera's view of the settings.
+
+    The API returns per-camera values under 'cameras', keyed by the ids in
+    Config.CAMERAS and edited on the settings page. Those win over the shared
+    values, so each camera can have its own ROI, thresholds and engine while
+    sharing a single settings sync.
+    """
+    def __init__(self, settings_manager: SettingsManager, camera_id):
+        self._settings_manager = settings_manager
+        self.camera_id = camera_id
+        self._reference_area = Config.THRESHOLD_REFERENCE_SIZE[0] * Config.THRESHOLD_REFERENCE_SIZE[1]
+
+    def add_observer(self, callback):
+        self._settings_manager.add_observer(callback)
+
+    @property
+    def sync_age(self) -> float:
+        return self._settings_manager.sync_age
+
+    @property
+    def motion_threshold(self) -> int:
+        return self._settings_manager.get('motion_threshold', self.camera_id)
+
+    @property
+    def roi_motion_threshold(self) -> int:
+        return self._settings_manager.get('roi_motion_threshold', self.camera_id)
+
+    @property
+    def motion_threshold_fraction(self) -> float:
+        return self.motion_threshold / self._reference_area
+
+    @property
+    def roi_motion_threshold_fraction(self) -> float:
+        return self.roi_motion_threshold / self._reference_area
+
+    @property
+    def recording_extension(self) -> int:
+        return self._settings_manager.get('recording_extension', self.camera_id)
+
+    @property
+    def max_recording_duration(self) -> int:
+        return self._settings_manager.get('max_recording_duration', self.camera_id)
+
+    @property
+    def detection_engine(self) -> str:
+        return self._settings_manager.get('detection_engine', self.camera_id)
+
+    @property
+    def detection_area_points(self) -> List[Dict[str, float]]:
+        return self._settings_manager.get('detection_area_points', self.camera_id)
+
+    @property
+    def detection_zones(self) -> List[Dict]:
+        return self._settings_manager.get('detection_zones', self.camera_id)
@@ -0,0 +1,32 @@
+from config import Config
+
+class StreamProfile:
+    """What a viewer asked for with ?width=&quality=&fps=, leaving them out serves the frames as captured"""
+    def __init__(self, width=None, quality=None, max_fps=None):
+        self.width = width
+        self.quality = quality
+        self.max_fps = max_fps
+
+    @classmethod
+    def from_args(cls, args):
+        """Build a profile from request query arguments, ignoring values that are not numbers"""
+        width = cls._number(args.get('width'), int)
+        quality = cls._number(args.get('quality'), int)
+        max_fps = cls._number(args.get('fps'), float)
+        return cls(
+            width=max(width, Config.STREAM_MIN_WIDTH) if width else None,
+            quality=min(max(quality, 10), 100) if quality else None,
+            max_fps=max_fps if max_fps and max_fps > 0 else None
+        )
+
+    @staticmethod
+    def _number(value, kind):
+        try:
+            return kind(value) if value is not None else None
+        except ValueError:
+            return None
+
+    @property
+    def interval(self):
+        """Minimum seconds between two frames for this viewer, 0 for no limit"""
+        return 1 / self.max_fps if self.max_fps else 0
@@ -0,0 +1,199 @@
+"""Feed RecordingStateMachine synthetic motion scores and check when it starts and stops.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from recording_state import HOLDING, IDLE, RECORDING, START, STOP, RecordingStateMachine
+
+FRAME_INTERVAL = 0.1
+THRESHOLD = 0.01  # motion_threshold_fraction
+MOTION = 0.05
+QUIET = 0.0
+
+class RecordingStateMachineTest(unittest.TestCase):
+    def setUp(self):
+        # Pin the tuning the scenarios are written against, whatever config.py ships with
+        patcher = mock.patch.multiple(
+            Config,
+            RECORDING_CONFIRM_FRAMES=2,
+            RECORDING_CONFIRM_WINDOW=3,
+            RECORDING_OFF_RATIO=0.5,
+            RECORDING_SCORE_ALPHA=0.3,
+            RECORDING_MIN_SECONDS=0,
+            RECORDING_MERGE_GAP=0,
+            PRE_ROLL_SECONDS=3,
+            SEGMENT_SECONDS=0
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.settings_manager = SimpleNamespace(
+            motion_threshold_fraction=THRESHOLD,
+            recording_extension=2,
+            max_recording_duration=60
+        )
+        self.timestamp = 0
+
+    def create_machine(self, **config):
+        for name, value in config.items():
+            patcher = mock.patch.object(Config, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return RecordingStateMachine(self.settings_manager)
+
+    def feed(self, machine, scores):
+        """Feed one score per frame, return [(timestamp, action)] for the frames that returned one"""
+        actions = []
+        for score in scores:
+            self.timestamp = round(self.timestamp + FRAME_INTERVAL, 3)
+            action = machine.update(self.timestamp, score)
+            if action:
+                actions.append((self.timestamp, action))
+        return actions
+
+    def test_single_spike_is_a_false_start(self):
+        machine = self.create_machine()
+        self.assertEqual(self.feed(machine, [QUIET, MOTION]), [])
+        self.assertTrue(machine.detected)
+        self.assertFalse(machine.recording)
+
+        self.assertEqual(self.feed(machine, [QUIET] * 5), [])
+        self.assertFalse(machine.detected)
+        self.assertEqual(machine.phase, IDLE)
+        self.assertEqual(machine.false_starts, 1)
+
+    def test_spikes_further_apart_than_the_window_do_not_start(self):
+        machine = self.create_machine()
+        self.assertEqual(self.feed(machine, [MOTION, QUIET, QUIET, MOTION, QUIET, QUIET, QUIET]), [])
+        self.assertFalse(machine.recording)
+
+    def test_two_of_three_frames_confirm(self):
+        machine = self.create_machine()
+        self.assertEqual(self.feed(machine, [MOTION, QUIET, MOTION]), [(0.3, START)])
+        self.assertEqual(machine.phase, RECORDING)
+        self.assertEqual(machine.started_at, 0.3)
+        self.assertEqual(machine.false_starts, 0)
+
+    def test_one_frame_confirms_when_configured(self):
+        machine = self.create_machine(RECORDING_CONFIRM_FRAMES=1)
+        self.assertEqual(self.feed(machine, [QUIET, MOTION]), [(0.2, START)])
+
+    def test_stops_after_the_extension_and_the_hold(self):
+        machine = self.create_machine(RECORDING_MERGE_GAP=1)
+        self.feed(machine, [MOTION, MOTION])
+        last_motion = self.timestamp
+
+        actions = self.feed(machine, [QUIET] * 30)
+        self.assertEqual(machine.phase, HOLDING)
+        self.assertEqual(actions, [])
+
+        actions = self.feed(machine, [QUIET] * 20)
+        self.assertEqual(len(actions), 1)
+        stopped_at, action = actions[0]
+        self.assertEqual(action, STOP)
+        self.assertEqual(machine.stop_reason, 'quiet')
+        # The smoothed score keeps motion going for a few frames after the last one above the threshold
+        quiet_for = stopped_at - last_motion
+        self.assertGreaterEqual(quiet_for, self.settings_manager.recording_extension + Config.RECORDING_MERGE_GAP)
+        self.assertLess(quiet_for, self.settings_manager.recording_extension + Config.RECORDING_MERGE_GAP + 1)
+        self.assertFalse(machine.recording)
+
+    def test_stops_right_away_without_a_merge_gap(self):
+        machine = self.create_machine()
+        self.feed(machine, [MOTION, MOTION])
+        last_motion = self.timestamp
+
+        actions = self.feed(machine, [QUIET] * 40)
+        self.assertEqual([action for _, action in actions], [STOP])
+        self.assertLess(actions[0][0] - last_motion, self.settings_manager.recording_extension + 1)
+
+        # The next event is a clip of its own
+        self.assertEqual([action for _, action in self.feed(machine, [MOTION, MOTION])], [START])
+        self.assertEqual(machine.merged_events, 0)
+
+    def test_events_within_the_merge_gap_share_a_clip(self):
+        machine = self.create_machine(RECORDING_MERGE_GAP=3)
+        self.assertEqual([action for _, action in self.feed(machine, [MOTION, MOTION])], [START])
+        self.feed(machine, [QUIET] * 30)
+        self.assertEqual(machine.phase, HOLDING)
+
+        # A second confirmed event while holding continues the clip instead of starting one
+        self.assertEqual(self.feed(machine, [MOTION, MOTION]), [])
+        self.assertEqual(machine.phase, RECORDING)
+        self.assertEqual(machine.merged_events, 1)
+
+        actions = self.feed(machine, [QUIET] * 80)
+        self.assertEqual([action for _, action in actions], [STOP])
+
+    def test_unconfirmed_motion_while_holding_does_not_merge(self):
+        machine = self.create_machine(RECORDING_MERGE_GAP=3)
+        self.feed(machine, [MOTION, MOTION])
+        self.feed(machine, [QUIET] * 30)
+        self.assertEqual(machine.phase, HOLDING)
+
+        self.assertEqual(self.feed(machine, [MOTION, QUIET, QUIET, QUIET]), [])
+        self.assertEqual(machine.phase, HOLDING)
+        self.assertEqual(machine.merged_events, 0)
+
+    def test_short_events_last_the_minimum_length(self):
+        machine = self.create_machine(RECORDING_MIN_SECONDS=5)
+        self.feed(machine, [MOTION, MOTION])
+        started_at = machine.started_at
+
+        actions = self.feed(machine, [QUIET] * 60)
+        self.assertEqual([action for _, action in actions], [STOP])
+        self.assertGreaterEqual(actions[0][0] - started_at, 5)
+
+    def test_stops_at_the_maximum_duration(self):
+        self.settings_manager.max_recording_duration = 2
+        machine = self.create_machine()
+        actions = self.feed(machine, [MOTION] * 22)
+        self.assertEqual(actions, [(0.2, START), (2.2, STOP)])
+        self.assertEqual(machine.stop_reason, 'max_duration')
+
+        # Motion that goes on starts the next clip
+        self.assertEqual([action for _, action in self.feed(machine, [MOTION])], [START])
+
+    def false_start(self, machine):
+        self.feed(machine, [MOTION] + [QUIET] * 5)
+
+    def merged_event(self, machine):
+        self.feed(machine, [MOTION, MOTION] + [QUIET] * 30)
+        self.assertEqual(machine.phase, HOLDING)
+        self.feed(machine, [MOTION, MOTION])
+
+    def test_unsegmented_clips_avoid_one_upload_per_false_start_and_merge(self):
+        machine = self.create_machine(RECORDING_MERGE_GAP=3)
+        self.false_start(machine)
+        self.assertEqual(machine.uploads_avoided, 1)
+        self.merged_event(machine)
+        self.assertEqual(machine.merged_events, 1)
+        self.assertEqual(machine.get_stats()['recording_uploads_avoided'], 2)
+
+    def test_segmented_false_starts_avoid_the_segments_of_a_clip(self):
+        # 3 s of pre-roll and 2 s of extension fill one 5 s segment
+        machine = self.create_machine(SEGMENT_SECONDS=5)
+        self.false_start(machine)
+        self.assertEqual(machine.uploads_avoided, 1)
+
+        # 3 s of pre-roll and 8 s of extension would have been three segments
+        self.settings_manager.recording_extension = 8
+        self.false_start(machine)
+        self.assertEqual(machine.false_starts, 2)
+        self.assertEqual(machine.uploads_avoided, 4)
+
+    def test_segmented_merges_are_not_counted_as_avoided_uploads(self):
+        machine = self.create_machine(SEGMENT_SECONDS=5, RECORDING_MERGE_GAP=3)
+        self.merged_event(machine)
+        self.assertEqual(machine.merged_events, 1)
+        self.assertEqual(machine.uploads_avoided, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,212 @@
+"""Drive VideoHandler with a synthetic H.264 stream and check where clips and segments are cut.
+
+    python -m pytest tests
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+import unittest
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import picamera2.outputs  # noqa: F401
+except ImportError:
+    # Model of picamera2 0.3.38 as far as VideoHandler uses it. Setting fileoutput arms
+    # _firstframe, which drops frames until the next key frame, like the real FileOutput.
+    class Output:
+        def __init__(self, pts=None):
+            self.recording = False
+
+        def start(self):
+            self.recording = True
+
+        def stop(self):
+            self.recording = False
+
+    class FileOutput(Output):
+        def __init__(self, file=None, pts=None, split=None):
+            super().__init__(pts=pts)
+            self.fileoutput = file
+
+        @property
+        def fileoutput(self):
+            return self._fileoutput
+
+        @fileoutput.setter
+        def fileoutput(self, file):
+            self._firstframe = True
+            self._needs_close = isinstance(file, str)
+            self._fileoutput = open(file, 'wb') if self._needs_close else file
+
+        def outputframe(self, frame, keyframe=True, timestamp=None, packet=None, audio=False):
+            if self._fileoutput is not None and self.recording:
+                if self._firstframe:
+                    if not keyframe:
+                        return
+                    self._firstframe = False
+                self._fileoutput.write(frame)
+                self._fileoutput.flush()
+
+        def stop(self):
+            super().stop()
+            self.close()
+
+        def close(self):
+            if self._needs_close:
+                self._fileoutput.close()
+
+    class H264Encoder:
+        def __init__(self, bitrate=None, repeat=False, iperiod=None):
+            self.iperiod = iperiod
+
+    sys.modules['picamera2'] = types.ModuleType('picamera2')
+    sys.modules['picamera2.outputs'] = types.SimpleNamespace(Output=Output, FileOutput=FileOutput)
+    sys.modules['picamera2.encoders'] = types.SimpleNamespace(H264Encoder=H264Encoder)
+
+from config import Config
+from video_handler import VideoHandler
+
+FPS = 10  # One key frame per second, as VideoHandler asks the encoder for
+CELLS = np.zeros((2, 2))
+
+class FakePicamera2:
+    """Starts and stops outputs the way picamera2 encoders do"""
+    def __init__(self):
+        self.output = None
+
+    def start_encoder(self, encoder, output):
+        self.output = output
+        output.start()
+
+    def stop_encoder(self):
+        self.output.stop()
+
+class FakeUploadQueue:
+    def __init__(self):
+        self.entries = []
+
+    def enqueue(self, file_path, **kwargs):
+        self.entries.append(dict(kwargs, file=file_path))
+
+class VideoHandlerTest(unittest.TestCase):
+    def setUp(self):
+        self.spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spool_dir)
+        patcher = mock.patch.multiple(
+            Config,
+            UPLOAD_SPOOL_DIR=self.spool_dir,
+            PRE_ROLL_SECONDS=2,
+            SEGMENT_SECONDS=3,
+            MOTION_METADATA=True,
+            CAMERA_VFLIP=False
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.picam2 = FakePicamera2()
+        self.upload_queue = FakeUploadQueue()
+        self.handler = VideoHandler(self.picam2, self.upload_queue, 'cam0')
+        self.frame = 0
+
+    def feed(self, count):
+        """Encode count frames, every frame is its number and I for key frames or P"""
+        for _ in range(count):
+            keyframe = self.frame % FPS == 0
+            if self.picam2.output:
+                self.picam2.output.outputframe(b'%05d%s;' % (self.frame, b'I' if keyframe else b'P'), keyframe, self.frame * 1000000 // FPS)
+            if self.handler.current_recording:
+                self.handler.record_motion(self.frame / FPS, 0.1, 0.0, None, CELLS)
+            self.frame += 1
+
+    def recorded(self):
+        """Frame lists of the queued files in upload order"""
+        self.handler.wait_for_journal()
+        files = []
+        for entry in self.upload_queue.entries:
+            with open(entry['file'], 'rb') as clip:
+                files.append([frame.decode() for frame in clip.read().split(b';')[:-1]])
+        return files
+
+    def pre_rolls(self):
+        pre_rolls = []
+        for entry in self.upload_queue.entries:
+            with open(entry['metadata_file']) as sidecar:
+                pre_rolls.append(json.load(sidecar)['pre_roll'])
+        return pre_rolls
+
+    def test_segments_are_cut_where_the_key_frame_leaves_the_ring(self):
+        self.handler.start_buffering(FPS)
+        self.feed(35)
+        self.handler.start_recording()
+        self.feed(85)
+        self.handler.stop_recording()
+
+        files = self.recorded()
+        # The clip starts at the oldest key frame in the 20 frame ring and the segments lose nothing in between
+        self.assertEqual(sum(files, []), ['%05d%s' % (frame, 'I' if frame % FPS == 0 else 'P') for frame in range(20, 120)])
+        self.assertEqual([len(frames) for frames in files], [30, 30, 40])
+        for frames in files:
+            self.assertTrue(frames[0].endswith('I'))
+
+        segments = [entry['segment'] for entry in self.upload_queue.entries]
+        self.assertEqual([segment['index'] for segment in segments], [0, 1, 2])
+        self.assertEqual([segment['final'] for segment in segments], [False, False, True])
+        self.assertEqual(len({segment['event_id'] for segment in segments}), 1)
+
+        # Frame 20 was written when frame 35 came in, the ring stays 1.5 s behind from then on
+        self.assertEqual(self.pre_rolls(), [1.5, 1.5, 1.5])
+
+    def test_without_pre_roll_frames_go_straight_to_the_file(self):
+        with mock.patch.object(Config, 'PRE_ROLL_SECONDS', 0):
+            self.assertFalse(self.handler.start_buffering(FPS))
+        self.frame = 5
+        self.handler.start_recording()
+        self.feed(45)
+        self.handler.stop_recording()
+
+        files = self.recorded()
+        self.assertEqual([(frames[0], frames[-1]) for frames in files], [('00010I', '00039P'), ('00040I', '00049P')])
+        self.assertEqual(self.pre_rolls(), [0, 0])
+
+    def test_unsegmented_clip_is_one_file(self):
+        with mock.patch.object(Config, 'SEGMENT_SECONDS', 0):
+            self.handler.start_buffering(FPS)
+            self.feed(25)
+            self.handler.start_recording()
+            self.feed(60)
+            self.handler.stop_recording()
+
+        files = self.recorded()
+        self.assertEqual(len(files), 1)
+        self.assertEqual((files[0][0], files[0][-1]), ('00010I', '00084P'))
+        self.assertIsNone(self.upload_queue.entries[0]['segment'])
+        self.assertEqual(self.pre_rolls(), [1.5])
+
+    def test_cuts_do_not_wait_for_the_journal(self):
+        released = threading.Event()
+        enqueue = self.upload_queue.enqueue
+        self.upload_queue.enqueue = lambda *args, **kwargs: released.wait(5) and enqueue(*args, **kwargs)
+
+        self.handler.start_buffering(FPS)
+        self.feed(35)
+        self.handler.start_recording()
+        started = time.monotonic()
+        self.feed(85)
+        # Both cuts happened while the journal was stuck on the first segment
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(self.handler.segment_index, 2)
+
+        released.set()
+        self.handler.stop_recording()
+        self.assertEqual(len(self.recorded()), 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,187 @@
+import heapq
+import json
+import os
+import random
+import threading
+import time
+from api_client import APIClient
+from config import Config
+import metrics
+import motion_timeline
+from mp4_muxer import mux_h264
+
+class UploadQueue:
+    """Persistent upload queue, every clip has a journal entry in the spool directory until it is uploaded"""
+    JOURNAL_SUFFIX = '.json'
+
+    def __init__(self, api_client, spool_dir=Config.UPLOAD_SPOOL_DIR, workers=Config.UPLOAD_WORKERS):
+        self._api_client = api_client
+        self.spool_dir = spool_dir
+        self._condition = threading.Condition()
+        self._pending = []  # Heap of (next_attempt, sequence, entry)
+        self._sequence = 0  # Tie breaker so the heap never compares entries
+        self._in_flight = 0
+
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._rescan()
+
+        self._workers = [
+            threading.Thread(target=self._worker_loop, daemon=True)
+            for _ in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def _journal_path(self, file_path):
+        return file_path + self.JOURNAL_SUFFIX
+
+    def _write_journal(self, entry):
+        """Atomically persist an entry next to its clip so a crash never leaves half a journal"""
+        journal_path = self._journal_path(entry['file'])
+        temp_path = journal_path + '.tmp'
+        with open(temp_path, 'w') as journal_file:
+            json.dump(entry, journal_file)
+        os.replace(temp_path, journal_path)
+
+    def _remove_journal(self, entry):
+        try:
+            os.remove(self._journal_path(entry['file']))
+        except FileNotFoundError:
+            pass
+
+    def _rescan(self):
+        """Queue every clip left in the spool by a previous run, with or without a journal"""
+        journaled = set()
+        for name in sorted(os.listdir(self.spool_dir)):
+            if not name.endswith(self.JOURNAL_SUFFIX) or name.endswith(motion_timeline.SUFFIX):
+                continue
+            try:
+                with open(os.path.join(self.spool_dir, name)) as journal_file:
+                    entry = json.load(journal_file)
+            except (OSError, ValueError) as e:
+                print(f"Skipping unreadable upload journal {name}: {str(e)}")
+                continue
+
+            journaled.add(os.path.basename(entry['file']))
+            if os.path.exists(entry['file']):
+                entry['next_attempt'] = 0  # Retry straight away after a restart
+                self._push(entry)
+            else:
+                self._remove_journal(entry)
+
+        for name in sorted(os.listdir(self.spool_dir)):
+            if name in journaled or name.endswith((self.JOURNAL_SUFFIX, '.tmp', APIClient.UPLOAD_STATE_SUFFIX)):
+                continue
+            # The process died between closing the clip and writing its journal
+            file_path = os.path.join(self.spool_dir, name)
+            metadata_file = file_path + motion_timeline.SUFFIX
+            self.enqueue(file_path, metadata_file=metadata_file if os.path.exists(metadata_file) else None)
+
+        if self._pending:
+            print(f"Recovered {len(self._pending)} pending upload(s) from {self.spool_dir}")
+
+    def _push(self, entry):
+        with self._condition:
+            heapq.heappush(self._pending, (entry['next_attempt'], self._sequence, entry))
+            self._sequence += 1
+            self._condition.notify()
+
+    def enqueue(self, file_path, roi_triggered=False, timestamp=None, metadata_file=None, fps=None,
+                playable=False, flipped_vertical=False, segment=None):
+        """Journal a finished clip, and its motion sidecar if any, and hand it to the worker pool.
+
+        Raw H.264 clips with a known fps are wrapped in MP4 before their first upload.
+        playable marks clips that are H.264 in MP4 already, flipped_vertical clips that
+        were flipped on the device. segment ties a segment to its event, see APIClient.upload_video.
+        """
+        entry = {
+            'file': file_path,
+            'roi_triggered': roi_triggered,
+            'timestamp': timestamp,
+            'metadata_file': metadata_file,
+            'fps': fps,
+            'playable': playable,
+            'flipped_vertical': flipped_vertical,
+            'segment': segment,
+            'attempts': 0,
+            'next_attempt': 0
+        }
+        self._write_journal(entry)
+        self._push(entry)
+
+    @property
+    def pending_count(self):
+        """Clips waiting for or currently being uploaded"""
+        with self._condition:
+            return len(self._pending) + self._in_flight
+
+    def _next_entry(self):
+        """Block until the earliest entry is due and take it off the heap"""
+        with self._condition:
+            while True:
+                if self._pending:
+                    wait_time = self._pending[0][0] - time.time()
+                    if wait_time <= 0:
+                        self._in_flight += 1
+                        return heapq.heappop(self._pending)[2]
+                    self._condition.wait(wait_time)
+                else:
+                    self._condition.wait()
+
+    def _worker_loop(self):
+        while True:
+            entry = self._next_entry()
+            try:
+                self._process(entry)
+            except Exception as e:
+                print(f"Error in upload worker: {str(e)}")
+            finally:
+                with self._condition:
+                    self._in_flight -= 1
+
+    def _process(self, entry):
+        if not os.path.exists(entry['file']):
+            print(f"Dropping upload of missing file {entry['file']}")
+            if entry.get('metadata_file') and os.path.exists(entry['metadata_file']):
+                os.remove(entry['metadata_file'])
+            self._remove_journal(entry)
+            return
+
+        if Config.MUX_MP4 and entry.get('fps') and entry['file'].endswith('.h264'):
+            self._mux(entry)
+
+        start = time.time()
+        if self._api_client.upload_video(entry['file'], roi_triggered=entry['roi_triggered'], timestamp=entry['timestamp'],
+                                         metadata_file=entry.get('metadata_file'), playable=entry.get('playable', False),
+                                         flipped_vertical=entry.get('flipped_vertical', False), segment=entry.get('segment')):
+            metrics.UPLOAD_SECONDS.observe(time.time() - start)
+            self._remove_journal(entry)
+            return
+
+        metrics.UPLOAD_FAILURES.inc()
+
+        # Exponential backoff with jitter so a fleet of devices does not retry in lockstep
+        entry['attempts'] += 1
+        delay = min(Config.UPLOAD_BACKOFF_BASE * 2 ** (entry['attempts'] - 1), Config.UPLOAD_BACKOFF_MAX)
+        entry['next_attempt'] = time.time() + delay * random.uniform(0.8, 1.2)
+        self._write_journal(entry)
+        print(f"Upload of {entry['file']} failed {entry['attempts']} time(s), retrying in {delay:.0f}s")
+        self._push(entry)
+
+    def _mux(self, entry):
+        """Replace a raw H.264 clip by its MP4, the clip goes up as it is when muxing fails"""
+        start = time.time()
+        mp4_file = mux_h264(entry['file'], entry['fps'])
+        if not mp4_file:
+            metrics.MUX_FAILURES.inc()
+            entry['fps'] = None  # Do not retry on every upload attempt
+            self._write_journal(entry)
+            return
+        metrics.MUX_SECONDS.observe(time.time() - start)
+
+        # Journal the MP4 before dropping the H.264 so a crash in between never loses the clip
+        h264_entry = dict(entry)
+        entry.update({'file': mp4_file, 'fps': None, 'playable': True})
+        self._write_journal(entry)
+        os.remove(h264_entry['file'])
+        self._remove_journal(h264_entry)
@@ -1,16 +1,107 @@
 from picamera2.encoders import H264Encoder
 from picamera2.outputs import FileOutput
+from collections import deque
 from datetime import datetime
+import os
+import queue
 import threading
-from api_client import APIClient
+import uuid
+from config import Config
+from motion_timeline import MotionTimeline
+
+class SegmentedOutput(FileOutput):
+    """picamera2 file output behind a ring of the last buffersize frames, which can move on to a new file at a key frame.
+
+    The ring works like picamera2's CircularOutput: until it is started with a file it keeps
+    the newest frames, start() drops them up to the oldest key frame, and from then on every
+    new frame pushes the oldest one out to the file. stop() writes what is left and closes
+    the file. With buffersize 0 every frame goes straight to the file. The encoder starts
+    its outputs too, that alone only fills the ring.
+
+    on_keyframe(output, position, delay) runs on the encoder thread right before a key frame
+    leaves the ring, position is its timestamp and delay how far it is behind the newest
+    frame, both in seconds. A file assigned to output.fileoutput there starts with that key
+    frame. The encoder repeats the stream headers with every key frame, so every segment
+    decodes on its own and the segments played back to back are the whole clip.
+    """
+    on_keyframe = None
+
+    def __init__(self, file=None, buffersize=0):
+        super().__init__(file)
+        self.buffersize = buffersize
+        self._ring = deque()  # (frame, keyframe, timestamp) not written yet
+        self._ring_lock = threading.Lock()
+
+    def outputframe(self, frame, keyframe=True, timestamp=None, *args, **kwargs):
+        with self._ring_lock:
+            self._ring.append((frame, keyframe, timestamp))
+            if not self.recording or self.fileoutput is None:
+                while len(self._ring) > self.buffersize:
+                    self._ring.popleft()
+                return
+
+            newest = timestamp
+            frame, keyframe, timestamp = self._ring.popleft()
+            if keyframe and self.on_keyframe:
+                self.on_keyframe(self, timestamp / 1e6, (newest - timestamp) / 1e6)
+            super().outputframe(frame, keyframe, timestamp)
+
+    def start(self):
+        """Start writing to the file, from the oldest key frame in the ring"""
+        with self._ring_lock:
+            while self._ring and not self._ring[0][1]:
+                self._ring.popleft()
+            super().start()
+
+    def stop(self):
+        """Write the frames left in the ring and close the file, the ring fills up again for the next clip"""
+        with self._ring_lock:
+            if self.recording:
+                while self._ring:
+                    super().outputframe(*self._ring.popleft())
+            super().stop()
 
 class VideoHandler:
-    def __init__(self, picam2):
+    def __init__(self, picam2, upload_queue, camera_id=None):
         self.picam2 = picam2
-        self.api_client = APIClient()
+        self.upload_queue = upload_queue
+        self.camera_id = camera_id
         self.current_recording = None
+        self.recording_timestamp = None
         self.encoder = None
+        self.circular_output = None
         self.roi_triggered = False
+        self.timeline = None
+        self.fps = None  # Encoder frame rate, gives the raw H.264 its timestamps when it is muxed
+        self.event_id = None  # Ties the segments of one event together, None when clips are not segmented
+        self.segment_index = 0
+        self._output = None
+        self._segment_started = None  # Position of the key frame the file being written starts with
+        self._lock = threading.Lock()  # Guards the clip state between the encoder, detection and stop paths
+
+        # Closed clips and segments, journaled in order off the encoder thread
+        self._closed = queue.Queue()
+        threading.Thread(target=self._journal_loop, daemon=True).start()
+
+    def start_buffering(self, fps):
+        """Keep an encoder running into an in-memory ring buffer so clips include the pre-roll"""
+        self.fps = fps
+        if Config.PRE_ROLL_SECONDS <= 0:
+            return False
+
+        try:
+            # Repeat the stream headers and key frame every second so any point in the buffer can start a clip
+            self.encoder = H264Encoder(repeat=True, iperiod=fps)
+            self.circular_output = SegmentedOutput(buffersize=int(fps * Config.PRE_ROLL_SECONDS))
+            self.circular_output.on_keyframe = self._on_keyframe
+            self.picam2.start_encoder(self.encoder, self.circular_output)
+            print(f"Buffering {Config.PRE_ROLL_SECONDS}s of pre-roll at {fps} fps")
+            return True
+        except Exception as e:
+            print(f"Error starting pre-roll buffer: {str(e)}")
+            self.encoder = None
+            self.circular_output = None
+            return False
 
     def start_recording(self, roi_triggered=False):
         """Start recording video with ROI status"""
@@ -18,44 +109,143 @@ class VideoHandler:
             if self.current_recording:
                 self.stop_recording()
 
-            self.roi_triggered = roi_triggered
-            timestamp = datetime.utcnow().strftime('%Y_%m_%dT%H_%M_%S')
-            output_file = f"motion_{timestamp}.h264"
+            started_at = datetime.utcnow()
+            with self._lock:
+                self.roi_triggered = roi_triggered
+                self.event_id = uuid.uuid4().hex if Config.SEGMENT_SECONDS > 0 else None
+                self.segment_index = 0
+                self._segment_started = None
+                output_file = self._output_file(started_at)
+                self.current_recording = output_file
+                self.recording_timestamp = started_at.isoformat()
+                # The pre-roll is filled in from the ring when the first frame is written
+                self.timeline = MotionTimeline(self.recording_timestamp) if Config.MOTION_METADATA else None
+                if self.circular_output:
+                    self._output = self.circular_output
+                    self._output.fileoutput = output_file
+                else:
+                    # Key frames every second so the segments can be cut close to SEGMENT_SECONDS
+                    self.encoder = H264Encoder(repeat=True, iperiod=self.fps or 30)
+                    self._output = SegmentedOutput(output_file)
+                    self._output.on_keyframe = self._on_keyframe
+
+            if self.circular_output:
+                # Write the buffered pre-roll into the file and keep appending to it
+                self.circular_output.start()
+            else:
+                self.picam2.start_encoder(self.encoder, self._output)
 
-            self.encoder = H264Encoder()
-            self.picam2.start_encoder(
-                self.encoder,
-                FileOutput(output_file)
-            )
-            self.current_recording = output_file
             print(f"Started recording: {output_file} (ROI triggered: {roi_triggered})")
             return True
         except Exception as e:
             print(f"Error starting recording: {str(e)}")
+            with self._lock:
+                self.current_recording = None
             return False
 
     def stop_recording(self):
         """Stop recording and upload video"""
-        if self.current_recording:
-            try:
+        with self._lock:
+            if not self.current_recording:
+                return
+            # A cut that got the lock first has queued its segment already, after this none can start
+            closed = self._closed_clip(final=True)
+            self.current_recording = None
+            self.recording_timestamp = None
+            self.timeline = None
+
+        try:
+            # Without the lock, the encoder thread may be waiting for it in _on_keyframe
+            if self.circular_output:
+                # Close the file but leave the encoder filling the ring buffer
+                self.circular_output.stop()
+            else:
                 self.picam2.stop_encoder()
-                output_file = self.current_recording
-                roi_triggered = self.roi_triggered
-                self.current_recording = None
-                self.roi_triggered = False
-
-                # Upload in separate thread
-                threading.Thread(
-                    target=self._upload_video_file,
-                    args=(output_file, roi_triggered),
-                    daemon=True
-                ).start()
+            self._closed.put(closed)
+        except Exception as e:
+            print(f"Error stopping recording: {str(e)}")
+        finally:
+            self.roi_triggered = False
+
+    def wait_for_journal(self):
+        """Block until every closed clip and segment is in the upload queue"""
+        self._closed.join()
+
+    def _output_file(self, started_at):
+        prefix = f"motion_{self.camera_id}_" if self.camera_id else "motion_"
+        timestamp = started_at.strftime('%Y_%m_%dT%H_%M_%S')
+        suffix = f"_{self.segment_index:03d}" if self.event_id else ''
+        return os.path.join(Config.UPLOAD_SPOOL_DIR, f"{prefix}{timestamp}{suffix}.h264")
+
+    def _closed_clip(self, final, file=None):
+        """Everything _enqueue needs about the file being written, taken while holding the lock"""
+        return {
+            'output_file': self.current_recording,
+            'timestamp': self.recording_timestamp,
+            'timeline': self.timeline,
+            'roi_triggered': self.roi_triggered,
+            'segment': {'event_id': self.event_id, 'index': self.segment_index, 'final': final} if self.event_id else None,
+            'file': file
+        }
+
+    def _on_keyframe(self, output, position, delay):
+        """Runs on the encoder thread before a key frame leaves the ring, cuts a segment once SEGMENT_SECONDS were written"""
+        with self._lock:
+            if output is not self._output or not self.current_recording:
+                return
+            if self._segment_started is None:
+                # First frame of the clip, what is still in the ring is the pre-roll it really got
+                self._segment_started = position
+                if self.timeline:
+                    self.timeline.pre_roll = round(delay, 3)
+                return
+            if not self.event_id or position - self._segment_started < Config.SEGMENT_SECONDS:
+                return
+
+            # Only swap files here, closing and journaling the segment happens on the journal thread
+            closed = self._closed_clip(final=False, file=output.fileoutput)
+            started_at = datetime.utcnow()
+            self.segment_index += 1
+            self.current_recording = self._output_file(started_at)
+            self.recording_timestamp = started_at.isoformat()
+            # The key frame is delay seconds old, so the new segment starts that long before now
+            self.timeline = MotionTimeline(self.recording_timestamp, round(delay, 3)) if Config.MOTION_METADATA else None
+            output.fileoutput = self.current_recording
+            self._segment_started = position
+            self._closed.put(closed)
+
+    def _journal_loop(self):
+        while True:
+            closed = self._closed.get()
+            try:
+                if closed['file']:
+                    closed['file'].close()
+                    print(f"Queued segment {closed['segment']['index']} of {closed['output_file']}")
+                self._enqueue(closed)
             except Exception as e:
-                print(f"Error stopping recording: {str(e)}")
+                print(f"Error queueing {closed['output_file']} for upload: {str(e)}")
+            finally:
+                self._closed.task_done()
+
+    def _enqueue(self, closed):
+        """Journal a finished clip or segment so it survives restarts, the worker pool uploads it"""
+        metadata_file = self._save_timeline(closed['output_file'], closed['timeline'])
+        self.upload_queue.enqueue(closed['output_file'], roi_triggered=closed['roi_triggered'], timestamp=closed['timestamp'],
+                                  metadata_file=metadata_file, fps=self.fps, flipped_vertical=Config.CAMERA_VFLIP,
+                                  segment=closed['segment'])
+
+    def record_motion(self, timestamp, motion, roi, bbox, cells):
+        """Add a detection result to the timeline of the clip being recorded"""
+        with self._lock:
+            if self.timeline:
+                self.timeline.add(timestamp, motion, roi, bbox, cells)
 
-    def _upload_video_file(self, output_file, roi_triggered):
-        """Handle video upload with ROI status"""
+    def _save_timeline(self, output_file, timeline):
+        """Write the motion sidecar of a finished clip, a failure only costs the metadata"""
+        if not timeline or not timeline.samples:
+            return None
         try:
-            self.api_client.upload_video(output_file, roi_triggered=roi_triggered)
+            return timeline.save(output_file)
         except Exception as e:
-            print(f"Error uploading video file: {str(e)}")
\ No newline at end of file
+            print(f"Error saving motion timeline: {str(e)}")
+            return None
@@ -1,65 +1,146 @@
-from flask import Flask, Response, jsonify, render_template
-import threading
+from flask import Flask, Response, abort, jsonify, render_template, request
+import time
 from config import Config
+from stream_profile import StreamProfile
+import metrics
 
 class WebServer:
-    def __init__(self, camera_manager):
+    """Serves every camera under /cameras/<camera_id>/..., the plain routes serve the first camera"""
+    def __init__(self, cameras):
         self.app = Flask(__name__)
-        self.camera_manager = camera_manager
+        self.cameras = cameras  # camera id -> CameraManager, in Config.CAMERAS order
+        self.default_camera_id = next(iter(cameras))
         self.setup_routes()
 
+    def _camera(self, camera_id):
+        camera_manager = self.cameras.get(camera_id or self.default_camera_id)
+        if camera_manager is None:
+            abort(404)
+        return camera_manager
+
+    def _base_path(self, camera_id):
+        return f"/cameras/{camera_id}" if camera_id else ''
+
     def setup_routes(self):
-        @self.app.route('/')
-        def index():
-            return render_template('index.html')
+        @self.app.route('/', defaults={'camera_id': None})
+        @self.app.route('/cameras/<camera_id>/')
+        def index(camera_id):
+            self._camera(camera_id)
+            return render_template(
+                'index.html',
+                base_path=self._base_path(camera_id),
+                cameras=list(self.cameras),
+                camera_id=camera_id or self.default_camera_id
+            )
+
+        @self.app.route('/cameras')
+        def cameras():
+            return jsonify([
+                {'id': camera_id, 'stream_active': camera_manager.stream_active, 'stream_id': camera_manager.stream_id}
+                for camera_id, camera_manager in self.cameras.items()
+            ])
 
-        @self.app.route('/video_feed')
-        def video_feed():
+        @self.app.route('/video_feed', defaults={'camera_id': None})
+        @self.app.route('/cameras/<camera_id>/video_feed')
+        def video_feed(camera_id):
+            """MJPEG stream, ?width=, ?quality= and ?fps= pick a lighter profile for slow clients"""
             return Response(
-                self._generate_frames(),
+                self._generate_frames(self._camera(camera_id), StreamProfile.from_args(request.args)),
                 mimetype='multipart/x-mixed-replace; boundary=frame'
             )
 
-        @self.app.route('/single_frame')
-        def single_frame():
-            frame_data = self.camera_manager.get_latest_frame_without_removing()
+        @self.app.route('/single_frame', defaults={'camera_id': None})
+        @self.app.route('/cameras/<camera_id>/single_frame')
+        def single_frame(camera_id):
+            profile = StreamProfile.from_args(request.args)
+            frame_data = self._camera(camera_id).get_latest_frame(profile.width, profile.quality)
             if frame_data:
                 return Response(frame_data, mimetype='image/jpeg')
             return jsonify({'error': 'No frame available'}), 404
 
-        @self.app.route('/configure/<config_name>')
-        def configure(config_name):
+        @self.app.route('/configure/<config_name>', defaults={'camera_id': None})
+        @self.app.route('/cameras/<camera_id>/configure/<config_name>')
+        def configure(config_name, camera_id):
+            camera_manager = self._camera(camera_id)
             if config_name in Config.CAMERA_CONFIGS:
-                success = self.camera_manager.configure(config_name)
+                success = camera_manager.configure(config_name)
                 return jsonify({
                     'success': success,
-                    'stream_id': self.camera_manager.stream_id
+                    'stream_id': camera_manager.stream_id
                 })
             return jsonify({'success': False})
 
-        @self.app.route('/debug_frame')
-        def debug_frame():
+        @self.app.route('/debug_frame', defaults={'camera_id': None})
+        @self.app.route('/cameras/<camera_id>/debug_frame')
+        def debug_frame(camera_id):
             """Return a single frame with ROI visualization"""
-            frame_data = self.camera_manager.get_latest_frame_without_removing()
-            if frame_data:
-                debug_frame = self.camera_manager.motion_detector.get_debug_frame(frame_data)
+            debug_frame = self._camera(camera_id).get_debug_frame()
+            if debug_frame:
                 return Response(debug_frame, mimetype='image/jpeg')
             return jsonify({'error': 'No frame available'}), 404
 
-        @self.app.route('/debug_view')
-        def debug_view():
-            return render_template('debug_roi.html')
+        @self.app.route('/debug_feed', defaults={'camera_id': None})
+        @self.app.route('/cameras/<camera_id>/debug_feed')
+        def debug_feed(camera_id):
+            """MJPEG stream of debug frames, rendered once per frame for all viewers"""
+            return Response(
+                self._generate_debug_frames(self._camera(camera_id)),
+                mimetype='multipart/x-mixed-replace; boundary=frame'
+            )
 
-    def _generate_frames(self):
-        while self.camera_manager.stream_active:
-            frame_data = self.camera_manager.get_latest_frame()
-            if frame_data:
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame_data + b'\r\n')
+        @self.app.route('/detection_stats', defaults={'camera_id': None})
+        @self.app.route('/cameras/<camera_id>/detection_stats')
+        def detection_stats(camera_id):
+            """Return the per-frame cost of the active detection engine"""
+            return jsonify(self._camera(camera_id).motion_detector.get_stats())
+
+        @self.app.route('/metrics')
+        def metrics_endpoint():
+            """Prometheus text format, or JSON with ?format=json"""
+            if request.args.get('format') == 'json':
+                return jsonify(metrics.REGISTRY.to_dict())
+            return Response(metrics.REGISTRY.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+        @self.app.route('/debug_view', defaults={'camera_id': None})
+        @self.app.route('/cameras/<camera_id>/debug_view')
+        def debug_view(camera_id):
+            self._camera(camera_id)
+            return render_template('debug_roi.html', base_path=self._base_path(camera_id))
+
+    def _generate_frames(self, camera_manager, profile):
+        sequence = 0
+        camera_manager.add_viewer()
+        try:
+            while camera_manager.stream_active:
+                started = time.monotonic()
+                # Block until there is a newer frame instead of spinning, slow viewers skip to the latest
+                sequence, frame_data = camera_manager.wait_for_frame(sequence, width=profile.width, quality=profile.quality)
+                if frame_data:
+                    yield (b'--frame\r\n'
+                           b'Content-Type: image/jpeg\r\n\r\n' + frame_data + b'\r\n')
+                    if profile.interval:
+                        time.sleep(max(0, profile.interval - (time.monotonic() - started)))
+        finally:
+            camera_manager.remove_viewer()
+
+    def _generate_debug_frames(self, camera_manager):
+        sequence = 0
+        interval = 1 / Config.DEBUG_FEED_FPS
+        camera_manager.add_viewer()
+        try:
+            while camera_manager.stream_active:
+                started = time.monotonic()
+                sequence, frame_data = camera_manager.wait_for_debug_frame(sequence)
+                if frame_data:
+                    yield (b'--frame\r\n'
+                           b'Content-Type: image/jpeg\r\n\r\n' + frame_data + b'\r\n')
+                    time.sleep(max(0, interval - (time.monotonic() - started)))
+        finally:
+            camera_manager.remove_viewer()
 
     def run(self):
         self.app.run(
             host=Config.SERVER_HOST,
             port=Config.SERVER_PORT,
             threaded=True
-        )
\ No newline at end of file
+        )